@@ -16,6 +16,13 @@ Strategy
         (Since the list is newest-first, once we see a known-unchanged ad
          we've caught up. Move to next index URL.)
   • Two pages max per run (configurable). After a few days the DB is complete.
+  • Detail pages are parsed from the server-rendered HTML over a pooled
+    HTTP session; Chrome is only opened to reveal a missing phone number or
+    when the static page doesn't validate.
+  • Fields come from the page's embedded JSON (React app state, then
+    JSON-LD) first; the DOM heuristics only fill what that didn't provide.
+    Each listing carries `_field_sources` and run() logs how often the DOM
+    fallback fired.
 
 Phone logic (two passes)
   1. Regex scan of the description text.
@@ -70,6 +77,8 @@ DB schema  (SQLite, listings.db)
   first_seen       TEXT   (ISO datetime)
   last_updated     TEXT   (ISO datetime)
   title_history    TEXT   (JSON array of previous titles with timestamps)
+  fingerprint      TEXT   (hash of the tracked fields, see listing_changes.py)
+  + listing_changes: one row per changed field (ref, field, old, new, time)
   (Schema: data/schema-realestate-listings-standard.json)
 """
 
@@ -79,10 +88,14 @@ import time
 import json
 import sqlite3
 import logging
+import weakref
+import threading
 import requests
+import requests.adapters
 from pathlib import Path
+from collections import Counter
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
 
 # Project root for lib.listings_schema (schema-compliant listings)
 _root = Path(__file__).resolve().parent.parent
@@ -90,17 +103,40 @@ if str(_root) not in sys.path:
     sys.path.insert(0, str(_root))
 from lib.listings_schema import LISTING_FIELDS, build_listings_create_sql
 
-from bs4 import BeautifulSoup, Tag
+# backend/ for sibling modules (driver pool, …) when imported as backend.athome_scraper
+_backend = Path(__file__).resolve().parent
+if str(_backend) not in sys.path:
+    sys.path.append(str(_backend))
+from driver_pool import DriverPool
+from chrome_profile import apply_lightweight_options, block_requests, use_profile_dir
+from phone_reveal import PhoneReveal, discard_network_log, enable_network_log, reveal_phone, tel_link_phone
+from image_store import image_store
+from index_cards import IndexCard, cards_from_page
+from known_refs import FINGERPRINT_FIELDS, KnownRefs
+from batch_writer import BatchWriter, sqlite_upsert_many
+import sqlite_db
+import db_backend
+import listing_changes
+from job_queue import (
+    Job, JobQueue, QUEUE_PATH, PRIORITY_LIVE, PRIORITY_BACKFILL, BACKFILL_PER_RUN,
+)
+from partitions import discover, expand, merge
+from leases import Leases, Shard
+from rate_limit import rate_limiter
+from waits import WaitStats, count_settled, document_complete, dom_changed
+from label_matcher import LabelMatcher
+
+from page_tree import (
+    PageTree, xpath, text, next_element_sibling, element_children, dom_version,
+)
 
 try:
     from selenium import webdriver
     from selenium.webdriver.chrome.options import Options
     from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
     from selenium.common.exceptions import (
-        TimeoutException, NoSuchElementException,
-        ElementClickInterceptedException,
+        NoSuchElementException, ElementClickInterceptedException,
     )
     SELENIUM_OK = True
 except ImportError:
@@ -181,15 +217,22 @@ ALL_FIELDS = LISTING_FIELDS
 # ─────────────────────────────────────────────────────────────
 
 def db_connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """This thread's persistent WAL connection to DB_PATH (see sqlite_db.py)."""
+    return sqlite_db.connect(DB_PATH)
 
 
 def db_init():
     """Create tables if they don't exist yet (schema: data/schema-realestate-listings-standard.json)."""
     with db_connect() as conn:
         conn.executescript(build_listings_create_sql("listings"))
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_arrivals "
+                     "ON listings(source, transaction_type, first_seen)")
+        # db_stats reads these two instead of the table (full rows: descriptions, image lists)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_stats "
+                     "ON listings(transaction_type, phone_number)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_title_changed "
+                     "ON listings(title_history) WHERE title_history != '[]'")
+        listing_changes.sqlite_init(conn)
     log.info(f"DB ready: {DB_PATH}")
 
 
@@ -204,6 +247,37 @@ def db_get(ref: str) -> Optional[Dict]:
     return {k: row[k] for k in ALL_FIELDS if k in row.keys()}
 
 
+def db_get_known(source: str, fields: Iterable[str] = FINGERPRINT_FIELDS) -> Dict[str, Dict]:
+    """{listing_ref: {field: value}} for every stored listing of `source`, in one query."""
+    cols = [f for f in fields if f in ALL_FIELDS and f != "listing_ref"]
+    with db_connect() as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(['listing_ref'] + cols)} FROM listings WHERE source = ?", (source,)
+        ).fetchall()
+    return {row["listing_ref"]: {c: row[c] for c in cols} for row in rows}
+
+
+def db_count_known(source: str) -> int:
+    """Number of stored listings of `source`."""
+    with db_connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM listings WHERE source = ?", (source,)).fetchone()[0]
+
+
+def db_iter_refs(source: str) -> Iterator[str]:
+    """listing_ref of every stored listing of `source`, streamed from the cursor (no list built)."""
+    for row in db_connect().execute("SELECT listing_ref FROM listings WHERE source = ?", (source,)):
+        yield row[0]
+
+
+def db_first_seen(source: str, transaction_type: str, since: str) -> List[str]:
+    """first_seen of the `source` / `transaction_type` listings first seen at or after `since` (ISO)."""
+    with db_connect() as conn:
+        return [r[0] for r in conn.execute(
+            "SELECT first_seen FROM listings WHERE source = ? AND transaction_type = ? AND first_seen >= ?",
+            (source, transaction_type, since),
+        )]
+
+
 def db_upsert(data: Dict, is_update: bool = False) -> str:
     """
     Insert a new listing or update an existing one.
@@ -221,7 +295,7 @@ def db_upsert(data: Dict, is_update: bool = False) -> str:
         existing = db_get(ref) or {}
         data.setdefault("first_seen", existing.get("first_seen", now))
 
-        # Append old title to history if it changed
+        # Append old title to history if it changed (the column is only rewritten then)
         old_title = existing.get("title", "")
         new_title = data.get("title", "")
         if old_title and old_title != new_title:
@@ -229,44 +303,74 @@ def db_upsert(data: Dict, is_update: bool = False) -> str:
             history.append({"title": old_title, "changed_at": now})
             data["title_history"] = json.dumps(history)
         else:
-            data["title_history"] = existing.get("title_history", "[]")
+            data.pop("title_history", None)
+
+        # Field-level changes: fingerprint compare first, diff only if it moved
+        data["fingerprint"], changed = listing_changes.changes(data, existing)
 
-        cols  = [k for k in data if k in ALL_FIELDS and k != "listing_ref"]
-        sets  = ", ".join(f"{c} = ?" for c in cols)
-        vals  = [data[c] for c in cols] + [ref]
+        cols = tuple(k for k in ALL_FIELDS if k in data and k != "listing_ref")
         with db_connect() as conn:
-            conn.execute(f"UPDATE listings SET {sets} WHERE listing_ref = ?", vals)
+            conn.execute(sqlite_db.update_sql(cols), {**{c: data[c] for c in cols}, "listing_ref": ref})
+            listing_changes.sqlite_log(conn, listing_changes.log_rows(ref, changed, now))
         return "updated"
     else:
         data["first_seen"]    = now
         data["last_updated"]  = now
         data["title_history"] = "[]"
-        cols = [k for k in ALL_FIELDS if k in data]
-        ph   = ", ".join("?" for _ in cols)
-        vals = [data[k] for k in cols]
+        data["fingerprint"]   = listing_changes.fingerprint(data)
         with db_connect() as conn:
-            conn.execute(
-                f"INSERT OR IGNORE INTO listings ({', '.join(cols)}) VALUES ({ph})",
-                vals,
-            )
+            conn.execute(sqlite_db.insert_sql(), sqlite_db.listing_params(data, ALL_FIELDS))
         return "inserted"
 
 
+def db_upsert_many(items: List[Tuple[Dict, bool]]) -> Dict[str, int]:
+    """
+    Write a batch of (listing, is_update) pairs in one transaction.
+    Returns counters: inserted / updated / unchanged / skipped.
+    """
+    with db_connect() as conn:
+        return sqlite_upsert_many(conn, items, ALL_FIELDS)
+
+
+
 def db_stats() -> Dict:
+    """All counters in one statement, from covering indexes (the table itself isn't read)."""
     with db_connect() as conn:
-        total    = conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
-        buy      = conn.execute("SELECT COUNT(*) FROM listings WHERE transaction_type='buy'").fetchone()[0]
-        rent     = conn.execute("SELECT COUNT(*) FROM listings WHERE transaction_type='rent'").fetchone()[0]
-        w_phone  = conn.execute("SELECT COUNT(*) FROM listings WHERE phone_number IS NOT NULL").fetchone()[0]
-        updated  = conn.execute("SELECT COUNT(*) FROM listings WHERE title_history != '[]'").fetchone()[0]
+        row = conn.execute(
+            "SELECT COUNT(*),"
+            " COALESCE(SUM(transaction_type = 'buy'), 0),"
+            " COALESCE(SUM(transaction_type = 'rent'), 0),"
+            " COUNT(phone_number),"
+            " (SELECT COUNT(*) FROM listings WHERE title_history != '[]')"
+            " FROM listings"
+        ).fetchone()
+    total, buy, rent, w_phone, updated = row
     return {"total": total, "buy": buy, "rent": rent,
             "with_phone": w_phone, "title_changed": updated}
 
 
+def db_price_drops(since: str) -> List[Dict]:
+    """Sale / rent price decreases logged since `since` (ISO), from listing_changes."""
+    with db_connect() as conn:
+        return listing_changes.sqlite_price_drops(conn, since)
+
+
+# The SQLite functions above, for use_backend("sqlite")
+_SQLITE_DB = db_backend.functions(globals())
+
+
+def use_backend(name: str) -> None:
+    """Point this module's db_* functions at `name`: "sqlite" (DB_PATH) or "mongo" (see db_backend.py)."""
+    globals().update(db_backend.resolve(name, _SQLITE_DB))
+
+
 # ─────────────────────────────────────────────────────────────
 # Helpers
 # ─────────────────────────────────────────────────────────────
 
+def _source_of(url: str) -> str:
+    return "athome" if "athome.lu" in url else "immotop" if "immotop.lu" in url else "unknown"
+
 def _clean(t: Any) -> str:
     return re.sub(r"\s+", " ", str(t or "")).strip()
 
@@ -339,7 +443,27 @@ def _extract_phone(text: str) -> Optional[str]:
             return digits
     return None
 
-def _parse_characteristics(soup: BeautifulSoup) -> Dict:
+# Every CHAR_MAP label (FR / EN / DE) in one matcher, built once at import
+_CHAR_LABELS = LabelMatcher(label for _field, labels, _vtype in CHAR_MAP for label in labels)
+
+def _value_after(el_text: str, end: int) -> str:
+    """
+    Text after a label ending at `end`, minus an optional ':' separator.
+    e.g. "Prix de vente1 308 251,98 €"  (label "Prix de vente") → "1 308 251,98 €"
+    """
+    rest = el_text[end:].lstrip()
+    if rest.startswith(":"):
+        rest = rest[1:]
+    return rest.strip()
+
+_XP_HEADINGS = xpath("//h2 | //h3 | //h4")
+_XP_CHAR_HEADING = xpath(
+    "(//h2 | //h3 | //h4)"
+    "[re:test(string(.), 'caract[eé]ristiques|characteristics|eigenschaften', 'i')]"
+)
+_XP_ALL_ELEMENTS = xpath("//*")
+
+def _parse_characteristics(page: PageTree) -> Dict:
     """
     athome.lu renders the Caractéristiques block as flat concatenated text:
 
@@ -354,29 +478,24 @@ def _parse_characteristics(soup: BeautifulSoup) -> Dict:
     Strategy:
       1. Isolate the ## Caractéristiques section of the page.
       2. Build a flat list of (parent_element, full_text) pairs.
-      3. For each CHAR_MAP entry, search for a parent whose text STARTS WITH
-         a known label and extract everything after the label as the value.
-      4. Fallback: scan the entire soup the same way (for edge cases where
+      3. Scan those elements once with the precompiled label matcher. For
+         each CHAR_MAP entry take the first element whose text STARTS WITH a
+         known label (else the first that contains it) and extract
+         everything after the label as the value.
+      4. Fallback: scan the entire page the same way (for edge cases where
          the section heading has a different name).
     """
-    # ── Strip all script/style noise first ───────────────────
-    for tag in soup.find_all(["script", "style"]):
-        tag.decompose()
-
     result: Dict = {}
 
     # ── Isolate the Caractéristiques section ─────────────────
     # Find the ## Caractéristiques / ## Characteristics heading
-    char_section_start = soup.find(
-        lambda t: t.name in ("h2","h3","h4") and
-                  re.search(r"caract[eé]ristiques|characteristics|eigenschaften",
-                             t.get_text(), re.I)
-    )
+    headings = _XP_CHAR_HEADING(page.root)
+    char_section_start = headings[0] if headings else None
     # Find where the section ends (next h2 at same level)
     char_section_end = None
-    if char_section_start:
-        for sib in char_section_start.find_next_siblings():
-            if sib.name in ("h2","h3") and sib != char_section_start:
+    if char_section_start is not None:
+        for sib in char_section_start.itersiblings():
+            if sib.tag in ("h2","h3"):
                 char_section_end = sib
                 break
 
@@ -384,23 +503,23 @@ def _parse_characteristics(soup: BeautifulSoup) -> Dict:
     # We want elements whose direct text (not children) carries the label+value
     def _section_elements():
         """Yield elements that are inside the Caractéristiques block."""
-        if not char_section_start:
+        if char_section_start is None:
             # Fallback: whole page
-            yield from soup.find_all(True)
+            yield from _XP_ALL_ELEMENTS(page.root)
             return
         in_section = False
-        for el in soup.find_all(True):
-            if el == char_section_start:
+        for el in _XP_ALL_ELEMENTS(page.root):
+            if el is char_section_start:
                 in_section = True
                 continue
-            if char_section_end and el == char_section_end:
+            if char_section_end is not None and el is char_section_end:
                 in_section = False
             if in_section:
                 yield el
 
     # Build a de-duplicated list of (element, cleaned_text) for matching
     seen_ids: set = set()
-    elements: List[Tuple[Tag, str]] = []
+    elements: List[Tuple[Any, str]] = []
     for el in _section_elements():
         eid = id(el)
         if eid in seen_ids:
@@ -408,55 +527,42 @@ def _parse_characteristics(soup: BeautifulSoup) -> Dict:
         seen_ids.add(eid)
         # Only leaf-ish elements (not containers holding many children)
         # Heuristic: if the element has > 4 direct-child tags, skip it
-        direct_tags = [c for c in el.children if hasattr(c, 'name') and c.name]
-        if len(direct_tags) > 4:
+        if len(element_children(el)) > 4:
             continue
-        txt = _clean(el.get_text(" "))
+        txt = _clean(text(el, " "))
         if not txt or len(txt) < 2 or len(txt) > 300:
             continue
         elements.append((el, txt))
 
-    def _extract_value(el_text: str, label: str) -> str:
-        """
-        Given the full text of an element and the label string,
-        return everything after the label (stripped).
-        e.g. "Prix de vente1 308 251,98 €"  label="Prix de vente"  → "1 308 251,98 €"
-        """
-        pat = re.compile(re.escape(label) + r"\s*:?\s*", re.I)
-        m   = pat.search(el_text)
-        if m:
-            return el_text[m.end():].strip()
-        return ""
+    # ── One scan: every label occurrence in every element ─────
+    # strict[label] — first element whose text STARTS WITH the label and
+    #                 yields a value; loose[label] — first element containing
+    #                 the label anywhere. Same precedence as matching each
+    #                 (field, label) separately, without the per-label rescans.
+    strict: Dict[str, str] = {}
+    loose: Dict[str, str] = {}
+    for el, txt in elements:
+        for label, pos in _CHAR_LABELS.first_positions(txt).items():
+            if label in loose and (pos or label in strict):
+                continue
+            raw = _value_after(txt, pos + len(label))
+            if not raw:
+                # Value might be in the very next sibling element
+                nxt = next_element_sibling(el)
+                if nxt is not None:
+                    raw = _clean(text(nxt, " "))
+            if not raw:
+                continue
+            if pos == 0:
+                strict.setdefault(label, raw)
+            loose.setdefault(label, raw)
 
-    # ── Match each CHAR_MAP field ─────────────────────────────
+    # ── Resolve each CHAR_MAP field in priority order ────────
     for field, labels, vtype in CHAR_MAP:
         if field in result:
             continue  # already found
         for label in labels:
-            # First pass: strict — element text starts with (or equals) the label
-            for el, txt in elements:
-                if re.match(re.escape(label) + r"\s*:?\s*", txt, re.I):
-                    raw = _extract_value(txt, label)
-                    if not raw:
-                        # Value might be in the very next sibling element
-                        nxt = el.find_next_sibling()
-                        if nxt:
-                            raw = _clean(nxt.get_text(" "))
-                    if raw:
-                        break
-            else:
-                # Second pass: looser — label appears anywhere in the text
-                raw = ""
-                for el, txt in elements:
-                    if re.search(re.escape(label), txt, re.I):
-                        raw = _extract_value(txt, label)
-                        if not raw:
-                            nxt = el.find_next_sibling()
-                            if nxt:
-                                raw = _clean(nxt.get_text(" "))
-                        if raw:
-                            break
-
+            raw = strict.get(label) or loose.get(label)
             if not raw:
                 continue
 
@@ -475,6 +581,254 @@ def _parse_characteristics(soup: BeautifulSoup) -> Dict:
 
     return result
 
+# ─────────────────────────────────────────────────────────────
+# Structured page data  (app state + JSON-LD)
+# ─────────────────────────────────────────────────────────────
+# athome.lu ships the listing as JSON twice: the React app state
+# (`window.AT_HOME_APP = {...}` / `__INITIAL_STATE__` / `__NEXT_DATA__`) and
+# schema.org JSON-LD. Decoding those is one pass over a handful of <script>
+# tags instead of several fuzzy walks over the whole DOM.
+
+_APP_STATE_MARKERS = ("AT_HOME_APP", "__INITIAL_STATE__", "__NEXT_DATA__", "__PRELOADED_STATE__")
+
+# field → (candidate keys in the app state, value type). Keys are compared
+# case-insensitively with "_" / "-" removed, so "bedroomsCount" matches
+# "bedrooms_count". First hit (breadth-first inside the listing object) wins.
+_APP_STATE_MAP = [
+    ("title",                    ["title", "name", "headline"],                          "str"),
+    ("description",              ["description", "descriptionText", "body"],             "str"),
+    ("location",                 ["city", "cityName", "locality", "town", "district"],   "str"),
+    ("sale_price",               ["salePrice", "sellingPrice", "priceSale"],             "price"),
+    ("rent_price",               ["rentPrice", "rent", "monthlyRent", "priceRent"],      "price"),
+    ("monthly_charges",          ["charges", "monthlyCharges", "serviceCharges"],        "price"),
+    ("deposit",                  ["deposit", "securityDeposit", "caution"],              "price"),
+    ("commission",               ["commissionPaidBy", "commission"],                     "str"),
+    ("availability",             ["availability", "availableFrom", "availabilityDate"],  "str"),
+    ("surface_m2",               ["surface", "livingSurface", "livableSurface", "surfaceHabitable", "area"], "float"),
+    ("floor",                    ["floor", "floorNumber", "propertyFloor"],              "int"),
+    ("rooms",                    ["rooms", "roomsCount", "numberOfRooms"],               "int"),
+    ("bedrooms",                 ["bedrooms", "bedroomsCount", "numberOfBedrooms"],      "int"),
+    ("year_of_construction",     ["yearOfConstruction", "constructionYear", "yearBuilt"],"int"),
+    ("fitted_kitchen",           ["fittedKitchen", "equippedKitchen"],                   "bool"),
+    ("open_kitchen",             ["openKitchen"],                                        "bool"),
+    ("shower_rooms",             ["showerRooms", "showerRoomsCount"],                    "int"),
+    ("bathrooms",                ["bathrooms", "bathroomsCount", "numberOfBathrooms"],   "int"),
+    ("separate_toilets",         ["separateToilets", "separateToiletsCount", "toilets"], "int"),
+    ("furnished",                ["furnished", "isFurnished"],                           "bool"),
+    ("balcony",                  ["balcony", "hasBalcony"],                              "bool"),
+    ("balcony_m2",               ["balconySurface", "balconyArea"],                      "float"),
+    ("terrace_m2",               ["terraceSurface", "terraceArea"],                      "float"),
+    ("garden",                   ["garden", "hasGarden"],                                "bool"),
+    ("parking_spaces",           ["parkingSpaces", "parkingCount", "parkings"],          "int"),
+    ("energy_class",             ["energyClass", "energyPerformanceClass", "cpe"],       "energy"),
+    ("thermal_insulation_class", ["thermalInsulationClass", "insulationClass"],          "energy"),
+    ("electric_heating",         ["electricHeating"],                                    "bool"),
+    ("heat_pump",                ["heatPump"],                                           "bool"),
+    ("basement",                 ["basement", "cellar", "hasBasement"],                  "bool"),
+    ("laundry_room",             ["laundryRoom", "laundry"],                             "bool"),
+    ("elevator",                 ["elevator", "lift", "hasElevator"],                    "bool"),
+    ("pets_allowed",             ["petsAllowed", "pets"],                                "bool"),
+    ("agency_name",              ["agencyName", "publisherName"],                        "str"),
+    ("agent_name",               ["agentName", "contactName"],                           "str"),
+    ("phone_number",             ["phone", "phoneNumber", "telephone"],                  "phone"),
+    ("image_urls",               ["photos", "pictures", "images", "medias"],             "images"),
+]
+
+def _norm_key(k: str) -> str:
+    return k.replace("_", "").replace("-", "").lower()
+
+_APP_STATE_KEYS = {_norm_key(k) for _, keys, _ in _APP_STATE_MAP for k in keys}
+
+
+def _coerce(value: Any, vtype: str) -> Any:
+    """Convert a JSON value into the DB representation used by the DOM parsers."""
+    if isinstance(value, dict):  # {"value": 111.2, "unit": "m2"} / {"amount": …}
+        for k in ("value", "amount", "price", "url", "name", "label", "text"):
+            if k in value:
+                return _coerce(value[k], vtype)
+        return None
+    if value is None or value == "":
+        return None
+    if vtype == "images":
+        items = value if isinstance(value, list) else [value]
+        urls: List[str] = []
+        for it in items:
+            src = _coerce(it, "str") if isinstance(it, dict) else it
+            if isinstance(src, str) and src.startswith("http") and src not in urls:
+                urls.append(src)
+        return json.dumps(urls) if urls else None
+    if isinstance(value, list):
+        return None
+    if isinstance(value, bool):
+        return int(value) if vtype == "bool" else None
+    if vtype == "bool":
+        return _parse_bool(str(value)) if not isinstance(value, (int, float)) else int(bool(value))
+    if vtype == "price":
+        return float(value) if isinstance(value, (int, float)) else _parse_price(str(value))
+    if vtype == "float":
+        return float(value) if isinstance(value, (int, float)) else _parse_float(str(value))
+    if vtype == "int":
+        return int(value) if isinstance(value, (int, float)) else _parse_int(str(value))
+    if vtype == "energy":
+        return _parse_energy(str(value))
+    if vtype == "phone":
+        return _extract_phone(str(value))
+    return _clean(value) or None
+
+
+def _decode_js_assignment(text: str) -> Optional[Any]:
+    """Decode `window.X = {...};` or `window.X = JSON.parse("…");` script bodies."""
+    eq = text.find("=")
+    if eq < 0:
+        return None
+    body = text[eq + 1:].lstrip()
+    try:
+        if body.startswith("JSON.parse("):
+            literal, _ = json.JSONDecoder().raw_decode(body[len("JSON.parse("):].lstrip())
+            return json.loads(literal) if isinstance(literal, str) else None
+        start = body.find("{")
+        if start < 0:
+            return None
+        obj, _ = json.JSONDecoder().raw_decode(body[start:])
+        return obj
+    except (ValueError, TypeError):
+        return None
+
+
+def _iter_dicts(obj: Any, depth: int = 0):
+    if depth > 12:
+        return
+    if isinstance(obj, dict):
+        yield obj
+        for v in obj.values():
+            yield from _iter_dicts(v, depth + 1)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _iter_dicts(v, depth + 1)
+
+
+def _find_listing_object(state: Any, ref: Optional[str]) -> Optional[Dict]:
+    """The dict in the app state that describes this listing (id match, else most known keys)."""
+    best, best_score = None, 0
+    for d in _iter_dicts(state):
+        score = sum(1 for k in d if isinstance(k, str) and _norm_key(k) in _APP_STATE_KEYS)
+        if ref and any(str(d.get(k)) == ref for k in ("id", "listingId", "adId", "ref", "reference")):
+            score += 5
+        if score > best_score:
+            best, best_score = d, score
+    return best if best_score >= 3 else None
+
+
+def _lookup(obj: Dict, keys: List[str], max_depth: int = 3) -> Any:
+    """Breadth-first search of obj (and nested dicts) for the first of `keys`."""
+    wanted = [_norm_key(k) for k in keys]
+    level = [obj]
+    for _ in range(max_depth + 1):
+        nxt = []
+        for d in level:
+            normed = {_norm_key(k): v for k, v in d.items() if isinstance(k, str)}
+            for w in wanted:
+                if normed.get(w) not in (None, "", [], {}):
+                    return normed[w]
+            nxt.extend(v for v in d.values() if isinstance(v, dict))
+        level = nxt
+        if not level:
+            break
+    return None
+
+
+def _from_app_state(listing: Dict, transaction_type: str) -> Dict:
+    out: Dict = {}
+    for field, keys, vtype in _APP_STATE_MAP:
+        raw = _lookup(listing, keys)
+        if raw is None:
+            continue
+        value = _coerce(raw, vtype)
+        if value is not None:
+            out[field] = value
+    # A bare "price" belongs to whichever side this index is for
+    price_field = "sale_price" if transaction_type == "buy" else "rent_price"
+    if price_field not in out:
+        price = _coerce(_lookup(listing, ["price"]), "price")
+        if price is not None:
+            out[price_field] = price
+    return out
+
+
+_LD_SKIP_TYPES = {"organization", "realestateagent", "breadcrumblist", "website",
+                  "webpage", "person", "searchaction", "imageobject", "postaladdress"}
+
+def _from_json_ld(ld: Any, transaction_type: str) -> Dict:
+    out: Dict = {}
+    price_field = "sale_price" if transaction_type == "buy" else "rent_price"
+    for d in _iter_dicts(ld):
+        types = d.get("@type") or ""
+        types = {t.lower() for t in (types if isinstance(types, list) else [types]) if isinstance(t, str)}
+        if types & _LD_SKIP_TYPES:
+            continue
+        pairs = [
+            ("title",                d.get("name"),                                 "str"),
+            ("description",          d.get("description"),                          "str"),
+            (price_field,            d.get("price"),                                "price"),
+            ("surface_m2",           d.get("floorSize"),                            "float"),
+            ("rooms",                d.get("numberOfRooms"),                        "int"),
+            ("bedrooms",             d.get("numberOfBedrooms"),                     "int"),
+            ("bathrooms",            d.get("numberOfBathroomsTotal"),               "int"),
+            ("floor",                d.get("floorLevel"),                           "int"),
+            ("year_of_construction", d.get("yearBuilt"),                            "int"),
+            ("location",             (d.get("address") or {}).get("addressLocality")
+                                     if isinstance(d.get("address"), dict) else None, "str"),
+            ("image_urls",           d.get("image"),                                "images"),
+        ]
+        for key in ("seller", "provider", "offeredBy"):
+            who = d.get(key)
+            if isinstance(who, dict):
+                pairs.append(("agency_name",  who.get("name"),      "str"))
+                pairs.append(("phone_number", who.get("telephone"), "phone"))
+        for field, raw, vtype in pairs:
+            if field in out or raw is None:
+                continue
+            value = _coerce(raw, vtype)
+            if value is not None:
+                out[field] = value
+    return out
+
+
+def _extract_structured(page: PageTree, ref: Optional[str], transaction_type: str) -> Dict[str, Tuple[Any, str]]:
+    """
+    Decode the app-state blob and JSON-LD scripts of a detail page.
+    Returns {field: (value, origin)} with origin "app_state" or "json_ld";
+    app-state values win over JSON-LD for the same field.
+    """
+    found: Dict[str, Tuple[Any, str]] = {}
+    ld_blobs: List[Any] = []
+    for script in page.scripts:
+        body = script.text
+        if not body.strip():
+            continue
+        if script.type == "application/ld+json":
+            try:
+                ld_blobs.append(json.loads(body))
+            except ValueError:
+                continue
+        elif script.id == "__NEXT_DATA__" or any(m in body[:400] for m in _APP_STATE_MARKERS):
+            state = None
+            if script.type == "application/json":
+                try:
+                    state = json.loads(body)
+                except ValueError:
+                    state = None
+            if state is None:
+                state = _decode_js_assignment(body)
+            listing = _find_listing_object(state, ref) if state is not None else None
+            if listing:
+                for field, value in _from_app_state(listing, transaction_type).items():
+                    found.setdefault(field, (value, "app_state"))
+    for ld in ld_blobs:
+        for field, value in _from_json_ld(ld, transaction_type).items():
+            found.setdefault(field, (value, "json_ld"))
+    return found
+
 # ─────────────────────────────────────────────────────────────
 # Selenium helpers
 # ─────────────────────────────────────────────────────────────
@@ -485,7 +839,13 @@ _PHONE_BTN_TEXTS = [
     "afficher","appeler","show phone","voir coordonnées",
 ]
 
-def _make_driver(headless: bool = True) -> "webdriver.Chrome":
+def _make_driver(headless: bool = True, lightweight: bool = False,
+                 profile_dir: Optional[Path] = None) -> "webdriver.Chrome":
+    """
+    Chrome session for index / detail pages. `lightweight` loads pages eagerly
+    and blocks images, fonts, media and trackers (see chrome_profile.py);
+    `profile_dir` keeps cookies and the HTTP cache between sessions.
+    """
     if not SELENIUM_OK:
         raise RuntimeError("Install selenium:  pip install selenium")
     opts = Options()
@@ -499,25 +859,41 @@ def _make_driver(headless: bool = True) -> "webdriver.Chrome":
     opts.add_experimental_option("excludeSwitches", ["enable-logging"])
     opts.add_argument("--disable-blink-features=AutomationControlled")
     opts.add_experimental_option("useAutomationExtension", False)
+    enable_network_log(opts)  # phone reveal reads the XHR response (phone_reveal.py)
+    if lightweight:
+        apply_lightweight_options(opts)
+    if profile_dir is not None:
+        use_profile_dir(opts, profile_dir)
     drv = webdriver.Chrome(options=opts)
+    if lightweight:
+        block_requests(drv)
     drv.execute_script(
         "Object.defineProperty(navigator,'webdriver',{get:()=>undefined})"
     )
     return drv
 
+# Wait / work seconds per call site; run() resets and logs it
+_WAITS = WaitStats()
+
+_COOKIE_BTNS = ", ".join([
+    "button#didomi-notice-agree-button","#didomi-notice-agree-button",
+    "[id*='onetrust-accept']","button[aria-label*='accept' i]",
+    "button[aria-label*='accepter' i]",
+])
+
+# Sessions that already accepted: the consent cookie keeps the banner away,
+# so later pages only check for it instead of waiting
+_consented: "weakref.WeakSet" = weakref.WeakSet()
+
 def _dismiss_cookies(driver: "webdriver.Chrome") -> None:
-    for sel in [
-        "button#didomi-notice-agree-button","#didomi-notice-agree-button",
-        "[id*='onetrust-accept']","button[aria-label*='accept' i]",
-        "button[aria-label*='accepter' i]",
-    ]:
-        try:
-            btn = WebDriverWait(driver, 3).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, sel))
-            )
-            btn.click(); time.sleep(0.1); return
-        except TimeoutException:
-            continue
+    timeout = 0 if driver in _consented else 3
+    btn = _WAITS.until(driver, "cookies", EC.element_to_be_clickable((By.CSS_SELECTOR, _COOKIE_BTNS)), timeout)
+    if btn is None:
+        return
+    with _WAITS.work("cookies"):
+        btn.click()
+    _consented.add(driver)
+    _WAITS.until(driver, "cookies", EC.invisibility_of_element(btn), 2)
 
 # ─────────────────────────────────────────────────────────────
 # Description expander  ("Voir tout" / "See all" / "Mehr anzeigen")
@@ -575,177 +951,187 @@ def _expand_description(driver: "webdriver.Chrome") -> None:
         except Exception:
             return False
 
-    # Pass A: CSS selectors scoped to button tags only
-    for sel in [
-        "button[data-testid*='show-more']", "button[data-testid*='read-more']",
-        "button[data-action*='expand']",     "button[class*='show-more']",
-        "button[class*='read-more']",        "button[class*='voir-tout']",
-        "button[class*='expand']",           "button[aria-expanded='false']",
-    ]:
-        try:
-            el = driver.find_element(By.CSS_SELECTOR, sel)
-            if not _is_safe_expand_el(el):
+    def _click(el) -> None:
+        # Click, then wait for the DOM to change (the text being inserted)
+        before = dom_version(driver)
+        driver.execute_script("arguments[0].scrollIntoView(true);", el)
+        try:    el.click()
+        except ElementClickInterceptedException:
+            driver.execute_script("arguments[0].click();", el)
+        _WAITS.until(driver, "detail.expand", dom_changed(before), 1)
+
+    with _WAITS.work("detail.expand"):
+        # Pass A: CSS selectors scoped to button tags only
+        for sel in [
+            "button[data-testid*='show-more']", "button[data-testid*='read-more']",
+            "button[data-action*='expand']",     "button[class*='show-more']",
+            "button[class*='read-more']",        "button[class*='voir-tout']",
+            "button[class*='expand']",           "button[aria-expanded='false']",
+        ]:
+            try:
+                el = driver.find_element(By.CSS_SELECTOR, sel)
+                if not _is_safe_expand_el(el):
+                    continue
+                _click(el)
+                log.debug(f"  Description expanded via: {sel}")
+                return
+            except (NoSuchElementException, Exception):
                 continue
-            driver.execute_script("arguments[0].scrollIntoView(true);", el)
-            time.sleep(0.1)
-            try:    el.click()
-            except ElementClickInterceptedException:
-                driver.execute_script("arguments[0].click();", el)
-            time.sleep(0.3)
-            log.debug(f"  Description expanded via: {sel}")
-            return
-        except (NoSuchElementException, Exception):
-            continue
 
-    # Pass B: scan only <button> elements by text
-    try:
-        for el in driver.find_elements(By.TAG_NAME, "button"):
-            if _is_safe_expand_el(el):
-                driver.execute_script("arguments[0].scrollIntoView(true);", el)
-                time.sleep(0.1)
-                try:    el.click()
-                except ElementClickInterceptedException:
-                    driver.execute_script("arguments[0].click();", el)
-                time.sleep(0.3)
-                log.debug(f"  Description expanded via button text: '{el.text.strip()}'")
-                return
-    except Exception:
-        pass
+        # Pass B: scan only <button> elements by text
+        try:
+            for el in driver.find_elements(By.TAG_NAME, "button"):
+                if _is_safe_expand_el(el):
+                    _click(el)
+                    log.debug(f"  Description expanded via button text: '{el.text.strip()}'")
+                    return
+        except Exception:
+            pass
     # Nothing clicked → description not truncated, or no expand button present
 
 
-def _read_tel_link(driver: "webdriver.Chrome") -> Optional[str]:
-    for _ in range(3):
-        for lnk in driver.find_elements(By.CSS_SELECTOR, "a[href^='tel:']"):
-            raw    = lnk.get_attribute("href").replace("tel:","").strip()
-            digits = re.sub(r"\D","",raw)
-            if digits.startswith("352") and len(digits) > 9:
-                digits = digits[3:]
-            if len(digits) >= 6:
-                return digits
-        time.sleep(0.2)
-    return _extract_phone(driver.page_source)
-
-def _click_phone_button(driver: "webdriver.Chrome") -> Optional[str]:
-    # Pass A: CSS selectors
-    for sel in [
-        "a[href^='tel:']","[data-testid*='phone']","[data-action*='phone']",
-        "[aria-label*='numéro' i]","[aria-label*='number' i]",
-        "[class*='phone']","[class*='reveal-phone']","[class*='show-phone']",
-    ]:
+# Reveal-button candidates, most specific first; only the first visible one is clicked
+_PHONE_BTN_SELECTORS = [
+    "[data-testid*='phone']","[data-action*='phone']",
+    "[aria-label*='numéro' i]","[aria-label*='number' i]",
+    "[class*='reveal-phone']","[class*='show-phone']","[class*='phone']",
+]
+
+_UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZÀÂÉÈÊÎÔÛÇ"
+_LOWER = "abcdefghijklmnopqrstuvwxyzàâéèêîôûç"
+
+def _phone_btn_xpath(tag: str) -> str:
+    """Elements of `tag` whose short text contains one of _PHONE_BTN_TEXTS (one round trip)."""
+    txt = f"translate(normalize-space(.), '{_UPPER}', '{_LOWER}')"
+    has_kw = " or ".join(f"contains({txt}, '{kw}')" for kw in _PHONE_BTN_TEXTS)
+    return f"//{tag}[string-length(normalize-space(.)) <= 80][{has_kw}]"
+
+_PHONE_BTN_XPATHS = [_phone_btn_xpath(tag) for tag in ("button", "a", "span", "div")]
+
+def _find_phone_button(driver: "webdriver.Chrome") -> Optional[Any]:
+    """First visible reveal-button candidate: CSS selectors, then button texts."""
+    for by, query in ([(By.CSS_SELECTOR, sel) for sel in _PHONE_BTN_SELECTORS] +
+                      [(By.XPATH, xp) for xp in _PHONE_BTN_XPATHS]):
         try:
-            el = driver.find_element(By.CSS_SELECTOR, sel)
-            if sel == "a[href^='tel:']":
-                return _read_tel_link(driver)
-            driver.execute_script("arguments[0].scrollIntoView(true);", el)
-            time.sleep(0.1)
-            try:    el.click()
-            except ElementClickInterceptedException:
-                driver.execute_script("arguments[0].click();", el)
-            time.sleep(0.5)
-            ph = _read_tel_link(driver)
-            if ph: return ph
-        except (NoSuchElementException, Exception):
+            for el in driver.find_elements(by, query):
+                if el.is_displayed():
+                    return el
+        except Exception:
             continue
-    # Pass B: text scan
-    for tag in ("button","a","span","div"):
-        try:
-            for el in driver.find_elements(By.TAG_NAME, tag):
-                try:
-                    txt = (el.text or "").lower().strip()
-                    if not txt or len(txt) > 80: continue
-                    if any(kw in txt for kw in _PHONE_BTN_TEXTS):
-                        driver.execute_script("arguments[0].scrollIntoView(true);", el)
-                        time.sleep(0.1)
-                        try:    el.click()
-                        except ElementClickInterceptedException:
-                            driver.execute_script("arguments[0].click();", el)
-                        time.sleep(0.5)
-                        ph = _read_tel_link(driver)
-                        if ph: return ph
-                except Exception: continue
-        except Exception: continue
     return None
 
+def _click_phone_button(driver: "webdriver.Chrome") -> PhoneReveal:
+    """
+    Phone behind the reveal button: a tel: link already on the page, else one
+    click and an event-driven wait for the reveal XHR / tel: link
+    (phone_reveal.py), else a regex over the final page source.
+    """
+    ph = tel_link_phone(driver)
+    if ph:
+        return PhoneReveal(ph, "tel_link", 0)
+    btn = _find_phone_button(driver)
+    if btn is None:
+        return PhoneReveal(None, "none", 0)
+    res = reveal_phone(driver, btn, extract=_extract_phone)
+    _WAITS.record("detail.phone", wait=res.ms / 1000, timed_out=res.via == "none")
+    if not res.phone:
+        ph = _extract_phone(driver.page_source)
+        if ph:
+            res = res._replace(phone=ph, via="page_source")
+    log.debug(f"  Phone reveal: {res.via} in {res.ms} ms")
+    return res
+
+def _apply_phone_reveal(data: Dict, res: PhoneReveal) -> None:
+    """Store a reveal result and its latency (aggregated into the run counters)."""
+    data["_phone_reveal_ms"]  = res.ms
+    data["_phone_reveal_via"] = res.via
+    if res.phone:
+        data["phone_number"] = res.phone
+        data["phone_source"] = "button"
+
 # ─────────────────────────────────────────────────────────────
 # Image downloader
 # ─────────────────────────────────────────────────────────────
 
 def _download_images(urls: List[str], listing_ref: str) -> Path:
-    folder = IMAGES_ROOT / listing_ref
-    folder.mkdir(parents=True, exist_ok=True)
-    sess = requests.Session()
-    sess.headers["User-Agent"] = USER_AGENT
-    saved = 0
-    for i, url in enumerate(urls, 1):
-        if not url or url.startswith("data:"): continue
-        try:
-            r   = sess.get(url, timeout=12); r.raise_for_status()
-            ct  = r.headers.get("content-type","image/jpeg")
-            ext = ct.split("/")[-1].split(";")[0].strip().replace("jpeg","jpg") or "jpg"
-            (folder / f"{i:03d}.{ext}").write_bytes(r.content)
-            saved += 1
-        except Exception as e:
-            log.debug(f"  Image {i} failed: {e}")
-    log.info(f"  {saved}/{len(urls)} images saved → {folder}/")
-    return folder
+    """Photos into the shared content-addressed store (image_store.py); returns images/<ref>."""
+    return image_store(IMAGES_ROOT, USER_AGENT).save_listing(listing_ref, urls)
 
 # ─────────────────────────────────────────────────────────────
 # STEP 1 — collect listing refs from the index page
 # ─────────────────────────────────────────────────────────────
 
+_LISTING_REF_RE = re.compile(r"/id-(\d+)\.html")
+
+def index_page_url(index_url: str, page: int) -> str:
+    """URL of page `page` (1-based) of an index; page 1 is the index URL itself."""
+    if page == 1:
+        return index_url
+    if "page=" in index_url:
+        return re.sub(r"page=\d+", f"page={page}", index_url)
+    sep = "&" if "?" in index_url else "?"
+    return f"{index_url}{sep}page={page}"
+
+
+def get_index_page(
+    driver: "webdriver.Chrome",
+    url: str,
+    page: int = 1,
+    cookies: bool = True,
+) -> Optional[List[IndexCard]]:
+    """
+    IndexCards of one index page, in page order. None when no listing link
+    appeared within the timeout: a failed load (throttling, slow page,
+    consent wall) or a page past the end, which look the same from here.
+    """
+    links = (By.CSS_SELECTOR, "a[href*='/id-']")
+    log.info(f"  Index page {page}: {url}")
+    with _WAITS.work("index.load"), rate_limiter().slot(url):
+        driver.get(url)
+    if cookies:
+        _dismiss_cookies(driver)
+
+    if _WAITS.until(driver, "index.links", EC.presence_of_element_located(links), 20) is None:
+        log.warning(f"  No listing links on page {page}.")
+        discard_network_log(driver)
+        return None
+
+    # Scroll to the bottom and wait for lazy-loaded cards to stop arriving
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    _WAITS.until(driver, "index.scroll", count_settled(links), 2, poll=0.1)
+    discard_network_log(driver)      # nothing on an index page is read from the log
+
+    with _WAITS.work("index.parse"):
+        return cards_from_page(PageTree(driver.page_source).root, _LISTING_REF_RE, BASE_URL)
+
+
 def get_index_refs(
     driver: "webdriver.Chrome",
     index_url: str,
     max_pages: int = 2,
-) -> List[Tuple[str, str]]:
+) -> List[IndexCard]:
     """
-    Returns list of (listing_ref, listing_url) tuples, newest-first,
-    collected from up to `max_pages` pages of the index.
+    Returns one IndexCard per listing (ref, url and the card's title / price /
+    surface / thumbnail), newest-first, collected from up to `max_pages`
+    pages of the index.
     """
-    results: List[Tuple[str, str]] = []
-    current = index_url
-    wait    = WebDriverWait(driver, 20)
+    results: List[IndexCard] = []
+    seen    = set()
 
     for page in range(1, max_pages + 1):
-        log.info(f"  Index page {page}: {current}")
-        driver.get(current)
-        if page == 1:
-            _dismiss_cookies(driver)
-
-        try:
-            wait.until(EC.presence_of_element_located(
-                (By.CSS_SELECTOR, "a[href*='/id-']")
-            ))
-        except TimeoutException:
-            log.warning(f"  No listing links on page {page} — stopping.")
-            break
-
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(0.3)
-
-        soup = BeautifulSoup(driver.page_source, "lxml")
+        cards = get_index_page(driver, index_page_url(index_url, page), page, cookies=page == 1)
         new_cnt = 0
-        for a in soup.find_all("a", href=re.compile(r"/id-(\d+)\.html")):
-            href = a["href"]
-            m    = re.search(r"/id-(\d+)\.html", href)
-            if not m: continue
-            ref  = m.group(1)
-            full = href if href.startswith("http") else BASE_URL + href
-            if not any(r[0] == ref for r in results):
-                results.append((ref, full))
-                new_cnt += 1
+        for card in cards or []:
+            if card.ref in seen:
+                continue
+            seen.add(card.ref)
+            results.append(card)
+            new_cnt += 1
 
         log.info(f"    +{new_cnt} refs on page {page}  (total: {len(results)})")
         if new_cnt == 0:
             break
 
-        if "page=" in current:
-            current = re.sub(r"page=\d+", f"page={page+1}", current)
-        else:
-            sep     = "&" if "?" in current else "?"
-            current = f"{current}{sep}page={page+1}"
-
     log.info(f"  Collected {len(results)} refs from index.")
     return results
 
@@ -753,37 +1139,66 @@ def get_index_refs(
 # STEP 2 — scrape one detail page
 # ─────────────────────────────────────────────────────────────
 
+def _load_detail_page(driver: "webdriver.Chrome", url: str) -> None:
+    """Open a detail page in Chrome and wait for the React app to render the <h1>."""
+    with _WAITS.work("detail.load"), rate_limiter().slot(url):
+        driver.get(url)
+    _dismiss_cookies(driver)
+
+    # Wait for h1 title to load (React app takes time to render)
+    # Use try-except with fallback to avoid ChromeDriver crashes
+    try:
+        if _WAITS.until(driver, "detail.h1", EC.presence_of_element_located((By.CSS_SELECTOR, "h1")), 5):
+            log.debug(f"  h1 loaded for {url}")
+        else:
+            # h1 didn't load in time, but might still be in page - continue anyway
+            log.debug(f"  h1 wait timeout for {url}, continuing anyway")
+    except Exception as e:
+        # ChromeDriver hiccup - give the page until readyState=complete instead
+        log.warning(f"  h1 wait failed ({type(e).__name__}), waiting for document load")
+        try:
+            _WAITS.until(driver, "detail.h1", document_complete, 2)
+        except Exception:
+            pass
+    discard_network_log(driver)  # the load's own events; a reveal wants the click's
+
+
 def scrape_detail(
     driver: "webdriver.Chrome",
     url: str,
     transaction_type: str,
     save_images: bool = True,
 ) -> Dict:
-    driver.get(url)
-    time.sleep(0.5)
-    _dismiss_cookies(driver)
-    
-    # Wait for h1 title to load (React app takes time to render)
-    # Use try-except with fallback to avoid ChromeDriver crashes
-    h1_loaded = False
-    try:
-        wait = WebDriverWait(driver, 5)  # Reduced to 5s to fail faster
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1")))
-        h1_loaded = True
-        log.debug(f"  h1 loaded for {url}")
-    except TimeoutException:
-        # h1 didn't load in time, but might still be in page - continue anyway
-        log.debug(f"  h1 wait timeout for {url}, continuing anyway")
-    except Exception as e:
-        # ChromeDriver crash or other issue - use simple sleep fallback
-        log.warning(f"  h1 wait failed ({type(e).__name__}), using sleep fallback")
-        time.sleep(2)  # Give page more time to render
-    
-    # Always re-parse the page source (whether h1 loaded or not)
-    soup = BeautifulSoup(driver.page_source, "lxml")
-    
+    """Full Selenium scrape: render, expand the description, parse, reveal phone."""
+    _load_detail_page(driver, url)
+
+    # ── Expand truncated description ("Voir tout" / "See all" / "Mehr anzeigen")
+    _expand_description(driver)
+    with _WAITS.work("detail.parse"):
+        data = _parse_detail(PageTree(driver.page_source), url, transaction_type)
+
+    # ── Pass 2: phone from reveal button ─────────────────────
+    if not data["phone_number"]:
+        _apply_phone_reveal(data, _click_phone_button(driver))
+
+    data["_fetched_via"] = "selenium"
+    _finish_detail(data, save_images)
+    return data
+
+
+def _parse_detail(page: PageTree, url: str, transaction_type: str) -> Dict:
+    """
+    Extract every listing field from a parsed detail page (one PageTree,
+    built once per page state and shared by every extractor below).
+    Works on Chrome's rendered DOM and on the server-rendered HTML alike;
+    the phone is only taken from page data / the description here (pass 1).
+
+    Structured page data (app state, then JSON-LD) is read first; the DOM
+    heuristics below only fill what it didn't provide. data["_field_sources"]
+    records where each field came from ("app_state" | "json_ld" | "dom").
+    """
     # ── Source (athome vs immotop) ──────────────────────────
-    source = "athome" if "athome.lu" in url else "immotop" if "immotop.lu" in url else "unknown"
+    source = _source_of(url)
     
     data: Dict = {
         "listing_url":      url,
@@ -798,60 +1213,143 @@ def scrape_detail(
     if ref_from_url:
         data["listing_ref"] = ref_from_url.group(1)
 
-    # "Réf atHome 8983182" in the page body (confirms the URL ref)
-    page_ref = soup.find(string=re.compile(
-        r"R[ée]f\.?\s+(?:atHome|athome)?\s*:?\s*(\d{5,})", re.I
-    ))
-    if page_ref:
-        m = re.search(r"(\d{5,})", page_ref)
-        if m and not data.get("listing_ref"):
-            data["listing_ref"] = m.group(1)
+    # "Réf atHome 8983182" in the page body (when the URL has no ref)
+    if not data.get("listing_ref"):
+        page_ref = next((s for s in page.root.itertext() if _PAGE_REF_RE.search(s)), None)
+        if page_ref:
+            m = re.search(r"(\d{5,})", page_ref)
+            if m:
+                data["listing_ref"] = m.group(1)
 
     # (Agency ref not in schema; omit.)
 
-    # ── Expand truncated description ("Voir tout" / "See all" / "Mehr anzeigen")
-    _expand_description(driver)
-    # Re-parse after potential expansion
-    soup = BeautifulSoup(driver.page_source, "lxml")
+    # ── Structured page data (one pass over the <script> blobs) ──
+    sources: Dict[str, str] = {}
+    for field, (value, origin) in _extract_structured(
+        page, data.get("listing_ref"), transaction_type
+    ).items():
+        data[field] = value
+        sources[field] = origin
+    if "phone_number" in sources:
+        data["phone_source"] = "page_data"
 
     # ── Title ────────────────────────────────────────────────
-    h1 = soup.find("h1")
-    if h1:
-        data["title"] = _clean(h1.get_text())
-    else:
-        # Fallback 1: Try page title (often contains listing title)
-        page_title = soup.find("title")
-        if page_title:
-            title_text = _clean(page_title.get_text())
-            # athome format: "Acheter Immeuble de rapport 221 m² – 950 000 € |Ettelbruck"
-            # Extract the meaningful part (before the pipe or dash)
-            title_parts = re.split(r'\s*[|–]\s*', title_text)
-            if title_parts:
-                # Remove "Acheter" / "Louer" prefix
-                clean_title = re.sub(r'^(Acheter|Louer|Buy|Rent|Vente|Location)\s+', '', title_parts[0], flags=re.I)
-                data["title"] = _clean(clean_title)
-                log.debug(f"  Title from <title> tag: {data['title']}")
-        
-        # Fallback 2: Try og:title meta tag
-        if not data.get("title"):
-            og_title = soup.find("meta", property="og:title")
-            if og_title and og_title.get("content"):
-                data["title"] = _clean(og_title["content"])
-                log.debug(f"  Title from og:title: {data['title']}")
-        
-        if not data.get("title"):
-            log.warning(f"  No title found for {url}")
+    if not data.get("title"):
+        _dom_title(page, data, url)
 
     # ── Location (last meaningful breadcrumb) ────────────────
+    if not data.get("location"):
+        _dom_location(page, data)
+
+    # ── Description ──────────────────────────────────────────
+    if not data.get("description"):
+        _dom_description(page, data)
+
+    # ── Pass 1: phone from description ───────────────────────
+    if not data["phone_number"] and data.get("description"):
+        ph = _extract_phone(data["description"])
+        if ph:
+            data["phone_number"] = ph
+            data["phone_source"] = "description"
+
+    # ── All characteristics ───────────────────────────────────
+    # An app state that carries characteristics is authoritative for them
+    # (absent = not applicable). Otherwise the label scan runs and fills
+    # every field page data didn't provide (JSON-LD may carry just a price).
+    if not any(sources.get(field) == "app_state" for field, _, _ in CHAR_MAP):
+        for k, v in _parse_characteristics(page).items():
+            if k not in sources:
+                data[k] = v
+
+    # ── Agency block ─────────────────────────────────────────
+    if not all(data.get(k) for k in ("agency_name", "agency_url", "agency_logo_url", "agent_name")):
+        for k, v in _dom_agency(page).items():
+            if not data.get(k):
+                data[k] = v
+
+    # ── Images ───────────────────────────────────────────────
+    if "image_urls" not in sources:
+        image_urls: List[str] = []
+        for img in _XP_IMAGES(page.root):
+            for attr in ("src","data-src","data-lazy-src","data-original"):
+                src = (img.get(attr) or "").strip()
+                if (src and "static.athome.eu" in src and "/annonces" in src
+                        and not src.startswith("data:") and src not in image_urls):
+                    image_urls.append(src); break
+        data["image_urls"] = json.dumps(image_urls)
+
+    for k, v in data.items():
+        if k not in sources and k not in _BASE_KEYS and v not in (None, "", "[]"):
+            sources[k] = "dom"
+    data["_field_sources"] = sources
+    return data
+
+
+# Fields set from the URL / run config, never from page content
+_BASE_KEYS = {"listing_url", "source", "transaction_type", "listing_ref", "phone_source"}
+
+# Compiled once; every detail page runs these against its single PageTree
+_PAGE_REF_RE = re.compile(r"R[ée]f\.?\s+(?:atHome|athome)?\s*:?\s*(\d{5,})", re.I)
+_XP_H1       = xpath("//h1")
+_XP_TITLE    = xpath("//title")
+_XP_OG_TITLE = xpath("//meta[@property='og:title']")
+_XP_IMAGES   = xpath("//img")
+_XP_BREADCRUMBS = xpath(
+    "//ol//li | //ol//li//a | //nav[@aria-label]//a"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' breadcrumb ')]//a"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' breadcrumb ')]//span"
+)
+# Largest-text-block fallback: length filter and nav/header/footer exclusion in libxml2
+_XP_DESC_CANDIDATES = xpath(
+    "(//p | //div)[string-length(string(.)) > 120 and string-length(string(.)) < 8000"
+    " and not(ancestor::nav or ancestor::header or ancestor::footer)]"
+)
+_XP_AGENCY_SECTION = xpath(
+    "(//section | //div | //aside)"
+    "[re:test(string(.), 'published by|publiée par|veröffentlicht von|annonce publiée', 'i')]"
+)
+_XP_AGENCY_LINK = xpath(".//a[re:test(@href, '/agence|/realestate-agency|/immobilier')]")
+_XP_AGENCY_NAME_TAGS = xpath(".//strong | .//b | .//h3 | .//h4")
+_XP_SECTION_IMAGES = xpath(".//img")
+
+
+def _dom_title(page: PageTree, data: Dict, url: str) -> None:
+    h1 = _XP_H1(page.root)
+    if h1:
+        data["title"] = _clean(text(h1[0]))
+        return
+
+    # Fallback 1: Try page title (often contains listing title)
+    page_title = _XP_TITLE(page.root)
+    if page_title:
+        title_text = _clean(text(page_title[0]))
+        # athome format: "Acheter Immeuble de rapport 221 m² – 950 000 € |Ettelbruck"
+        # Extract the meaningful part (before the pipe or dash)
+        title_parts = re.split(r'\s*[|–]\s*', title_text)
+        if title_parts:
+            # Remove "Acheter" / "Louer" prefix
+            clean_title = re.sub(r'^(Acheter|Louer|Buy|Rent|Vente|Location)\s+', '', title_parts[0], flags=re.I)
+            data["title"] = _clean(clean_title)
+            log.debug(f"  Title from <title> tag: {data['title']}")
+    
+    # Fallback 2: Try og:title meta tag
+    if not data.get("title"):
+        og_title = _XP_OG_TITLE(page.root)
+        if og_title and og_title[0].get("content"):
+            data["title"] = _clean(og_title[0].get("content"))
+            log.debug(f"  Title from og:title: {data['title']}")
+    
+    if not data.get("title"):
+        log.warning(f"  No title found for {url}")
+
+
+def _dom_location(page: PageTree, data: Dict) -> None:
     skip = {"accueil","acheter","louer","vente","location","home","buy","rent",
             "sell","appartement","maison","apartment","house",
             "en savoir plus","learn more","mehr erfahren","voir plus",
             "see more","read more","lire la suite","voir tout"}
-    location_found = False
-    for crumb in reversed(soup.select(
-        "ol li, ol li a, nav[aria-label] a, .breadcrumb a, .breadcrumb span"
-    )):
-        txt = _clean(crumb.get_text())
+    for crumb in reversed(_XP_BREADCRUMBS(page.root)):
+        txt = _clean(text(crumb))
         if txt and txt.lower() not in skip and len(txt) > 2 \
                 and not re.match(r"R[ée]f", txt):
             # Additional check: must not be a promotional link text
@@ -860,42 +1358,41 @@ def scrape_detail(
             if any(kw in txt.lower() for kw in ["savoir","learn","mehr","voir","see","read","lire","demander","request","j'y vais","go for"]):
                 continue
             data["location"] = txt
-            location_found = True
-            break
-    
+            return
+
     # Fallback: extract from the <h1> title if breadcrumb failed
     # e.g. "Appartement 3 chambres à Schuttrange" → "Schuttrange"
-    if not location_found and data.get("title"):
+    if data.get("title"):
         m = re.search(r"(?:à|in|in)\s+([A-Z][a-zé\-]+(?:\-[A-Z][a-zé\-]+)*)", data["title"])
         if m:
             data["location"] = m.group(1)
 
-    # ── Description ──────────────────────────────────────────
+
+def _dom_description(page: PageTree, data: Dict) -> None:
     # Strategy: find the ## Description heading, collect all sibling text
     # until we hit "Demander plus d'infos" / "Réf atHome" / next <h2>.
-    # Always strip <script> and <style> tags before reading text.
-    desc_h = soup.find(
-        lambda t: t.name in ("h2","h3","h4") and
-                  re.search(r"^description$|^beschreibung$", t.get_text().strip(), re.I)
-    )
-    if desc_h:
+    # (<script> / <style> were already dropped when the PageTree was built.)
+    desc_h = next((
+        h for h in _XP_HEADINGS(page.root)
+        if re.search(r"^description$|^beschreibung$", text(h).strip(), re.I)
+    ), None)
+    if desc_h is not None:
         parts = []
-        for sib in desc_h.find_next_siblings():
+        for sib in desc_h.itersiblings():
+            if not isinstance(sib.tag, str):
+                continue  # comment
             # Stop at the next section heading
-            if sib.name in ("h2","h3","h4"):
+            if sib.tag in ("h2","h3","h4"):
                 break
             # Stop at "Demander plus d'infos" / refs / ask-for-info blocks
-            sib_txt = sib.get_text(" ", strip=True)
+            sib_txt = text(sib, " ", strip=True)
             if re.search(
                 r"demander plus d.infos|ask for more|mehr informationen|"
                 r"r[eé]f\s+(?:atHome|agence)|ref\s+agency",
                 sib_txt, re.I
             ):
                 break
-            # Remove script / style noise before extracting text
-            for tag in sib.find_all(["script","style"]):
-                tag.decompose()
-            txt = sib.get_text("\n", strip=True)
+            txt = text(sib, "\n", strip=True)
             if txt:
                 parts.append(txt)
         if parts:
@@ -903,125 +1400,79 @@ def scrape_detail(
     
     # Fallback: largest text block that isn't in nav/header/footer/script
     if not data.get("description"):
-        for tag in soup.find_all(["script","style"]):
-            tag.decompose()
-        candidates = [
-            t for t in soup.find_all(["p","div"])
-            if 120 < len(t.get_text()) < 8000  # cap at 8k to avoid JS blobs
-            and not any(p.name in ("nav","header","footer") for p in t.parents)
-            and "window." not in t.get_text()   # hard exclude JS globals
-            and "AT_HOME_APP" not in t.get_text()
-        ]
+        candidates = []
+        for t in _XP_DESC_CANDIDATES(page.root):
+            t_text = text(t)
+            if "window." not in t_text and "AT_HOME_APP" not in t_text:  # hard exclude JS globals
+                candidates.append((len(t_text), t))
         if candidates:
-            data["description"] = _clean(
-                max(candidates, key=lambda t: len(t.get_text())).get_text("\n")
-            )
-
-    # ── Pass 1: phone from description ───────────────────────
-    if data.get("description"):
-        ph = _extract_phone(data["description"])
-        if ph:
-            data["phone_number"] = ph
-            data["phone_source"] = "description"
+            best = max(candidates, key=lambda c: c[0])[1]
+            data["description"] = _clean(text(best, "\n"))
 
-    # ── All characteristics ───────────────────────────────────
-    data.update(_parse_characteristics(soup))
 
-    # ── Agency block ─────────────────────────────────────────
+def _dom_agency(page: PageTree) -> Dict:
+    agency: Dict = {}
     # Strategy 1: Find the "Annonce publiée par" / "Listing published by" section
-    agency_section = soup.find(
-        lambda t: t.name in ("section","div","aside")
-                  and re.search(
-                      r"published by|publiée par|veröffentlicht von|annonce publiée",
-                      t.get_text() or "", re.I
-                  )
-    )
+    sections = _XP_AGENCY_SECTION(page.root)
+    agency_section = sections[0] if sections else None
     
-    if agency_section:
+    if agency_section is not None:
         # Try link to agency profile page
-        a_link = agency_section.find("a", href=re.compile(r"/agence|/realestate-agency|/immobilier"))
-        if a_link:
-            data["agency_name"] = _clean(a_link.get_text())
-            href = a_link["href"]
-            data["agency_url"] = href if href.startswith("http") else BASE_URL + href
+        links = _XP_AGENCY_LINK(agency_section)
+        if links:
+            agency["agency_name"] = _clean(text(links[0]))
+            href = links[0].get("href")
+            agency["agency_url"] = href if href.startswith("http") else BASE_URL + href
         
         # If no link found, try bold/strong text (often the agency name)
-        if not data.get("agency_name"):
-            for tag in agency_section.find_all(["strong","b","h3","h4"]):
-                txt = _clean(tag.get_text())
+        if not agency.get("agency_name"):
+            for tag in _XP_AGENCY_NAME_TAGS(agency_section):
+                txt = _clean(text(tag))
                 if txt and len(txt) > 3 and len(txt) < 100:
                     # Exclude generic labels
                     if not re.search(r"published|publiée|contact|annonce|listing|téléphone|phone", txt, re.I):
-                        data["agency_name"] = txt
+                        agency["agency_name"] = txt
                         break
         
+        imgs = _XP_SECTION_IMAGES(agency_section)
         # Logo
-        logo = agency_section.find("img")
-        if logo:
-            src = logo.get("src","")
-            data["agency_logo_url"] = src if src.startswith("http") else BASE_URL + src
+        if imgs:
+            src = imgs[0].get("src","")
+            agency["agency_logo_url"] = src if src.startswith("http") else BASE_URL + src
         
         # Agent name (often in img alt text or a caption)
-        for img in agency_section.find_all("img")[1:]:
+        for img in imgs[1:]:
             alt = (img.get("alt") or "").strip()
             if alt and len(alt) > 3 and len(alt) < 60:
                 # Likely a person's name
                 if re.search(r"[A-Z][a-z]+\s+[A-Z]", alt):  # "Mathieu SCHERRER"
-                    data["agent_name"] = alt
+                    agency["agent_name"] = alt
                     break
     
-    # Strategy 2: Fallback — scan whole page for agency metadata or schema.org
-    if not data.get("agency_name"):
-        # Try schema.org structured data
-        for script in soup.find_all("script", type="application/ld+json"):
-            try:
-                ld = json.loads(script.string or "{}")
-                if isinstance(ld, dict):
-                    seller = ld.get("seller", {})
-                    if isinstance(seller, dict) and seller.get("name"):
-                        data["agency_name"] = seller["name"]
-                        break
-                    provider = ld.get("provider", {})
-                    if isinstance(provider, dict) and provider.get("name"):
-                        data["agency_name"] = provider["name"]
-                        break
-            except (json.JSONDecodeError, Exception):
-                continue
-    
+    # Strategy 2 (schema.org seller / provider) is covered by _extract_structured.
+
     # Strategy 3: Look for agency name near a logo image with recognizable agency URL
-    if not data.get("agency_name"):
-        for img in soup.find_all("img"):
+    if not agency.get("agency_name"):
+        for img in _XP_IMAGES(page.root):
             src = img.get("src", "")
             if "logoagences" in src or "logo" in src.lower():
-                parent = img.find_parent()
-                if parent:
-                    txt = _clean(parent.get_text())
+                parent = img.getparent()
+                if parent is not None:
+                    txt = _clean(text(parent))
                     # Extract first capitalized phrase (likely agency name)
                     m = re.search(r"([A-Z][A-Z\s&]+(?:SARL|SA|SPRL|IMMOBILIER|IMMO|REAL ESTATE)?)", txt)
                     if m and len(m.group(1)) < 60:
-                        data["agency_name"] = m.group(1).strip()
+                        agency["agency_name"] = m.group(1).strip()
                         break
+    return agency
 
-    # ── Images ───────────────────────────────────────────────
-    image_urls: List[str] = []
-    for img in soup.find_all("img"):
-        for attr in ("src","data-src","data-lazy-src","data-original"):
-            src = (img.get(attr) or "").strip()
-            if (src and "static.athome.eu" in src and "/annonces" in src
-                    and not src.startswith("data:") and src not in image_urls):
-                image_urls.append(src); break
-    data["image_urls"] = json.dumps(image_urls)
-
-    # ── Pass 2: phone from reveal button ─────────────────────
-    if not data["phone_number"]:
-        ph = _click_phone_button(driver)
-        if ph:
-            data["phone_number"] = ph
-            data["phone_source"] = "button"
 
-    # ── Download images ───────────────────────────────────────
+def _finish_detail(data: Dict, save_images: bool) -> None:
+    """Download images (optional) and log the one-line summary."""
+    image_urls = json.loads(data.get("image_urls") or "[]")
     if save_images and image_urls and data.get("listing_ref"):
-        folder = _download_images(image_urls, data["listing_ref"])
+        with _WAITS.work("detail.images"):
+            folder = _download_images(image_urls, data["listing_ref"])
         data["images_dir"] = str(folder)
 
     log.info(
@@ -1029,8 +1480,103 @@ def scrape_detail(
         f"€{data.get('sale_price') or data.get('rent_price','?')} | "
         f"{data.get('location','?')} | "
         f"phone={data.get('phone_number','—')}[{data.get('phone_source','—')}] | "
-        f"{len(image_urls)} imgs"
+        f"{len(image_urls)} imgs | via {data.get('_fetched_via','?')}"
     )
+
+# ─────────────────────────────────────────────────────────────
+# STEP 2b — HTTP fast path (Chrome only for the phone reveal)
+# ─────────────────────────────────────────────────────────────
+
+HTTP_POOL_SIZE = 10   # keep-alive connections per host
+_http_lock     = threading.Lock()
+_http_session_shared: Optional[requests.Session] = None
+
+def _http_session() -> requests.Session:
+    """One pooled keep-alive Session shared by every detail fetch of the process."""
+    global _http_session_shared
+    if _http_session_shared is None:
+        with _http_lock:
+            if _http_session_shared is None:
+                sess = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=1,
+                )
+                sess.mount("https://", adapter)
+                sess.mount("http://", adapter)
+                sess.headers.update({
+                    "User-Agent":      USER_AGENT,
+                    "Accept":          "text/html,application/xhtml+xml",
+                    "Accept-Language": "fr-LU,fr;q=0.9,en;q=0.8",
+                })
+                _http_session_shared = sess
+    return _http_session_shared
+
+
+def _detail_is_valid(data: Dict) -> bool:
+    """The static HTML is usable when it carries the ref, a title and some content."""
+    return bool(
+        data.get("listing_ref") and data.get("title")
+        and (data.get("description") or data.get("sale_price") or data.get("rent_price"))
+    )
+
+
+def fetch_detail_http(url: str, transaction_type: str) -> Optional[Dict]:
+    """
+    Parse a detail page from its server-rendered HTML (no browser).
+    Returns None when the request fails or the page doesn't validate.
+    """
+    try:
+        with _WAITS.work("detail.http"):
+            resp = rate_limiter().request(_http_session().get, url, timeout=15)
+            resp.raise_for_status()
+    except Exception as e:
+        log.debug(f"  HTTP fetch failed for {url}: {e}")
+        return None
+    with _WAITS.work("detail.parse"):
+        data = _parse_detail(PageTree(resp.text), url, transaction_type)
+    return data if _detail_is_valid(data) else None
+
+
+def _title_changes_http(url: str, existing: Dict) -> Dict[str, Tuple[Any, Any]]:
+    """{"title": (old, new)} when the detail page's <h1> differs from the stored title."""
+    try:
+        resp = rate_limiter().request(_http_session().get, url, timeout=10)
+        h1 = _XP_H1(PageTree(resp.text).root)
+        current_title = _clean(text(h1[0])) if h1 else ""
+    except Exception:
+        return {}
+    old_title = existing.get("title", "")
+    return {"title": (old_title, current_title)} if current_title and current_title != old_title else {}
+
+
+def _reveal_phone(driver: "webdriver.Chrome", url: str) -> PhoneReveal:
+    _load_detail_page(driver, url)
+    return _click_phone_button(driver)
+
+
+def scrape_detail_fast(
+    pool: DriverPool,
+    url: str,
+    transaction_type: str,
+    save_images: bool = True,
+) -> Dict:
+    """
+    HTTP first; borrow a pooled Chrome only when needed:
+      • page parsed and phone found in the description → no browser at all
+      • page parsed but no phone   → Chrome just for _click_phone_button
+      • page failed validation     → full Selenium scrape_detail
+    """
+    data = fetch_detail_http(url, transaction_type)
+    if data is None:
+        log.debug(f"  static HTML incomplete → Selenium for {url}")
+        return pool.call(scrape_detail, url, transaction_type, save_images=save_images)
+
+    data["_fetched_via"] = "http"
+    if not data["phone_number"]:
+        _apply_phone_reveal(data, pool.call(_reveal_phone, url))
+        data["_fetched_via"] = "http+phone"
+
+    _finish_detail(data, save_images)
     return data
 
 # ─────────────────────────────────────────────────────────────
@@ -1043,14 +1589,41 @@ def run(
     save_images:         bool  = True,
     delay_seconds:       float = 0,      # ← no delay
     headless:            bool  = True,
+    concurrency:         int   = 1,      # detail pages scraped in parallel
+    http_first:          bool  = True,   # static HTML first, Chrome only as fallback
+    lightweight:         bool  = False,  # eager loads, no images/fonts/trackers in Chrome
+    queue_path:          Path  = QUEUE_PATH,
+    backfill_jobs:       int   = BACKFILL_PER_RUN,  # backfill.py jobs taken after the live ones
+    pool:                Optional[DriverPool] = None,  # caller's long-lived sessions (kept open)
+    leases:              Optional[Leases] = None,  # work shared with other nodes (leases.py)
 ) -> Dict[str, int]:
     """
-    For each index URL:
+    For each index URL (or each of its sub-indexes, when the config has
+    "partitions" — see partitions.py; they are read in parallel on the pool):
       - Collect (ref, url) pairs newest-first.
       - For each pair:
           • NEW ref       → scrape fully, insert into DB.
           • KNOWN ref, title CHANGED → re-scrape, update DB, keep history.
-          • KNOWN ref, title UNCHANGED → STOP (we've caught up).
+          • KNOWN ref, title UNCHANGED → STOP (we've caught up) — per sub-index.
+      - Refs found by two sub-indexes are queued once.
+    The NEW / CHANGED refs up to the stop point go into the job queue
+    (job_queue.py, `queue_path`) and are then leased back, together with any
+    job an interrupted run left unfinished, scraped on a pool of
+    `concurrency` Chrome drivers and written to the DB in index order. A job
+    is marked done once its listing is written; a failed page is retried by
+    a later run with backoff.
+    With `http_first` a detail page is parsed from its server-rendered HTML
+    and Chrome is only used to reveal a missing phone or when that fails.
+    With `lightweight` Chrome skips images, fonts, media and trackers; photos
+    are still saved from the parsed URL list by _download_images.
+    A caller that keeps Chrome running between runs (the scheduler) passes
+    its own `pool`; it is left open, and headless / lightweight / concurrency
+    are then the pool's. driver_launches / driver_startup_s report this
+    run's Chrome start-up cost.
+    With `leases` (several nodes scraping the same indexes, leases.py) the
+    run walks only this node's share of the sub-indexes, fetches a detail
+    page only under its lease, and drops a listing from the write if its
+    lease was taken over in the meantime.
     Returns counters dict.
     """
     db_init()
@@ -1058,8 +1631,37 @@ def run(
         log.error("Selenium not installed. Run: pip install selenium")
         return {}
 
-    driver = _make_driver(headless=headless)
-    counters = {"inserted": 0, "updated": 0, "skipped": 0, "stopped_early": 0}
+    own_pool = pool is None
+    if own_pool:
+        pool = DriverPool(lambda: _make_driver(headless=headless, lightweight=lightweight),
+                          size=concurrency)
+    started = pool.snapshot()
+    counters = {"inserted": 0, "updated": 0, "skipped": 0, "stopped_early": 0, "failed": 0, "backfill_jobs": 0,
+                "partitions": 0, "duplicate_refs": 0,
+                "detail_http": 0, "detail_selenium": 0, "title_fetches": 0,
+                "phone_reveals": 0, "phone_reveal_ms": 0, "phone_reveal_max_ms": 0}
+    reveal_via: Counter = Counter()   # how revealed phones arrived (network / tel_link / …)
+    _WAITS.reset_stats()
+    origins: Counter = Counter()      # field values by origin (app_state / json_ld / dom)
+    dom_fields: Counter = Counter()   # which fields needed the DOM fallback
+    known: Dict[str, KnownRefs] = {}  # source → refs already in the DB, loaded once per run
+    queue = JobQueue(queue_path)
+    written: List[str] = []           # job URLs whose listing sits in the writer's buffer
+
+    shard = Shard(leases, queue) if leases else None
+
+    def _write(items: List[Tuple[Dict, bool]]) -> Dict[str, int]:
+        if shard:                     # drop listings another node has taken over meanwhile
+            items = shard.still_held(items, written)
+        counts = db_upsert_many(items)
+        if shard:
+            shard.finish(written)
+        queue.complete(written)       # only once the listings are in the DB
+        written.clear()
+        return counts
+
+    backfill_left = backfill_jobs
+    writer = BatchWriter(_write)      # DB writes go out in batches (size / age)
 
     try:
         for cfg in index_configs:
@@ -1069,59 +1671,82 @@ def run(
             log.info(f"INDEX  {idx_url}  [{t_type}]")
             log.info("="*60)
 
-            ref_pairs = get_index_refs(driver, idx_url, max_pages=max_pages_per_index)
-
-            for i, (ref, lurl) in enumerate(ref_pairs, 1):
-                existing = db_get(ref)
-
-                if existing is None:
-                    # ── Brand new listing ─────────────────────────────
-                    log.info(f"[{i}] NEW  {ref}  {lurl}")
-                    d = scrape_detail(driver, lurl, t_type, save_images=save_images)
-                    if d:
-                        db_upsert(d, is_update=False)
-                        counters["inserted"] += 1
-                    time.sleep(delay_seconds)
-
-                else:
-                    # ── Known ref — check title via lightweight fetch ──
-                    # We only fetch the detail page if the title changed;
-                    # to get the title cheaply we use requests (no Selenium cost)
-                    try:
-                        resp = requests.get(
-                            lurl, headers={"User-Agent": USER_AGENT}, timeout=10
-                        )
-                        soup_light = BeautifulSoup(resp.text, "lxml")
-                        h1 = soup_light.find("h1")
-                        current_title = _clean(h1.get_text()) if h1 else ""
-                    except Exception:
-                        current_title = existing.get("title", "")
-
-                    old_title = existing.get("title", "")
-
-                    if current_title and current_title != old_title:
-                        # Title changed → full re-scrape + update
-                        log.info(
-                            f"[{i}] UPDATED  {ref}\n"
-                            f"      old: {old_title}\n"
-                            f"      new: {current_title}"
-                        )
-                        d = scrape_detail(driver, lurl, t_type, save_images=save_images)
-                        if d:
-                            db_upsert(d, is_update=True)
-                            counters["updated"] += 1
-                        time.sleep(delay_seconds)
+            source = _source_of(idx_url)
+            if source not in known:
+                known[source] = KnownRefs.load(source, db_count_known, db_get_known, db_iter_refs, fetch=db_get)
+                log.info(f"Known {source} listings: {len(known[source])}")
+            refs = known[source]
+
+            # Every sub-index (the index itself when it isn't partitioned)
+            # walks to its own watermark; the pool reads them side by side
+            subs = shard.indexes(expand(cfg)) if shard else expand(cfg)
+            found = discover(pool, subs, get_index_refs, refs, source,
+                             _title_changes_http, max_pages=max_pages_per_index)
+            jobs, duplicates = merge(found)
+            counters["partitions"]     += len(found)
+            counters["stopped_early"]  += sum(p.stopped for p in found)
+            counters["title_fetches"]  += sum(p.title_fetches for p in found)
+            counters["duplicate_refs"] += duplicates
+            queue.enqueue(jobs)
+
+            def _scrape(job: Job) -> Tuple[Optional[Dict], str]:
+                try:
+                    if http_first:
+                        d = scrape_detail_fast(pool, job.url, t_type, save_images=save_images)
                     else:
-                        # Unchanged known listing → stop early for this index
-                        log.info(
-                            f"[{i}] STOP — hit known listing {ref} (unchanged). "
-                            f"All newer listings have been processed."
-                        )
-                        counters["stopped_early"] += 1
-                        break   # ← early exit for this index_url
+                        d = pool.call(scrape_detail, job.url, t_type, save_images=save_images)
+                except Exception as e:
+                    return None, f"{type(e).__name__}: {e}"
+                time.sleep(delay_seconds)
+                return d, "" if d else "no data parsed"
+
+            # Lease in chunks: this index's jobs plus whatever an interrupted
+            # run left behind (failed pages come back after their backoff),
+            # then at most `backfill_jobs` of the backfill crawler's jobs
+            chunk = max(4 * pool.size, 20)   # a caller's pool sets the parallelism, not `concurrency`
+            for min_priority in (PRIORITY_LIVE, PRIORITY_BACKFILL):
+                while True:
+                    limit = chunk if min_priority == PRIORITY_LIVE else min(chunk, backfill_left)
+                    leased = queue.lease(source, t_type, limit=limit, min_priority=min_priority) if limit > 0 else []
+                    if not leased:
+                        break
+                    if min_priority == PRIORITY_BACKFILL:
+                        backfill_left -= len(leased)
+                        counters["backfill_jobs"] += len(leased)
+                    if shard:                 # only the jobs no other node is on
+                        leased = shard.claim(leased)
+                    writer.tick()
+                    for job, (d, error) in zip(leased, pool.imap(_scrape, leased)):
+                        if not d:
+                            counters["failed"] += 1
+                            log.warning(f"  {job.url}: {error} — job {queue.fail(job.url, error)}")
+                            writer.tick()     # no add() to check the buffer's age
+                            continue
+                        written.append(job.url)
+                        writer.add(d, is_update=job.is_update)
+                        refs.add(d["listing_ref"], d)
+                        via = "selenium" if d.get("_fetched_via") == "selenium" else "http"
+                        counters[f"detail_{via}"] += 1
+                        if "_phone_reveal_ms" in d:
+                            counters["phone_reveals"] += 1
+                            counters["phone_reveal_ms"] += d["_phone_reveal_ms"]
+                            counters["phone_reveal_max_ms"] = max(counters["phone_reveal_max_ms"],
+                                                                  d["_phone_reveal_ms"])
+                            reveal_via[d["_phone_reveal_via"]] += 1
+                        for field, origin in (d.get("_field_sources") or {}).items():
+                            origins[origin] += 1
+                            if origin == "dom":
+                                dom_fields[field] += 1
 
     finally:
-        driver.quit()
+        writer.close()
+        if own_pool:
+            pool.close()
+
+    for outcome, n in writer.totals.items():
+        counters[outcome] = counters.get(outcome, 0) + n
+    counters["driver_launches"]  = pool.launched - started["launched"]
+    counters["driver_startup_s"] = round(pool.launch_seconds - started["launch_seconds"], 1)
 
     stats = db_stats()
     log.info(
@@ -1129,7 +1754,21 @@ def run(
         f"Run complete.\n"
         f"  inserted: {counters['inserted']}\n"
         f"  updated:  {counters['updated']}\n"
-        f"  stopped early: {counters['stopped_early']}\n"
+        f"  DB writes: {writer.flushes} batches, {counters.get('unchanged', 0)} already stored\n"
+        f"  stopped early: {counters['stopped_early']} of {counters['partitions']} (sub-)indexes, "
+        f"{counters['duplicate_refs']} refs found in two partitions\n"
+        f"  failed pages: {counters['failed']}  backfill jobs: {counters['backfill_jobs']}  queue: {queue.counts()}\n"
+        f"  details: {counters['detail_http']} via HTTP, {counters['detail_selenium']} via Selenium, "
+        f"{counters['title_fetches']} title-only fetches\n"
+        f"  phone reveals: {counters['phone_reveals']}, "
+        f"avg {counters['phone_reveal_ms'] // max(counters['phone_reveals'], 1)} ms, "
+        f"max {counters['phone_reveal_max_ms']} ms, via {dict(reveal_via)}\n"
+        f"  field sources: {dict(origins)}  DOM fallback: {dict(dom_fields.most_common(8))}\n"
+        f"  images: {image_store(IMAGES_ROOT, USER_AGENT).report() if save_images else 'not saved'}\n"
+        f"  drivers: {pool.report(started)}\n"
+        f"  sharding: {shard.report() if shard else 'single node'}\n"
+        f"  request rates by host:\n{rate_limiter().report()}\n"
+        f"  wait vs work by call site:\n{_WAITS.report()}\n"
         f"DB totals → {stats}"
     )
     return counters
@@ -1143,6 +1782,9 @@ if __name__ == "__main__":
         # athome.lu
         {"url": "https://www.athome.lu/vente?sort=date_desc",    "type": "buy"},
         {"url": "https://www.athome.lu/location?sort=date_desc", "type": "rent"},
+        # A busy index can be split into sub-indexes read in parallel
+        # (run with concurrency > 1), e.g.
+        # "partitions": {"propertyType": ["apartment", "house"]} — see partitions.py
         # immotop.lu (add these when ready to scrape both sites)
         # {"url": "https://www.immotop.lu/vente/?sort=date_desc",    "type": "buy"},
         # {"url": "https://www.immotop.lu/location/?sort=date_desc", "type": "rent"},
@@ -1154,6 +1796,7 @@ if __name__ == "__main__":
         save_images          = True,
         delay_seconds        = 0,      # ← no delay
         headless             = True,   # False = watch the browser
+        concurrency          = 1,      # Chrome drivers for detail pages
     )
 
     # Pretty-print DB stats
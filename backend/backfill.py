@@ -0,0 +1,270 @@
+"""
+Backfill
+========
+Deep crawl of the full paginated indexes, so the DB covers the whole market
+and not only what the incremental runs saw since they started.
+
+  • Each index URL (a whole index, or each sub-index of a config with
+    "partitions" — see partitions.py) has a cursor in the queue file (backfill_cursors): the next
+    page to read, pages walked, refs enqueued, and whether the walk reached
+    the end.
+  • A cycle reads at most `page_budget` index pages, one page per
+    unfinished cursor in turn, and saves the cursor after every page — a
+    killed cycle resumes at the page it was on.
+  • Refs that are new, or whose index card differs from the stored row, go
+    into the shared job queue at PRIORITY_BACKFILL. No early stop: the walk
+    is meant to reach the last page.
+  • A page that didn't load (get_index_page → None: timeout, throttling,
+    consent wall) leaves its cursor where it is until the next cycle. A
+    page past the end looks the same, so a page that fails
+    END_AFTER_FAILURES cycles in a row ends the walk; so does the site
+    repeating its last page.
+  • A finished walk starts again from page 1 after REWALK_DAYS, so
+    listings that were missed or failed keep getting another chance.
+  • The detail pages are scraped by the regular runs: after their own
+    (PRIORITY_LIVE) jobs, each run() takes at most `backfill_jobs` backfill
+    jobs, so the backfill never delays the live 5-minute cycle.
+  • The scheduler (parallel_scheduler.py) runs one cycle of
+    BACKFILL_PAGES_PER_RUN pages after each of its runs, on the same Chrome
+    sessions and DB backend. Run by hand, a cycle must use the scheduler's
+    backend (DB_BACKEND): the refs are looked up there, and a ref missing
+    from it is enqueued as a new listing. Both use the same queue file
+    (job_queue.QUEUE_PATH, next to this module).
+
+Usage:
+    python backfill.py athome mongo    # one cycle over athome's index URLs, Mongo backend
+    stats = backfill.run(athome_scraper, INDEX_URLS, page_budget=20, backend="mongo")
+"""
+
+import sys
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+_backend = Path(__file__).resolve().parent
+if str(_backend) not in sys.path:
+    sys.path.append(str(_backend))
+import sqlite_db
+from driver_pool import DriverPool
+from index_cards import card_changes
+from known_refs import KnownRefs
+from job_queue import Job, JobQueue, PRIORITY_BACKFILL, QUEUE_PATH
+from partitions import expand
+
+log = logging.getLogger("backfill")
+
+PAGE_BUDGET        = 20   # index pages per cycle, over all cursors
+END_AFTER_FAILURES = 3    # cycles in a row a page fails to load before the walk ends there
+REWALK_DAYS        = 7    # a finished walk starts over after this many days
+
+_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS backfill_cursors (
+  index_url        TEXT PRIMARY KEY,
+  source           TEXT NOT NULL,
+  transaction_type TEXT NOT NULL,
+  next_page        INTEGER NOT NULL DEFAULT 1,
+  exhausted        INTEGER NOT NULL DEFAULT 0,
+  pages            INTEGER NOT NULL DEFAULT 0,
+  enqueued         INTEGER NOT NULL DEFAULT 0,
+  last_first_ref   TEXT,
+  failures         INTEGER NOT NULL DEFAULT 0,
+  updated_at       TEXT
+);
+"""
+
+
+class Cursor(NamedTuple):
+    index_url:        str
+    source:           str
+    transaction_type: str
+    next_page:        int
+    exhausted:        bool
+    pages:            int
+    enqueued:         int
+    last_first_ref:   Optional[str]
+    failures:         int             # failed loads of next_page in a row
+    updated_at:       str
+
+
+class BackfillCursors:
+    """Persisted position of every backfill walk (same SQLite file as the job queue)."""
+
+    def __init__(self, path: Path = QUEUE_PATH):
+        self.path = Path(path)
+        with self._conn() as conn:
+            conn.executescript(_CREATE_SQL)
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(backfill_cursors)")}
+            if "failures" not in cols:      # cursor table from before failed loads were counted
+                conn.execute("ALTER TABLE backfill_cursors ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self):
+        return sqlite_db.connect(self.path)
+
+    def get(self, index_url: str, source: str, transaction_type: str) -> Cursor:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO backfill_cursors (index_url, source, transaction_type, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                (index_url, source, transaction_type, datetime.now(timezone.utc).isoformat()),
+            )
+            row = tuple(conn.execute(
+                "SELECT index_url, source, transaction_type, next_page, exhausted, pages, enqueued,"
+                " last_first_ref, failures, updated_at FROM backfill_cursors WHERE index_url = ?", (index_url,)
+            ).fetchone())
+        return Cursor(*row[:4], bool(row[4]), *row[5:])
+
+    def advance(self, index_url: str, enqueued: int, first_ref: Optional[str], exhausted: bool) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE backfill_cursors SET"
+                " next_page = next_page + ?, pages = pages + 1, enqueued = enqueued + ?,"
+                " exhausted = ?, last_first_ref = COALESCE(?, last_first_ref), failures = 0, updated_at = ?"
+                " WHERE index_url = ?",
+                (0 if exhausted else 1, enqueued, int(exhausted), first_ref,
+                 datetime.now(timezone.utc).isoformat(), index_url),
+            )
+
+    def failed(self, index_url: str, end_after: int = END_AFTER_FAILURES) -> bool:
+        """Count a failed load of next_page; True when that ends the walk (it stays on the page)."""
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE backfill_cursors SET failures = failures + 1, exhausted = failures + 1 >= ?,"
+                " updated_at = ? WHERE index_url = ?",
+                (end_after, datetime.now(timezone.utc).isoformat(), index_url),
+            )
+            return bool(conn.execute(
+                "SELECT exhausted FROM backfill_cursors WHERE index_url = ?", (index_url,)
+            ).fetchone()[0])
+
+    def reset(self, index_url: str) -> None:
+        """Start a finished (or stuck) walk again from page 1."""
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE backfill_cursors SET next_page = 1, exhausted = 0, last_first_ref = NULL,"
+                " failures = 0, updated_at = ? WHERE index_url = ?",
+                (datetime.now(timezone.utc).isoformat(), index_url),
+            )
+
+
+def backfill_cycle(
+    scraper: Any,
+    pool: DriverPool,
+    index_configs: List[Dict],
+    queue: JobQueue,
+    cursors: BackfillCursors,
+    page_budget: int = PAGE_BUDGET,
+    rewalk_days: float = REWALK_DAYS,
+) -> Dict[str, int]:
+    """
+    Read up to `page_budget` index pages of the unfinished cursors (round
+    robin) and enqueue their new / changed refs at PRIORITY_BACKFILL.
+    Walks finished more than `rewalk_days` ago start over from page 1.
+    `scraper` is athome_scraper or immotop_scraper (index_page_url,
+    get_index_page, _source_of, db_count_known, db_get_known, db_iter_refs, db_get).
+    """
+    counters: Counter = Counter()
+    known: Dict[str, KnownRefs] = {}
+    index_configs = [sub for cfg in index_configs for sub in expand(cfg)]   # one walk per sub-index
+    rewalk_before = (datetime.now(timezone.utc) - timedelta(days=rewalk_days)).isoformat()
+    active = []
+    for cfg in index_configs:
+        cur = cursors.get(cfg["url"], scraper._source_of(cfg["url"]), cfg.get("type", "buy"))
+        if cur.exhausted and (cur.updated_at or "") < rewalk_before:
+            log.info(f"Backfill starting {cfg['url']} over (finished {(cur.updated_at or '?')[:10]})")
+            cursors.reset(cfg["url"])
+            counters["rewalked"] += 1
+        elif cur.exhausted:
+            continue
+        active.append(cfg)
+    first = True
+
+    while page_budget > 0 and active:
+        for cfg in list(active):
+            if page_budget <= 0:
+                break
+            source, t_type = scraper._source_of(cfg["url"]), cfg.get("type", "buy")
+            cur = cursors.get(cfg["url"], source, t_type)
+            url = scraper.index_page_url(cfg["url"], cur.next_page)
+            cards = pool.call(scraper.get_index_page, url, cur.next_page, cookies=first)
+            first = False
+            page_budget -= 1
+            counters["pages"] += 1
+
+            if cards is None:
+                # Not loaded: stay on this page and try it again next cycle
+                counters["failed_pages"] += 1
+                active.remove(cfg)
+                if cursors.failed(cfg["url"]):
+                    log.info(f"Backfill finished {cfg['url']}: page {cur.next_page} failed "
+                             f"{END_AFTER_FAILURES} cycles in a row")
+                    counters["finished"] += 1
+                continue
+
+            # Past the last page: no cards, or the site repeats its last page
+            exhausted = not cards or (cur.next_page > 1 and cards[0].ref == cur.last_first_ref)
+            jobs: List[Job] = []
+            if not exhausted:
+                if source not in known:
+                    known[source] = KnownRefs.load(source, scraper.db_count_known, scraper.db_get_known,
+                                                   scraper.db_iter_refs, fetch=scraper.db_get)
+                refs = known[source]
+                for card in cards:
+                    row = refs.get(card.ref)
+                    if row is None or card_changes(card, row, t_type):
+                        jobs.append(Job(card.url, card.ref, source, t_type,
+                                        is_update=row is not None, priority=PRIORITY_BACKFILL))
+                queue.enqueue(jobs)
+                counters["cards"] += len(cards)
+                counters["enqueued"] += len(jobs)
+            cursors.advance(cfg["url"], len(jobs), cards[0].ref if cards else None, exhausted)
+            if exhausted:
+                log.info(f"Backfill finished {cfg['url']} after {cur.pages} pages")
+                counters["finished"] += 1
+                active.remove(cfg)
+
+    counters["unfinished"] = sum(
+        not cursors.get(cfg["url"], scraper._source_of(cfg["url"]), cfg.get("type", "buy")).exhausted
+        for cfg in index_configs)
+    return dict(counters)
+
+
+def run(
+    scraper: Any,
+    index_configs: List[Dict],
+    page_budget: int = PAGE_BUDGET,
+    headless: bool = True,
+    queue_path: Path = QUEUE_PATH,
+    backend: str = "sqlite",
+) -> Dict[str, int]:
+    """One backfill cycle on its own Chrome session, against `backend` (see db_backend.py)."""
+    scraper.use_backend(backend)
+    scraper.db_init()
+    pool = DriverPool(lambda: scraper._make_driver(headless=headless), size=1)
+    try:
+        counters = backfill_cycle(scraper, pool, index_configs, JobQueue(queue_path),
+                                  BackfillCursors(queue_path), page_budget)
+    finally:
+        pool.close()
+    log.info(f"Backfill cycle: {counters}")
+    return counters
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s  %(levelname)-7s  %(message)s")
+    site = sys.argv[1] if len(sys.argv) > 1 else "athome"
+    backend = sys.argv[2] if len(sys.argv) > 2 else "sqlite"
+    if site == "immotop":
+        import immotop_scraper as scraper
+        INDEX_URLS = [
+            {"url": "https://www.immotop.lu/vente-maisons-appartements/luxembourg-pays/?criterio=automatico", "type": "buy"},
+            {"url": "https://www.immotop.lu/location-maisons-appartements/luxembourg-pays/?criterio=automatico", "type": "rent"},
+        ]
+    else:
+        import athome_scraper as scraper
+        INDEX_URLS = [
+            {"url": "https://www.athome.lu/vente?sort=date_desc",    "type": "buy"},
+            {"url": "https://www.athome.lu/location?sort=date_desc", "type": "rent"},
+        ]
+    print(run(scraper, INDEX_URLS, page_budget=PAGE_BUDGET, backend=backend))
@@ -0,0 +1,195 @@
+"""
+Batch writer
+============
+Write-behind buffer for listing upserts: run() hands every scraped listing
+to a BatchWriter, which flushes them together instead of one transaction
+(SQLite) or two round trips (MongoDB) per listing.
+
+  • A flush is one call to the backend's db_upsert_many(items), where items
+    are (listing, is_update) pairs in scrape order:
+      – SQLite: sqlite_upsert_many() below — one transaction, one SELECT for
+        the refs already stored, then executemany of
+        INSERT … ON CONFLICT(listing_ref) DO NOTHING / DO UPDATE, plus the
+        batch's field changes appended to listing_changes (listing_changes.py).
+      – MongoDB: mongo_db.db_upsert_many — one unordered bulk_write of
+        UpdateOne(upsert=True).
+  • The buffer flushes when it holds FLUSH_SIZE listings or its oldest
+    listing is FLUSH_SECONDS old, and on flush() / close(). Flushes run on
+    the caller's thread (run() pairs the buffered listings with their job
+    URLs by position), so the age is only checked in add() and tick();
+    run() ticks after every failed page and every leased chunk, which keeps
+    a buffered listing's wait to FLUSH_SECONDS plus the page in flight.
+  • Counters keep db_upsert's vocabulary: inserted / updated / unchanged
+    (an insert for a ref that was already stored) / skipped (no listing_ref).
+
+Usage:
+    writer = BatchWriter(db_upsert_many)
+    writer.add(data, is_update=False)
+    ...
+    writer.close()
+    log.info(writer.totals)
+"""
+
+import time
+import threading
+from datetime import datetime, timezone
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from listing_changes import CHANGE_FIELDS, changes, log_rows, merged, sqlite_log
+
+FLUSH_SIZE    = 25     # listings per flush
+FLUSH_SECONDS = 30.0   # oldest buffered listing waits at most this long
+
+Item = Tuple[Dict, bool]   # (listing, is_update)
+
+
+class BatchWriter:
+    """Buffers (listing, is_update) pairs and writes them with `flush_fn` in batches."""
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Item]], Dict[str, int]],
+        max_size: int = FLUSH_SIZE,
+        max_age: float = FLUSH_SECONDS,
+    ):
+        self.flush_fn = flush_fn
+        self.max_size = max_size
+        self.max_age  = max_age
+        self.totals: Counter = Counter()
+        self.flushes  = 0
+        self._items: List[Item] = []
+        self._since   = 0.0
+        self._lock    = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, data: Dict, is_update: bool = False) -> Dict[str, int]:
+        """Buffer one listing; returns the counters of the flush it triggered, else {}."""
+        with self._lock:
+            if not self._items:
+                self._since = time.monotonic()
+            self._items.append((data, is_update))
+            due = (len(self._items) >= self.max_size
+                   or time.monotonic() - self._since >= self.max_age)
+        return self.flush() if due else {}
+
+    def tick(self) -> Dict[str, int]:
+        """Flush if the oldest buffered listing is `max_age` old (for loops with no add() coming)."""
+        with self._lock:
+            due = bool(self._items) and time.monotonic() - self._since >= self.max_age
+        return self.flush() if due else {}
+
+    def flush(self) -> Dict[str, int]:
+        """Write everything buffered now; returns this flush's counters."""
+        with self._lock:
+            items, self._items = self._items, []
+            if not items:
+                return {}
+            counts = self.flush_fn(items)
+            self.totals.update(counts)
+            self.flushes += 1
+        return counts
+
+    def close(self) -> Dict[str, int]:
+        self.flush()
+        return dict(self.totals)
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ─────────────────────────────────────────────────────────────
+# SQLite
+# ─────────────────────────────────────────────────────────────
+
+# Old title appended to title_history when an update changes it (same shape
+# as db_upsert's history entries)
+_TITLE_HISTORY_SQL = (
+    "CASE WHEN COALESCE(listings.title, '') != '' AND listings.title IS NOT excluded.title "
+    "THEN json_insert(COALESCE(listings.title_history, '[]'), '$[#]', "
+    "json_object('title', listings.title, 'changed_at', excluded.last_updated)) "
+    "ELSE COALESCE(listings.title_history, '[]') END"
+)
+_MANAGED = ("first_seen", "last_updated", "title_history")
+
+
+def _runs(rows: List[Tuple[Tuple[str, ...], bool, List]]) -> Iterable[Tuple[Tuple[str, ...], bool, List[List]]]:
+    """Consecutive rows with the same columns and mode, so executemany keeps scrape order."""
+    key, batch = None, []
+    for cols, is_update, vals in rows:
+        if (cols, is_update) != key and batch:
+            yield key[0], key[1], batch
+            batch = []
+        key = (cols, is_update)
+        batch.append(vals)
+    if batch:
+        yield key[0], key[1], batch
+
+
+def sqlite_upsert_many(conn, items: List[Item], fields: Iterable[str],
+                       table: str = "listings") -> Dict[str, int]:
+    """
+    Upsert a batch of listings on an open connection, in one transaction.
+    Columns a listing doesn't carry are left untouched on update; first_seen
+    is kept and title_history extended exactly as db_upsert does. When the
+    table has a fingerprint column (in `fields`), updates are diffed against
+    the stored rows and their changes appended to listing_changes, as in
+    db_upsert.
+    """
+    fields = [f for f in fields if f not in _MANAGED]
+    track  = "fingerprint" in fields
+    now    = datetime.now(timezone.utc).isoformat()
+    counts: Counter = Counter()
+
+    with conn:
+        # One SELECT for the refs already stored (and their tracked fields)
+        refs = sorted({d["listing_ref"] for d, _ in items if d.get("listing_ref")})
+        cols = ["listing_ref"] + (["fingerprint", *CHANGE_FIELDS] if track else [])
+        stored: Dict[str, Dict] = {}
+        for i in range(0, len(refs), 500):
+            chunk = refs[i:i + 500]
+            for r in conn.execute(
+                f"SELECT {', '.join(cols)} FROM {table} WHERE listing_ref IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ):
+                stored[r[0]] = dict(zip(cols, r))
+
+        rows, changed = [], []
+        for data, is_update in items:
+            ref = data.get("listing_ref")
+            if not ref:
+                counts["skipped"] += 1
+                continue
+            row = stored.get(ref)
+            if row is not None and not is_update:
+                counts["unchanged"] += 1       # DO NOTHING below
+            else:
+                counts["inserted" if row is None else "updated"] += 1
+                if track:
+                    fp, diff = changes(data, row)
+                    data = {**data, "fingerprint": fp}
+                    changed.extend(log_rows(ref, diff, now))
+                stored[ref] = merged(data, row, data.get("fingerprint")) if track else {}
+            row_cols = tuple(f for f in fields if f in data) + _MANAGED
+            vals = [data[f] for f in row_cols[:-len(_MANAGED)]] + [data.get("first_seen", now), now, "[]"]
+            rows.append((row_cols, is_update, vals))
+
+        for row_cols, is_update, batch in _runs(rows):
+            if is_update:
+                sets = [f"{c} = excluded.{c}" for c in row_cols[:-len(_MANAGED)] if c != "listing_ref"]
+                sets += ["last_updated = excluded.last_updated", f"title_history = {_TITLE_HISTORY_SQL}"]
+                conflict = f"DO UPDATE SET {', '.join(sets)}"
+            else:
+                conflict = "DO NOTHING"
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(row_cols)}) VALUES ({', '.join('?' * len(row_cols))}) "
+                f"ON CONFLICT(listing_ref) {conflict}",
+                batch,
+            )
+        sqlite_log(conn, changed)
+    return dict(counts)
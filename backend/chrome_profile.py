@@ -0,0 +1,161 @@
+"""
+Lightweight Chrome profile
+==========================
+Options shared by the scrapers' _make_driver() to load listing pages without
+the bytes we never read:
+
+  • pageLoadStrategy=eager — driver.get() returns at DOMContentLoaded; the
+    scrapers already wait for the elements they need (h1, listing links).
+  • Images are neither downloaded nor decoded (blink setting + content
+    setting). Listing photos still come from the parsed URL list through
+    the scrapers' own requests-based downloaders.
+  • CDP Network.setBlockedURLs drops fonts, media, images and the usual
+    analytics / ad hosts for every navigation of the session.
+
+Stylesheets and first-party scripts stay enabled: the phone / "show more"
+buttons are rendered and positioned by them.
+
+For sessions the scheduler keeps between cycles:
+
+  • use_profile_dir() gives the session a persistent --user-data-dir, so
+    cookies (consent), local storage and the HTTP cache survive a recycle.
+  • session_rss_mb() is the resident memory of the session's chromedriver
+    and every Chrome process under it (psutil if installed, else /proc).
+  • process_tree() lists a process and its descendants the same way (the
+    supervisor kills a hung worker's Chrome processes with it).
+
+Usage:
+    opts = Options()
+    apply_lightweight_options(opts)
+    use_profile_dir(opts, "chrome_profiles/athome/slot0")
+    drv  = webdriver.Chrome(options=opts)
+    block_requests(drv)
+    session_rss_mb(drv)                 # → 812.4, or None where unknown
+"""
+
+import os
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+try:
+    import psutil
+except ImportError:     # optional: /proc is read instead (Linux)
+    psutil = None
+
+log = logging.getLogger("chrome_profile")
+
+# Resource types by extension (Network.setBlockedURLs takes wildcard patterns)
+BLOCKED_RESOURCE_PATTERNS: List[str] = [
+    # images
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp",
+    # fonts
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    # media
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3", "*.ogg",
+]
+
+# Third-party analytics / advertising / session-replay hosts
+BLOCKED_HOST_PATTERNS: List[str] = [
+    "*googletagmanager.com*", "*google-analytics.com*", "*analytics.google.com*",
+    "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*",
+    "*adservice.google.*", "*connect.facebook.net*", "*facebook.com/tr*",
+    "*hotjar.com*", "*hotjar.io*", "*criteo.com*", "*criteo.net*",
+    "*taboola.com*", "*outbrain.com*", "*bat.bing.com*", "*clarity.ms*",
+    "*tiktok.com*", "*linkedin.com/px*", "*snap.licdn.com*", "*adnxs.com*",
+    "*smartadserver.com*", "*xiti.com*", "*ati-host.net*", "*pinterest.com/ct*",
+]
+
+BLOCKED_URL_PATTERNS: List[str] = BLOCKED_RESOURCE_PATTERNS + BLOCKED_HOST_PATTERNS
+
+
+def apply_lightweight_options(opts: Any) -> Any:
+    """Eager page loads and no image loading/decoding on a ChromeOptions object."""
+    opts.page_load_strategy = "eager"
+    opts.add_argument("--blink-settings=imagesEnabled=false")
+    opts.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+    })
+    return opts
+
+
+def block_requests(driver: Any, patterns: Iterable[str] = BLOCKED_URL_PATTERNS) -> bool:
+    """
+    Install the URL block list on a running Chrome session through CDP.
+    Returns False (and logs) when the driver has no CDP access — the session
+    then simply loads everything, as before.
+    """
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+        return True
+    except Exception as e:
+        log.warning(f"Request blocking unavailable ({type(e).__name__}: {e})")
+        return False
+
+
+def use_profile_dir(opts: Any, path: Union[str, Path]) -> Any:
+    """Keep the session's profile (cookies, cache) in `path`; one live session per directory."""
+    path = Path(path).resolve()
+    path.mkdir(parents=True, exist_ok=True)
+    opts.add_argument(f"--user-data-dir={path}")
+    return opts
+
+
+def process_tree(root: int) -> List[int]:
+    """`root` and every process below it (psutil if installed, else /proc; [root] elsewhere)."""
+    if psutil is not None:
+        try:
+            return [root] + [p.pid for p in psutil.Process(root).children(recursive=True)]
+        except psutil.Error:
+            return [root]
+    if not os.path.isdir("/proc"):
+        return [root]
+    parents: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # "pid (comm) state ppid ..." — comm may contain spaces / parens
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree, frontier = [root], [root]
+    while frontier:
+        pid = frontier.pop()
+        children = [c for c, ppid in parents.items() if ppid == pid and c not in tree]
+        tree.extend(children)
+        frontier.extend(children)
+    return tree
+
+
+def _proc_tree_rss_kb(root: int) -> Optional[int]:
+    """VmRSS of `root` and its descendants from /proc, in KiB (None off Linux)."""
+    if not os.path.isdir("/proc"):
+        return None
+    total = 0
+    for pid in process_tree(root):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total += next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def session_rss_mb(driver: Any) -> Optional[float]:
+    """Resident MB of a session's chromedriver + Chrome processes, or None if unknown."""
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            procs = [proc] + proc.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs) / 2**20
+        except psutil.Error:
+            return None
+    kb = _proc_tree_rss_kb(pid)
+    return None if kb is None else kb / 1024
@@ -0,0 +1,43 @@
+"""
+DB backends
+===========
+Which store a scraper module's db_* functions use, chosen by the module's
+own use_backend() call instead of assigning to its globals from outside.
+
+  • "sqlite": the module's own functions on its DB_PATH (the default).
+  • "mongo": mongo_db's functions (MONGO_URI / MONGO_DB_NAME); mongo_db and
+    pymongo are only imported when this backend is picked.
+  • The choice holds for one process. The supervisor's worker processes each
+    make it on startup, so nothing depends on import order.
+
+Usage:
+    import athome_scraper
+    athome_scraper.use_backend("mongo")
+    athome_scraper.run(index_configs=[...])
+"""
+
+from typing import Callable, Dict, Mapping
+
+BACKENDS = ("sqlite", "mongo")
+
+# What run(), the scheduler and the backfill crawler call on a scraper module
+DB_FUNCTIONS = ("db_init", "db_get", "db_get_known", "db_count_known", "db_iter_refs",
+                "db_first_seen", "db_upsert", "db_upsert_many", "db_stats", "db_price_drops")
+
+
+def functions(namespace: Mapping) -> Dict[str, Callable]:
+    """The DB_FUNCTIONS a module defines (pass its globals())."""
+    return {name: namespace[name] for name in DB_FUNCTIONS if name in namespace}
+
+
+def resolve(backend: str, sqlite_functions: Dict[str, Callable]) -> Dict[str, Callable]:
+    """
+    The functions `backend` provides for the names in `sqlite_functions`
+    (a module's own SQLite implementation, from functions()).
+    """
+    if backend == "sqlite":
+        return dict(sqlite_functions)
+    if backend == "mongo":
+        import mongo_db
+        return {name: getattr(mongo_db, name) for name in sqlite_functions}
+    raise ValueError(f"Unknown DB backend {backend!r} (expected one of {', '.join(BACKENDS)})")
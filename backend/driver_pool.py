@@ -0,0 +1,272 @@
+"""
+Selenium Driver Pool
+====================
+Bounded pool of Chrome sessions shared by the detail-page workers of a run.
+
+  • At most `size` drivers exist at once; they are launched lazily, so a run
+    that only needs one page never starts more than one Chrome.
+  • Every idle driver is health-checked before it is handed out; a dead
+    session (crashed Chrome, lost ChromeDriver) is quit and replaced.
+  • `map()` spreads a list of jobs across the pool and yields the results in
+    input order, so callers keep their sequential bookkeeping (counters,
+    upserts) unchanged. With size=1 jobs run inline on the caller's thread.
+  • `imap()` runs jobs that borrow a driver only when they need one (e.g. an
+    HTTP-first fetch that falls back to Chrome).
+  • A pool can outlive a run: the scheduler keeps one per scraper and passes
+    it to run(), so Chrome starts once instead of every cycle. Such a pool
+    recycles a driver after `max_uses` borrowings (≈ page loads) or once its
+    Chrome processes hold more than `max_rss_mb`, and with `profiles` each
+    session gets its own persistent profile directory (the factory is then
+    called as factory(profile_dir)).
+  • launched / replaced / recycled / launch_seconds count every start;
+    snapshot() + report(since) give one cycle's share.
+
+Usage:
+    pool = DriverPool(lambda: _make_driver(headless=True), size=3)
+    try:
+        refs = pool.call(get_index_refs, index_url, max_pages=2)
+        for url, data in zip(urls, pool.map(scrape_one, urls)):
+            ...
+    finally:
+        pool.close()
+"""
+
+import sys
+import time
+import queue
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+_backend = Path(__file__).resolve().parent
+if str(_backend) not in sys.path:
+    sys.path.append(str(_backend))
+from chrome_profile import session_rss_mb
+
+try:
+    from selenium.common.exceptions import WebDriverException
+except ImportError:  # selenium missing → scrapers refuse to run anyway
+    class WebDriverException(Exception):
+        pass
+
+log = logging.getLogger("driver_pool")
+
+RSS_CHECK_EVERY = 10   # borrowings between two memory checks of a driver
+
+
+class DriverPool:
+    """
+    Lazily-filled pool of up to `size` WebDriver sessions built by `factory`.
+    Thread-safe; one driver is only ever used by one job at a time.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., Any],
+        size: int = 1,
+        max_uses: int = 0,                        # 0 → never recycle on use count
+        max_rss_mb: float = 0,                    # 0 → never recycle on memory
+        profiles: Optional[List[Path]] = None,    # one profile dir per concurrent session
+        rss: Callable[[Any], Optional[float]] = session_rss_mb,
+    ):
+        self.factory  = factory
+        self.size     = max(1, int(size or 1))
+        self.max_uses   = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.rss      = rss
+        self._slots   = threading.BoundedSemaphore(self.size)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock    = threading.Lock()
+        self._drivers: List[Any] = []
+        self._free_profiles: List[Path] = list(profiles or [])[:self.size]
+        self._profile: Dict[int, Path] = {}      # id(driver) → its profile dir
+        self._uses: Dict[int, int] = {}          # id(driver) → borrowings so far
+        self.profiles = bool(profiles)
+        self.launched = 0
+        self.replaced = 0
+        self.recycled = 0
+        self.launch_seconds = 0.0
+
+    # ── Lifecycle ────────────────────────────────────────────
+
+    def _launch(self) -> Any:
+        profile = None
+        if self.profiles:
+            with self._lock:
+                profile = self._free_profiles.pop()
+        start = time.monotonic()
+        try:
+            drv = self.factory(profile) if self.profiles else self.factory()
+        except BaseException:
+            if profile is not None:
+                with self._lock:
+                    self._free_profiles.append(profile)
+            raise
+        with self._lock:
+            self._drivers.append(drv)
+            self._uses[id(drv)] = 0
+            if profile is not None:
+                self._profile[id(drv)] = profile
+            self.launched += 1
+            self.launch_seconds += time.monotonic() - start
+        return drv
+
+    def _discard(self, drv: Any) -> None:
+        try:
+            drv.quit()       # before its profile dir is handed to a new session
+        except Exception:
+            pass
+        with self._lock:
+            if drv in self._drivers:
+                self._drivers.remove(drv)
+            self._uses.pop(id(drv), None)
+            profile = self._profile.pop(id(drv), None)
+            if profile is not None:
+                self._free_profiles.append(profile)
+
+    def _worn_out(self, drv: Any) -> Optional[str]:
+        """Why `drv` should be recycled after this borrowing, or None."""
+        with self._lock:
+            uses = self._uses[id(drv)] = self._uses.get(id(drv), 0) + 1
+        if self.max_uses and uses >= self.max_uses:
+            return f"{uses} uses"
+        if self.max_rss_mb and uses % RSS_CHECK_EVERY == 0:
+            mb = self.rss(drv)
+            if mb is not None and mb > self.max_rss_mb:
+                return f"{mb:.0f} MB resident"
+        return None
+
+    @staticmethod
+    def is_healthy(drv: Any) -> bool:
+        """Cheap round trip through the WebDriver bridge; False if the session is gone."""
+        try:
+            drv.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def acquire(self) -> Any:
+        """Block until a slot is free; return a healthy driver (reused or new)."""
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    drv = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._launch()
+                if self.is_healthy(drv):
+                    return drv
+                log.warning("Driver failed health check — replacing it")
+                self._discard(drv)
+                with self._lock:
+                    self.replaced += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, drv: Any, broken: bool = False) -> None:
+        if broken:
+            self._discard(drv)
+        else:
+            reason = self._worn_out(drv)
+            if reason:
+                log.info(f"Recycling driver after {reason}")
+                self._discard(drv)
+                with self._lock:
+                    self.recycled += 1
+            else:
+                self._idle.put(drv)
+        self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        """`with pool.driver() as drv:` — borrow one driver for a block."""
+        drv = self.acquire()
+        broken = False
+        try:
+            yield drv
+        except WebDriverException:
+            broken = not self.is_healthy(drv)
+            raise
+        finally:
+            self.release(drv, broken=broken)
+
+    def close(self) -> None:
+        """Quit every driver the pool has launched."""
+        with self._lock:
+            drivers = list(self._drivers)
+        for drv in drivers:
+            self._discard(drv)
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+    # ── Startup accounting ───────────────────────────────────
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"launched": self.launched, "replaced": self.replaced,
+                    "recycled": self.recycled, "launch_seconds": self.launch_seconds}
+
+    def report(self, since: Optional[Dict[str, float]] = None) -> str:
+        """Launches (and the seconds they took), replacements and recycles since `since`."""
+        now, since = self.snapshot(), since or {}
+        d = {k: v - since.get(k, 0) for k, v in now.items()}
+        return (f"{d['launched']} launched in {d['launch_seconds']:.1f}s, "
+                f"{d['replaced']} replaced, {d['recycled']} recycled, {len(self._drivers)} alive")
+
+    # ── Work distribution ────────────────────────────────────
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn(driver, *args, **kwargs) on a pooled driver.
+        If the driver crashed during the call it is replaced and the call is
+        retried once on a fresh session; any other error propagates.
+        """
+        for attempt in (1, 2):
+            drv = self.acquire()
+            try:
+                result = fn(drv, *args, **kwargs)
+            except WebDriverException as e:
+                healthy = self.is_healthy(drv)
+                self.release(drv, broken=not healthy)
+                if healthy or attempt == 2:
+                    raise
+                with self._lock:
+                    self.replaced += 1
+                log.warning(f"Driver crashed ({type(e).__name__}) — retrying on a fresh driver")
+                continue
+            except BaseException:
+                self.release(drv)
+                raise
+            self.release(drv)
+            return result
+
+    def map(self, fn: Callable, items: Iterable) -> Iterator[Any]:
+        """
+        Yield call(fn, item) for each item, in input order. Up to `size`
+        items are in flight at once; the first exception is re-raised when
+        its result is reached (earlier results are still delivered).
+        """
+        return self.imap(lambda item: self.call(fn, item), items)
+
+    def imap(self, fn: Callable, items: Iterable) -> Iterator[Any]:
+        """
+        Like map(), but fn(item) is called without a driver — it borrows one
+        through call() / driver() only if it needs a browser at all.
+        """
+        items = list(items)
+        if self.size == 1 or len(items) <= 1:
+            for item in items:
+                yield fn(item)
+            return
+        with ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="detail") as ex:
+            futures = [ex.submit(fn, item) for item in items]
+            try:
+                for fut in futures:
+                    yield fut.result()
+            finally:
+                for fut in futures:
+                    fut.cancel()
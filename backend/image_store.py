@@ -0,0 +1,226 @@
+"""
+Image store
+===========
+Listing photos saved once, however often they are scraped or cross-posted.
+
+  • Objects are content-addressed: images/objects/ab/<sha256>.<ext>. Two
+    listings (or two sites) carrying the same photo share one file.
+  • A URL index (images/index.db, SQLite) maps each photo URL to its
+    object, so re-scraping a listing downloads nothing.
+  • Downloads run on a shared thread pool over one keep-alive
+    requests.Session, paced per host by the process-wide rate limiter
+    (rate_limit.py). Concurrent requests for the same URL share one download.
+  • images/<ref>/ keeps the familiar NNN.ext names as hardlinks to the
+    objects (no extra disk). manifest.json lists url → sha256 → file for
+    each position; where hardlinks are unavailable the manifest alone
+    points into objects/.
+
+Usage:
+    store = image_store(Path("images"), USER_AGENT)
+    folder = store.save_listing("8983182", urls)    # → images/8983182
+    log.info(store.report())
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+import requests
+import requests.adapters
+from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+from rate_limit import RateLimiter, rate_limiter
+
+log = logging.getLogger("image_store")
+
+WORKERS        = 8    # download threads shared by every listing
+TIMEOUT        = 12
+
+
+class StoredImage(NamedTuple):
+    sha256: str
+    ext:    str
+    size:   int
+
+
+def _ext(content_type: Optional[str]) -> str:
+    ct = content_type or "image/jpeg"
+    return ct.split("/")[-1].split(";")[0].strip().replace("jpeg", "jpg") or "jpg"
+
+
+class ImageStore:
+    """Content-addressed photo store with a URL index and a pooled downloader."""
+
+    def __init__(self, root: Path, user_agent: str, workers: int = WORKERS,
+                 limiter: Optional[RateLimiter] = None):
+        self.root     = Path(root)
+        self.objects  = self.root / "objects"
+        self.limiter  = limiter or rate_limiter()
+        self.objects.mkdir(parents=True, exist_ok=True)
+
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = user_agent
+        adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="images")
+
+        self._lock = threading.RLock()   # reentrant: a done-callback may fire inside fetch()
+        self._inflight: Dict[str, Future] = {}
+        self._db = sqlite3.connect(self.root / "index.db", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS image_urls ("
+            " url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, ext TEXT NOT NULL,"
+            " bytes INTEGER NOT NULL, fetched_at TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+        self.downloaded = 0       # photos fetched over the network
+        self.reused     = 0       # photos served from the URL index
+        self.duplicates = 0       # downloads whose content was already stored
+        self.bytes_downloaded = 0
+
+    # ── Objects ──────────────────────────────────────────────
+
+    def object_path(self, img: StoredImage) -> Path:
+        return self.objects / img.sha256[:2] / f"{img.sha256}.{img.ext}"
+
+    def _write_object(self, content: bytes, ext: str) -> StoredImage:
+        img  = StoredImage(hashlib.sha256(content).hexdigest(), ext, len(content))
+        path = self.object_path(img)
+        if path.exists():
+            with self._lock:
+                self.duplicates += 1
+            return img
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, path)   # atomic; a concurrent writer of the same hash is harmless
+        return img
+
+    # ── URL index ────────────────────────────────────────────
+
+    def _lookup(self, url: str) -> Optional[StoredImage]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256, ext, bytes FROM image_urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        img = StoredImage(*row)
+        return img if self.object_path(img).exists() else None
+
+    def _remember(self, url: str, img: StoredImage) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO image_urls (url, sha256, ext, bytes, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, img.sha256, img.ext, img.size, datetime.now(timezone.utc).isoformat()),
+            )
+            self._db.commit()
+
+    # ── Downloads ────────────────────────────────────────────
+
+    def _download(self, url: str) -> StoredImage:
+        r = self.limiter.request(self._session.get, url, timeout=TIMEOUT)
+        r.raise_for_status()
+        img = self._write_object(r.content, _ext(r.headers.get("content-type")))
+        self._remember(url, img)
+        with self._lock:
+            self.downloaded += 1
+            self.bytes_downloaded += img.size
+        return img
+
+    def fetch(self, url: str) -> "Future[StoredImage]":
+        """Future for the stored image of `url`; no request if the URL is already indexed."""
+        img = self._lookup(url)
+        if img is not None:
+            with self._lock:
+                self.reused += 1
+            done: Future = Future()
+            done.set_result(img)
+            return done
+        with self._lock:
+            fut = self._inflight.get(url)
+            if fut is None:
+                fut = self._inflight[url] = self._executor.submit(self._download, url)
+                fut.add_done_callback(lambda f, u=url: self._forget(u))
+        return fut
+
+    def _forget(self, url: str) -> None:
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    # ── Listings ─────────────────────────────────────────────
+
+    def _link(self, img: StoredImage, dest: Path) -> bool:
+        src = self.object_path(img)
+        try:
+            if dest.exists():
+                if os.path.samefile(src, dest):
+                    return True
+                dest.unlink()
+            os.link(src, dest)
+            return True
+        except OSError:
+            return False
+
+    def save_listing(self, listing_ref: str, urls: List[str]) -> Path:
+        """
+        Store every photo of a listing and (re)write images/<ref>/: NNN.ext
+        hardlinks plus manifest.json. Returns the listing folder.
+        """
+        folder = self.root / listing_ref
+        folder.mkdir(parents=True, exist_ok=True)
+        futures = [(i, url, self.fetch(url)) for i, url in enumerate(urls, 1)
+                   if url and not url.startswith("data:")]
+
+        manifest, linked = [], set()
+        for i, url, fut in futures:
+            try:
+                img = fut.result()
+            except Exception as e:
+                log.debug(f"  Image {i} failed: {e}")
+                continue
+            name = f"{i:03d}.{img.ext}"
+            entry = {"n": i, "url": url, "sha256": img.sha256, "bytes": img.size,
+                     "object": str(self.object_path(img).relative_to(self.root))}
+            if self._link(img, folder / name):
+                entry["file"] = name
+                linked.add(name)
+            manifest.append(entry)
+
+        # Photos the listing no longer carries
+        for old in folder.glob("[0-9][0-9][0-9].*"):
+            if old.name not in linked:
+                old.unlink()
+        (folder / "manifest.json").write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+        log.info(f"  {len(manifest)}/{len(urls)} images saved → {folder}/")
+        return folder
+
+    def report(self) -> str:
+        """Counters since the store was opened (it lives as long as the process)."""
+        return (f"{self.downloaded} downloaded ({self.bytes_downloaded / 1e6:.1f} MB), "
+                f"{self.reused} reused by URL, {self.duplicates} duplicate contents")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._session.close()
+        self._db.close()
+
+
+_stores: Dict[Path, ImageStore] = {}
+_stores_lock = threading.Lock()
+
+def image_store(root: Path, user_agent: str) -> ImageStore:
+    """Process-wide store for `root`, shared by every scraper writing there."""
+    key = Path(root).resolve()
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ImageStore(root, user_agent)
+        return _stores[key]
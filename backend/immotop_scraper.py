@@ -18,17 +18,45 @@ import time
 import json
 import sqlite3
 import logging
+import weakref
+import threading
 import requests
+import requests.adapters
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple, Callable
 
 _root = Path(__file__).resolve().parent.parent
 if str(_root) not in sys.path:
     sys.path.insert(0, str(_root))
 from lib.listings_schema import LISTING_FIELDS, build_listings_create_sql
 
-from bs4 import BeautifulSoup, Tag
+_backend = Path(__file__).resolve().parent
+if str(_backend) not in sys.path:
+    sys.path.append(str(_backend))
+from driver_pool import DriverPool
+from chrome_profile import apply_lightweight_options, block_requests, use_profile_dir
+from phone_reveal import discard_network_log, enable_network_log, reveal_phone
+from image_store import image_store
+from index_cards import IndexCard, cards_from_page
+from known_refs import FINGERPRINT_FIELDS, KnownRefs
+from batch_writer import BatchWriter, sqlite_upsert_many
+import sqlite_db
+import db_backend
+import listing_changes
+from job_queue import (
+    Job, JobQueue, QUEUE_PATH, PRIORITY_LIVE, PRIORITY_BACKFILL, BACKFILL_PER_RUN,
+)
+from partitions import discover, expand, merge
+from leases import Leases, Shard
+from rate_limit import rate_limiter
+from waits import WaitStats, count_settled
+from label_matcher import LabelDispatch, LabelRule
+
+from lxml import etree
+from page_tree import (
+    PageTree, DomTracker, xpath, text, text_parent, next_element_sibling,
+)
 
 # Import shared DB functions from athome_scraper
 # (We'll create a shared db.py module, but for now just duplicate the essentials)
@@ -37,11 +65,9 @@ try:
     from selenium import webdriver
     from selenium.webdriver.chrome.options import Options
     from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
     from selenium.common.exceptions import (
-        TimeoutException, NoSuchElementException,
-        ElementClickInterceptedException,
+        NoSuchElementException, ElementClickInterceptedException,
     )
     SELENIUM_OK = True
 except ImportError:
@@ -79,14 +105,16 @@ log = logging.getLogger("immotop")
 ALL_FIELDS = LISTING_FIELDS
 
 def db_connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """This thread's persistent WAL connection to DB_PATH (see sqlite_db.py)."""
+    return sqlite_db.connect(DB_PATH)
 
 def db_init() -> None:
     """Create the listings table if it doesn't exist (schema: data/schema-realestate-listings-standard.json)."""
     with db_connect() as conn:
         conn.executescript(build_listings_create_sql("listings"))
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_arrivals "
+                     "ON listings(source, transaction_type, first_seen)")
+        listing_changes.sqlite_init(conn)
     log.info(f"DB initialized: {DB_PATH}")
 
 def db_get(ref: str) -> Optional[Dict]:
@@ -99,6 +127,33 @@ def db_get(ref: str) -> Optional[Dict]:
         return None
     return {k: row[k] for k in ALL_FIELDS if k in row.keys()}
 
+def db_get_known(source: str, fields: Iterable[str] = FINGERPRINT_FIELDS) -> Dict[str, Dict]:
+    """{listing_ref: {field: value}} for every stored listing of `source`, in one query."""
+    cols = [f for f in fields if f in ALL_FIELDS and f != "listing_ref"]
+    with db_connect() as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(['listing_ref'] + cols)} FROM listings WHERE source = ?", (source,)
+        ).fetchall()
+    return {row["listing_ref"]: {c: row[c] for c in cols} for row in rows}
+
+def db_count_known(source: str) -> int:
+    """Number of stored listings of `source`."""
+    with db_connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM listings WHERE source = ?", (source,)).fetchone()[0]
+
+def db_iter_refs(source: str) -> Iterator[str]:
+    """listing_ref of every stored listing of `source`, streamed from the cursor (no list built)."""
+    for row in db_connect().execute("SELECT listing_ref FROM listings WHERE source = ?", (source,)):
+        yield row[0]
+
+def db_first_seen(source: str, transaction_type: str, since: str) -> List[str]:
+    """first_seen of the `source` / `transaction_type` listings first seen at or after `since` (ISO)."""
+    with db_connect() as conn:
+        return [r[0] for r in conn.execute(
+            "SELECT first_seen FROM listings WHERE source = ? AND transaction_type = ? AND first_seen >= ?",
+            (source, transaction_type, since),
+        )]
+
 def db_upsert(data: Dict, is_update: bool = False) -> str:
     ref = data.get("listing_ref")
     if not ref:
@@ -115,31 +170,49 @@ def db_upsert(data: Dict, is_update: bool = False) -> str:
             history.append({"title": old_title, "changed_at": now})
             data["title_history"] = json.dumps(history)
         else:
-            data["title_history"] = existing.get("title_history", "[]")
-        cols  = [k for k in data if k in ALL_FIELDS and k != "listing_ref"]
-        sets  = ", ".join(f"{c} = ?" for c in cols)
-        vals  = [data[c] for c in cols] + [ref]
+            data.pop("title_history", None)
+        data["fingerprint"], changed = listing_changes.changes(data, existing)
+        cols = tuple(k for k in ALL_FIELDS if k in data and k != "listing_ref")
         with db_connect() as conn:
-            conn.execute(f"UPDATE listings SET {sets} WHERE listing_ref = ?", vals)
+            conn.execute(sqlite_db.update_sql(cols), {**{c: data[c] for c in cols}, "listing_ref": ref})
+            listing_changes.sqlite_log(conn, listing_changes.log_rows(ref, changed, now))
         return "updated"
     else:
         data["first_seen"]    = now
         data["last_updated"]  = now
         data["title_history"] = "[]"
-        cols = [k for k in ALL_FIELDS if k in data]
-        ph   = ", ".join("?" for _ in cols)
-        vals = [data[k] for k in cols]
+        data["fingerprint"]   = listing_changes.fingerprint(data)
         with db_connect() as conn:
-            conn.execute(
-                f"INSERT OR IGNORE INTO listings ({', '.join(cols)}) VALUES ({ph})",
-                vals,
-            )
+            conn.execute(sqlite_db.insert_sql(), sqlite_db.listing_params(data, ALL_FIELDS))
         return "inserted"
 
+def db_upsert_many(items: List[Tuple[Dict, bool]]) -> Dict[str, int]:
+    """
+    Write a batch of (listing, is_update) pairs in one transaction.
+    Returns counters: inserted / updated / unchanged / skipped.
+    """
+    with db_connect() as conn:
+        return sqlite_upsert_many(conn, items, ALL_FIELDS)
+
+def db_price_drops(since: str) -> List[Dict]:
+    """Sale / rent price decreases logged since `since` (ISO), from listing_changes."""
+    with db_connect() as conn:
+        return listing_changes.sqlite_price_drops(conn, since)
+
+# The SQLite functions above, for use_backend("sqlite")
+_SQLITE_DB = db_backend.functions(globals())
+
+def use_backend(name: str) -> None:
+    """Point this module's db_* functions at `name`: "sqlite" (DB_PATH) or "mongo" (see db_backend.py)."""
+    globals().update(db_backend.resolve(name, _SQLITE_DB))
+
 # ─────────────────────────────────────────────────────────────
 # Parsing helpers (same as athome)
 # ─────────────────────────────────────────────────────────────
 
+def _source_of(url: str) -> str:
+    return "immotop"
+
 def _clean(t: Any) -> str:
     return re.sub(r"\s+", " ", str(t or "")).strip()
 
@@ -191,7 +264,13 @@ def _extract_phone(text: str) -> Optional[str]:
 # Selenium driver
 # ─────────────────────────────────────────────────────────────
 
-def _make_driver(headless: bool = True) -> "webdriver.Chrome":
+def _make_driver(headless: bool = True, lightweight: bool = False,
+                 profile_dir: Optional[Path] = None) -> "webdriver.Chrome":
+    """
+    Chrome session for index / detail pages. `lightweight` loads pages eagerly
+    and blocks images, fonts, media and trackers (see chrome_profile.py);
+    `profile_dir` keeps cookies and the HTTP cache between sessions.
+    """
     if not SELENIUM_OK:
         raise RuntimeError("Install selenium:  pip install selenium")
     opts = Options()
@@ -205,116 +284,144 @@ def _make_driver(headless: bool = True) -> "webdriver.Chrome":
     opts.add_experimental_option("excludeSwitches", ["enable-logging"])
     opts.add_argument("--disable-blink-features=AutomationControlled")
     opts.add_experimental_option("useAutomationExtension", False)
+    enable_network_log(opts)  # phone reveal reads the XHR response (phone_reveal.py)
+    if lightweight:
+        apply_lightweight_options(opts)
+    if profile_dir is not None:
+        use_profile_dir(opts, profile_dir)
     drv = webdriver.Chrome(options=opts)
+    if lightweight:
+        block_requests(drv)
     drv.execute_script(
         "Object.defineProperty(navigator,'webdriver',{get:()=>undefined})"
     )
     return drv
 
+# Wait / work seconds per call site; run() resets and logs it
+_WAITS = WaitStats()
+
+_COOKIE_REJECT_TEXTS = ["Tout refuser", "Refuser", "Seulement les essentiels",
+                        "Only necessary", "Necessary only"]
+_COOKIE_ACCEPT_TEXTS = ["Tout accepter", "Accepter", "Accept all", "OK"]
+
+def _cookie_xpath(texts: List[str]) -> str:
+    return " | ".join(f"//button[contains(text(), '{t}')] | //a[contains(text(), '{t}')]" for t in texts)
+
+_XP_COOKIE_BTNS = _cookie_xpath(_COOKIE_REJECT_TEXTS + _COOKIE_ACCEPT_TEXTS)
+
+# Sessions that already answered the banner only check for it afterwards
+_consented: "weakref.WeakSet" = weakref.WeakSet()
+
 def _dismiss_cookies(driver: "webdriver.Chrome") -> None:
     """
     immotop cookie strategy (from uploaded code):
       1. Try "Tout refuser" / "Refuser" first
       2. If that fails, try "Tout accepter" / "Accepter"
+    One wait for any banner button, then the first visible one by preference.
     """
-    reject_texts = ["Tout refuser", "Refuser", "Seulement les essentiels",
-                    "Only necessary", "Necessary only"]
-    accept_texts = ["Tout accepter", "Accepter", "Accept all", "OK"]
-    
-    # Try reject first
-    for text in reject_texts:
-        for sel in [
-            f"button:contains('{text}')",
-            f"a:contains('{text}')",
-            f"[role='button']:contains('{text}')",
-        ]:
-            # Selenium doesn't have :contains, use xpath
-            xpath = f"//button[contains(text(), '{text}')] | //a[contains(text(), '{text}')]"
+    timeout = 0 if driver in _consented else 2
+    if _WAITS.until(driver, "cookies", EC.element_to_be_clickable((By.XPATH, _XP_COOKIE_BTNS)), timeout) is None:
+        return
+    for label in _COOKIE_REJECT_TEXTS + _COOKIE_ACCEPT_TEXTS:
+        for btn in driver.find_elements(By.XPATH, _cookie_xpath([label])):
             try:
-                btn = WebDriverWait(driver, 2).until(
-                    EC.element_to_be_clickable((By.XPATH, xpath))
-                )
-                btn.click()
-                time.sleep(0.2)
-                log.debug(f"Cookie reject: {text}")
-                return
-            except TimeoutException:
+                if not (btn.is_displayed() and btn.is_enabled()):
+                    continue
+                with _WAITS.work("cookies"):
+                    btn.click()
+            except Exception:
                 continue
-    
-    # Fallback: accept
-    for text in accept_texts:
-        xpath = f"//button[contains(text(), '{text}')] | //a[contains(text(), '{text}')]"
-        try:
-            btn = WebDriverWait(driver, 2).until(
-                EC.element_to_be_clickable((By.XPATH, xpath))
-            )
-            btn.click()
-            time.sleep(0.2)
-            log.debug(f"Cookie accept: {text}")
+            _consented.add(driver)
+            _WAITS.until(driver, "cookies", EC.invisibility_of_element(btn), 2)
+            log.debug(f"Cookie {'reject' if label in _COOKIE_REJECT_TEXTS else 'accept'}: {label}")
             return
-        except TimeoutException:
-            continue
 
 # ─────────────────────────────────────────────────────────────
 # Index page → collect listing URLs
 # ─────────────────────────────────────────────────────────────
 
+_LISTING_REF_RE = re.compile(r"/annonces/(\d+)")
+
+def index_page_url(index_url: str, page: int) -> str:
+    """URL of page `page` (1-based) of an index; immotop paginates with ?pag=N."""
+    if page == 1:
+        return index_url
+    if "pag=" in index_url:
+        return re.sub(r"pag=\d+", f"pag={page}", index_url)
+    sep = "&" if "?" in index_url else "?"
+    return f"{index_url}{sep}pag={page}"
+
+
+def get_index_page(
+    driver: "webdriver.Chrome",
+    url: str,
+    page: int = 1,
+    cookies: bool = True,
+) -> Optional[List[IndexCard]]:
+    """
+    IndexCards of one index page, in page order. None when no listing link
+    appeared within the timeout: a failed load (throttling, slow page,
+    consent wall) or a page past the end, which look the same from here.
+    """
+    links = (By.CSS_SELECTOR, "a[href*='/annonces/']")
+    log.info(f"  Index page {page}: {url}")
+    with _WAITS.work("index.load"), rate_limiter().slot(url):
+        driver.get(url)
+    if cookies:
+        _dismiss_cookies(driver)
+
+    if _WAITS.until(driver, "index.links", EC.presence_of_element_located(links), 20) is None:
+        log.warning(f"  No listing links on page {page}.")
+        discard_network_log(driver)
+        return None
+
+    # Scroll to the bottom and wait for lazy-loaded cards to stop arriving
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    _WAITS.until(driver, "index.scroll", count_settled(links), 2, poll=0.1)
+    discard_network_log(driver)      # nothing on an index page is read from the log
+
+    with _WAITS.work("index.parse"):
+        return cards_from_page(PageTree(driver.page_source).root, _LISTING_REF_RE, BASE_URL)
+
+
 def get_index_refs(
     driver: "webdriver.Chrome",
     index_url: str,
     max_pages: int = 2,
-) -> List[Tuple[str, str]]:
+) -> List[IndexCard]:
     """
     immotop URL pattern: /annonces/XXXXXXX/
-    Returns list of (listing_ref, listing_url) tuples.
+    Returns one IndexCard (ref, url and the card's title / price / surface /
+    thumbnail) per listing.
     """
-    results: List[Tuple[str, str]] = []
-    current = index_url
-    wait    = WebDriverWait(driver, 20)
+    results: List[IndexCard] = []
+    seen    = set()
 
     for page in range(1, max_pages + 1):
-        log.info(f"  Index page {page}: {current}")
-        driver.get(current)
-        if page == 1:
-            _dismiss_cookies(driver)
-
-        try:
-            wait.until(EC.presence_of_element_located(
-                (By.CSS_SELECTOR, "a[href*='/annonces/']")
-            ))
-        except TimeoutException:
-            log.warning(f"  No listing links on page {page} — stopping.")
-            break
-
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(0.3)
-
-        soup = BeautifulSoup(driver.page_source, "lxml")
+        cards = get_index_page(driver, index_page_url(index_url, page), page, cookies=page == 1)
         new_cnt = 0
-        for a in soup.find_all("a", href=re.compile(r"/annonces/(\d+)")):
-            href = a["href"]
-            m    = re.search(r"/annonces/(\d+)", href)
-            if not m: continue
-            ref  = m.group(1)
-            full = href if href.startswith("http") else BASE_URL + href
-            if not any(r[0] == ref for r in results):
-                results.append((ref, full))
-                new_cnt += 1
+        for card in cards or []:
+            if card.ref in seen:
+                continue
+            seen.add(card.ref)
+            results.append(card)
+            new_cnt += 1
 
         log.info(f"    +{new_cnt} refs on page {page}  (total: {len(results)})")
         if new_cnt == 0:
             break
 
-        # Pagination — immotop uses ?pag=N
-        if "pag=" in current:
-            current = re.sub(r"pag=\d+", f"pag={page+1}", current)
-        else:
-            sep     = "&" if "?" in current else "?"
-            current = f"{current}{sep}pag={page+1}"
-
     log.info(f"  Collected {len(results)} refs from index.")
     return results
 
+# ─────────────────────────────────────────────────────────────
+# Image downloader
+# ─────────────────────────────────────────────────────────────
+
+def _download_images(urls: List[str], listing_ref: str) -> Path:
+    """Photos into the shared content-addressed store (image_store.py); returns images/<ref>."""
+    return image_store(IMAGES_ROOT, USER_AGENT).save_listing(listing_ref, urls)
+
 # ─────────────────────────────────────────────────────────────
 # Detail page scraper
 # ─────────────────────────────────────────────────────────────
@@ -325,12 +432,70 @@ def scrape_detail(
     transaction_type: str,
     save_images: bool = True,
 ) -> Dict:
-    driver.get(url)
-    time.sleep(0.5)
+    with _WAITS.work("detail.load"), rate_limiter().slot(url):
+        driver.get(url)
     _dismiss_cookies(driver)
+    if _WAITS.until(driver, "detail.h1", EC.presence_of_element_located((By.TAG_NAME, "h1")), 5) is None:
+        log.debug(f"  h1 wait timeout for {url}, continuing anyway")
+    discard_network_log(driver)  # the load's own events; a reveal wants the click's
 
-    soup = BeautifulSoup(driver.page_source, "lxml")
-    
+    # One parsed tree per page state; re-parsed only if the DOM changes
+    dom  = DomTracker(driver)
+    with _WAITS.work("detail.parse"):
+        page = dom.tree()
+        data = _parse_head(page, url, transaction_type)
+
+    # ── Phone from button click ──────────────────────────────
+    if not data.get("phone_number"):
+        page = _click_phone_button(driver, dom, page, data)
+
+    with _WAITS.work("detail.parse"):
+        _parse_body(page, data, transaction_type)
+
+    image_urls = json.loads(data.get("image_urls") or "[]")
+    if save_images and image_urls and data.get("listing_ref"):
+        with _WAITS.work("detail.images"):
+            data["images_dir"] = str(_download_images(image_urls, data["listing_ref"]))
+
+    log.info(
+        f"  ✓ ref={data.get('listing_ref')} | "
+        f"€{data.get('sale_price') or data.get('rent_price','?')} | "
+        f"{data.get('bedrooms','?')}bed | "
+        f"{data.get('surface_m2','?')}m² | "
+        f"{data.get('location','?')} | "
+        f"phone={data.get('phone_number','—')}"
+    )
+    return data
+
+
+_XP_REF_TEXT   = xpath(r"//text()[re:test(., 'référence\s*:\s*\S+', 'i')]", smart_strings=True)
+_XP_H1         = xpath("//h1")
+_XP_BREADCRUMBS = xpath(
+    "//ol//li"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' breadcrumb ')]//a"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' breadcrumb ')]//span"
+)
+_XP_CLASSED_BLOCKS = xpath("//div[@class] | //section[@class]")
+_XP_H2_H3      = xpath("//h2 | //h3")
+_XP_PRICE_BOX  = xpath("//*[contains(string(.), '€') and string-length(string(.)) < 100]")
+_XP_SECTIONS   = xpath("//section")
+_XP_CHAR_DIV   = xpath("//div[contains(@class, 'characteristics')]")
+_XP_DT         = xpath(".//dt")
+_XP_KV_BLOCKS  = xpath(".//div | .//p | .//li")
+_XP_ICON_BOXES = xpath("//span[@class] | //div[@class]")
+_XP_ENERGY_TXT = xpath(
+    "//text()[re:test(., 'efficacité énergétique|energy efficiency', 'i')]", smart_strings=True,
+)
+_XP_INSUL_TXT  = xpath("//text()[re:test(., 'consommation|isolation', 'i')]", smart_strings=True)
+_XP_AGENCY_SECTION = xpath("(//section | //div)[re:test(string(.), 'annonceur|advertiser', 'i')]")
+_XP_AGENCY_LINK = xpath(".//a[contains(@href, '/agences-immobilieres/')]")
+_XP_AGENT_CANDIDATES = xpath(".//div | .//span | .//p")
+_XP_IMAGES     = xpath("//img")
+_XP_SECTION_IMAGES = xpath(".//img")
+
+
+def _parse_head(page: PageTree, url: str, transaction_type: str) -> Dict:
+    """Ref, title, location, description and the description phone (pass 1)."""
     data: Dict = {
         "listing_url":      url,
         "source":           "immotop",
@@ -346,50 +511,52 @@ def scrape_detail(
     
     # Also try to find "référence: XXXXX" for listing_ref if not from URL
     if not data.get("listing_ref"):
-        ref_text = soup.find(string=re.compile(r"référence\s*:\s*\S+", re.I))
-        if ref_text:
-            parent_text = ref_text.parent.get_text() if ref_text.parent else ""
+        hits = _XP_REF_TEXT(page.root)
+        if hits:
+            ref_text = hits[0]
+            parent = text_parent(ref_text)
+            parent_text = text(parent) if parent is not None else ""
             ref_m = re.search(r"référence\s*:\s*(\d+)", parent_text, re.I)
             if ref_m:
                 data["listing_ref"] = ref_m.group(1)
 
     # ── Title ────────────────────────────────────────────────
-    h1 = soup.find("h1")
-    if h1:
-        data["title"] = _clean(h1.get_text())
+    h1s = _XP_H1(page.root)
+    h1  = h1s[0] if h1s else None
+    if h1 is not None:
+        data["title"] = _clean(text(h1))
 
     # ── Location ─────────────────────────────────────────────
     # immotop shows location under the h1, or in breadcrumb
     # Try the subtitle under h1 first
-    if h1:
-        next_elem = h1.find_next_sibling()
-        if next_elem and len(_clean(next_elem.get_text())) < 100:
-            data["location"] = _clean(next_elem.get_text())
+    if h1 is not None:
+        next_elem = next_element_sibling(h1)
+        if next_elem is not None and len(_clean(text(next_elem))) < 100:
+            data["location"] = _clean(text(next_elem))
     
     # Fallback: breadcrumb
     if not data.get("location"):
         skip = {"accueil","vente","location","annonces","immotop","appartement","maison"}
-        for crumb in reversed(soup.select("ol li, .breadcrumb a, .breadcrumb span")):
-            txt = _clean(crumb.get_text())
+        for crumb in reversed(_XP_BREADCRUMBS(page.root)):
+            txt = _clean(text(crumb))
             if txt and txt.lower() not in skip and len(txt) > 2:
                 data["location"] = txt
                 break
 
     # ── Description ──────────────────────────────────────────
     # immotop has Description section with "référence:" at start
-    desc_section = soup.find(lambda t: t.name in ("div","section") and
-                             re.search(r"description", (t.get("class") or [""])[0] if hasattr(t.get("class"), '__iter__') else "", re.I))
-    if not desc_section:
-        desc_h = soup.find(lambda t: t.name in ("h2","h3") and
-                           re.search(r"description", t.get_text(), re.I))
-        if desc_h:
-            desc_section = desc_h.parent
+    desc_section = next((
+        el for el in _XP_CLASSED_BLOCKS(page.root)
+        if re.search(r"description", ((el.get("class") or "").split() or [""])[0], re.I)
+    ), None)
+    if desc_section is None:
+        desc_h = next((h for h in _XP_H2_H3(page.root)
+                       if re.search(r"description", text(h), re.I)), None)
+        if desc_h is not None:
+            desc_section = desc_h.getparent()
     
-    if desc_section:
-        # Remove script/style noise
-        for tag in desc_section.find_all(["script","style"]):
-            tag.decompose()
-        data["description"] = _clean(desc_section.get_text("\n"))
+    if desc_section is not None:
+        data["description"] = _clean(text(desc_section, "\n"))
     
     # ── Phone from description ───────────────────────────────
     if data.get("description"):
@@ -397,37 +564,60 @@ def scrape_detail(
         if ph:
             data["phone_number"] = ph
             data["phone_source"] = "description"
-    
-    # ── Phone from button click ──────────────────────────────
-    if not data.get("phone_number"):
-        # immotop uses "Afficher le téléphone" button
-        try:
-            xpath = "//button[contains(text(), 'Afficher le téléphone')] | //a[contains(text(), 'Afficher le téléphone')]"
-            btn = driver.find_element(By.XPATH, xpath)
-            driver.execute_script("arguments[0].scrollIntoView(true);", btn)
-            time.sleep(0.1)
-            btn.click()
-            time.sleep(0.5)
-            
-            # Phone appears in text or as a link
-            soup = BeautifulSoup(driver.page_source, "lxml")
-            for link in soup.find_all("a", href=re.compile(r"^tel:")):
-                raw = link.get("href").replace("tel:","").strip()
-                ph = _extract_phone(raw)
-                if ph:
-                    data["phone_number"] = ph
-                    data["phone_source"] = "button"
-                    break
-            
-            # Fallback: scan for phone in visible text near button
-            if not data.get("phone_number"):
-                page_text = soup.get_text()
-                ph = _extract_phone(page_text)
-                if ph:
-                    data["phone_number"] = ph
-                    data["phone_source"] = "button"
-        except Exception as e:
-            log.debug(f"  Phone button not found or click failed: {e}")
+    return data
+
+
+def _click_phone_button(
+    driver: "webdriver.Chrome", dom: DomTracker, page: PageTree, data: Dict,
+) -> PageTree:
+    """
+    Click "Afficher le téléphone" once and read the revealed number into
+    `data` — from the reveal XHR or a tel: link (phone_reveal.py), else from
+    the page text. Records the reveal latency. Returns the tree of the page
+    after the click — `page` itself when there was nothing to click or the
+    click didn't change the DOM.
+    """
+    try:
+        xpath_btn = "//button[contains(text(), 'Afficher le téléphone')] | //a[contains(text(), 'Afficher le téléphone')]"
+        btn = driver.find_element(By.XPATH, xpath_btn)
+    except Exception as e:
+        log.debug(f"  Phone button not found: {e}")
+        return page
+
+    res = reveal_phone(driver, btn, extract=_extract_phone, tel_to_phone=_extract_phone)
+    _WAITS.record("detail.phone", wait=res.ms / 1000, timed_out=res.via == "none")
+    page = dom.tree()
+    if not res.phone:
+        # Fallback: number rendered as plain text near the button
+        ph = _extract_phone(page.text())
+        if ph:
+            res = res._replace(phone=ph, via="page_text")
+    data["_phone_reveal_ms"]  = res.ms
+    data["_phone_reveal_via"] = res.via
+    if res.phone:
+        data["phone_number"] = res.phone
+        data["phone_source"] = "button"
+    log.debug(f"  Phone reveal: {res.via} in {res.ms} ms")
+    return page
+
+
+def _following_texts(el: Any, limit: int) -> List[str]:
+    """Text of the first `limit` sibling nodes after el (text runs, comments, elements)."""
+    out: List[str] = []
+    if el.tail:
+        out.append(el.tail)
+    for sib in el.itersiblings():
+        out.append(text(sib) if isinstance(sib.tag, str) else "")
+        if sib.tail:
+            out.append(sib.tail)
+        if len(out) >= limit:
+            break
+    return out[:limit]
+
+
+def _parse_body(page: PageTree, data: Dict, transaction_type: str) -> None:
+    """Price, characteristics, energy classes, agency and images."""
+    root = page.root
 
     # ── Characteristics ──────────────────────────────────────
     # immotop can use several formats:
@@ -438,16 +628,13 @@ def scrape_detail(
     # Strategy: collect all text that looks like "Label: Value" or "Label Value"
     # anywhere on the page, then map to our fields
     
-    page_text = soup.get_text(separator="\n")
-    
     # Parse key characteristics from the page summary (top of page near price)
     # immotop shows: price, bedrooms (🛏), surface (m²), etc. with icons
     
     # Price - look near € symbol and h1
-    price_section = soup.find(lambda t: "€" in t.get_text() and 
-                              len(t.get_text()) < 100)
-    if price_section:
-        price_text = price_section.get_text()
+    price_boxes = _XP_PRICE_BOX(root)
+    if price_boxes:
+        price_text = text(price_boxes[0])
         if transaction_type == "buy":
             data["sale_price"] = _parse_price(price_text)
         else:
@@ -455,36 +642,35 @@ def scrape_detail(
     
     # Look for structured characteristics section
     # Try multiple selectors
-    char_section = None
-    for selector in [
-        lambda t: t.name == "section" and "caractéristiques" in t.get_text().lower()[:200],
-        lambda t: t.name == "div" and t.get("class") and "characteristics" in str(t.get("class")),
-        lambda t: t.name in ("h2","h3") and "caractéristiques" in t.get_text().lower()
-    ]:
-        char_section = soup.find(selector)
-        if char_section and char_section.name in ("h2","h3"):
-            char_section = char_section.find_parent()
-        if char_section:
-            break
+    char_section = next((t for t in _XP_SECTIONS(root)
+                         if "caractéristiques" in text(t).lower()[:200]), None)
+    if char_section is None:
+        divs = _XP_CHAR_DIV(root)
+        char_section = divs[0] if divs else None
+    if char_section is None:
+        heading = next((h for h in _XP_H2_H3(root)
+                        if "caractéristiques" in text(h).lower()), None)
+        if heading is not None:
+            char_section = heading.getparent()
     
     # Parse all label-value pairs from characteristics section (or whole page if not found)
-    search_area = char_section if char_section else soup
+    search_area = char_section if char_section is not None else root
     
     # Method 1: dt/dd pairs
-    for dt in search_area.find_all("dt"):
-        label = _clean(dt.get_text()).lower()
-        dd = dt.find_next_sibling("dd")
-        if not dd:
+    for dt in _XP_DT(search_area):
+        label = _clean(text(dt)).lower()
+        dd = next_element_sibling(dt, "dd")
+        if dd is None:
             continue
-        value = _clean(dd.get_text())
+        value = _clean(text(dd))
         _map_characteristic(label, value, data, transaction_type)
     
     # Method 2: Divs/spans with ":" separator
-    for elem in search_area.find_all(["div","p","li"]):
-        text = _clean(elem.get_text())
-        if ":" not in text or len(text) > 150:
+    for elem in _XP_KV_BLOCKS(search_area):
+        el_text = _clean(text(elem))
+        if ":" not in el_text or len(el_text) > 150:
             continue
-        parts = text.split(":", 1)
+        parts = el_text.split(":", 1)
         if len(parts) == 2:
             label = parts[0].lower().strip()
             value = parts[1].strip()
@@ -492,68 +678,70 @@ def scrape_detail(
     
     # Method 3: Look for numeric + unit patterns in icon-based displays
     # e.g. "3" next to a bed icon, "135 m²" next to area icon
-    for elem in soup.find_all(["span","div"], class_=True):
-        text = _clean(elem.get_text())
+    for elem in _XP_ICON_BOXES(root):
+        el_text = _clean(text(elem))
         # Bedrooms: just a number (1-20 range)
-        if re.match(r"^\d{1,2}$", text) and not data.get("bedrooms"):
-            num = int(text)
+        if re.match(r"^\d{1,2}$", el_text) and not data.get("bedrooms"):
+            num = int(el_text)
             if 1 <= num <= 20:
                 # Check if near bedroom-related text
-                context = _clean(elem.parent.get_text()) if elem.parent else ""
+                parent  = elem.getparent()
+                context = _clean(text(parent)) if parent is not None else ""
                 if "chambre" in context.lower() or "bedroom" in context.lower():
                     data["bedrooms"] = num
         
         # Surface: number + m²
-        if re.search(r"\d+\s*m²", text) and not data.get("surface_m2"):
-            data["surface_m2"] = _parse_float(text)
+        if re.search(r"\d+\s*m²", el_text) and not data.get("surface_m2"):
+            data["surface_m2"] = _parse_float(el_text)
     
     # Energy classes - look for specific patterns
-    for section in [soup.find(string=re.compile(r"efficacité énergétique|energy efficiency", re.I)),
-                    soup.find(string=re.compile(r"consommation|isolation", re.I))]:
-        if not section:
+    for hits in (_XP_ENERGY_TXT(root), _XP_INSUL_TXT(root)):
+        if not hits:
             continue
-        parent = section.parent
-        if not parent:
+        parent = text_parent(hits[0])
+        if parent is None:
             continue
         # Energy class usually in a sibling or nearby element with just "A", "B", etc.
-        for neighbor in list(parent.next_siblings)[:5] + list(parent.find_all())[:10]:
-            if not hasattr(neighbor, 'get_text'):
-                continue
-            text = _clean(neighbor.get_text())
-            if re.match(r"^[A-G](\+{1,3})?$", text):
-                if "isolation" in _clean(parent.get_text()).lower():
-                    data["thermal_insulation_class"] = text
+        neighbours = _following_texts(parent, 5) + [
+            text(d) for d in list(parent.iterdescendants(etree.Element))[:10]
+        ]
+        for neighbour_text in neighbours:
+            val = _clean(neighbour_text)
+            if re.match(r"^[A-G](\+{1,3})?$", val):
+                if "isolation" in _clean(text(parent)).lower():
+                    data["thermal_insulation_class"] = val
                 else:
-                    data["energy_class"] = text
+                    data["energy_class"] = val
 
     # ── Agency ───────────────────────────────────────────────
     # immotop shows agency in "Annonceur" section
-    agency_section = soup.find(lambda t: t.name in ("section","div") and
-                               re.search(r"annonceur|advertiser", t.get_text() or "", re.I))
-    if agency_section:
+    sections = _XP_AGENCY_SECTION(root)
+    if sections:
+        agency_section = sections[0]
         # Agency name - usually in an <a> tag or bold text
-        a_link = agency_section.find("a", href=re.compile(r"/agences-immobilieres/"))
-        if a_link:
-            data["agency_name"] = _clean(a_link.get_text())
-            href = a_link["href"]
+        links = _XP_AGENCY_LINK(agency_section)
+        if links:
+            data["agency_name"] = _clean(text(links[0]))
+            href = links[0].get("href")
             data["agency_url"] = href if href.startswith("http") else BASE_URL + href
         
         # Agent name - often in an alt tag or near a profile photo
-        agent_elem = agency_section.find(lambda t: t.name in ("div","span","p") and
-                                         len(_clean(t.get_text())) < 60 and
-                                         re.search(r"[A-Z][a-z]+ [A-Z]", t.get_text()))
-        if agent_elem:
-            data["agent_name"] = _clean(agent_elem.get_text())
+        agent_elem = next((
+            t for t in _XP_AGENT_CANDIDATES(agency_section)
+            if len(_clean(text(t))) < 60 and re.search(r"[A-Z][a-z]+ [A-Z]", text(t))
+        ), None)
+        if agent_elem is not None:
+            data["agent_name"] = _clean(text(agent_elem))
         
         # Logo
-        logo = agency_section.find("img")
-        if logo and logo.get("src"):
-            src = logo["src"]
+        logos = _XP_SECTION_IMAGES(agency_section)
+        if logos and logos[0].get("src"):
+            src = logos[0].get("src")
             data["agency_logo_url"] = src if src.startswith("http") else BASE_URL + src
 
     # ── Images ───────────────────────────────────────────────
     image_urls: List[str] = []
-    for img in soup.find_all("img"):
+    for img in _XP_IMAGES(root):
         for attr in ("src","data-src","data-lazy-src"):
             src = (img.get(attr) or "").strip()
             if src and not src.startswith("data:") and "logo" not in src and src not in image_urls:
@@ -565,97 +753,119 @@ def scrape_detail(
                     break
     data["image_urls"] = json.dumps(image_urls[:20])  # Limit to first 20
 
-    log.info(
-        f"  ✓ ref={data.get('listing_ref')} | "
-        f"€{data.get('sale_price') or data.get('rent_price','?')} | "
-        f"{data.get('bedrooms','?')}bed | "
-        f"{data.get('surface_m2','?')}m² | "
-        f"{data.get('location','?')} | "
-        f"phone={data.get('phone_number','—')}"
-    )
-    return data
 
+# ── Characteristic label → field handlers ────────────────────
+# Each handler takes (value, data, transaction_type). _CHAR_RULES is the old
+# if/elif chain in the same order: the first rule matching the label wins.
 
-def _map_characteristic(label: str, value: str, data: Dict, transaction_type: str) -> None:
-    """Map an immotop label-value pair to our DB fields."""
-    label = label.lower().strip()
-    value = value.strip()
-    
+def _store(field: str, parse: Callable[[str], Any]) -> Callable:
+    def handler(value: str, data: Dict, transaction_type: str) -> None:
+        data[field] = parse(value)
+    handler.__name__ = field
+    return handler
+
+def _price(value: str, data: Dict, transaction_type: str) -> None:
+    if transaction_type == "buy":
+        data["sale_price"] = _parse_price(value)
+    else:
+        data["rent_price"] = _parse_price(value)
+
+def _baths_showers(value: str, data: Dict, transaction_type: str) -> None:
+    count = _parse_int(value)
+    if count:
+        # immotop combines them - split equally or put all in showers
+        data["shower_rooms"] = count
+
+def _terrace(value: str, data: Dict, transaction_type: str) -> None:
+    if re.search(r"\d", value):
+        data["terrace_m2"] = _parse_float(value)
+    else:
+        data["balcony"] = _parse_bool(value)  # Generic
+
+def _balcony(value: str, data: Dict, transaction_type: str) -> None:
+    if re.search(r"\d", value):
+        data["balcony_m2"] = _parse_float(value)
+    else:
+        data["balcony"] = _parse_bool(value)
+
+def _kitchen(value: str, data: Dict, transaction_type: str) -> None:
+    if "équipée" in value.lower() or "equipped" in value.lower():
+        data["fitted_kitchen"] = 1
+    elif "ouverte" in value.lower() or "open" in value.lower():
+        data["open_kitchen"] = 1
+
+_CHAR_RULES = LabelDispatch([
     # Price
-    if "prix" in label and "m²" not in label:
-        if transaction_type == "buy":
-            data["sale_price"] = _parse_price(value)
-        else:
-            data["rent_price"] = _parse_price(value)
-    elif "charges" in label or "monthly" in label:
-        data["monthly_charges"] = _parse_price(value)
-    elif "caution" in label or "deposit" in label or "garantie" in label:
-        data["deposit"] = _parse_price(value)
-    
+    LabelRule(_price,                                   any=("prix",), none=("m²",)),
+    LabelRule(_store("monthly_charges", _parse_price),  any=("charges", "monthly")),
+    LabelRule(_store("deposit", _parse_price),          any=("caution", "deposit", "garantie")),
     # Dimensions
-    elif "superficie" in label or "surface habitable" in label or "surface" in label:
-        data["surface_m2"] = _parse_float(value)
-    elif "étage" in label or "floor" in label:
-        data["floor"] = _parse_int(value)
-    
+    LabelRule(_store("surface_m2", _parse_float),       any=("superficie", "surface habitable", "surface")),
+    LabelRule(_store("floor", _parse_int),              any=("étage", "floor")),
     # Rooms
-    elif label == "chambres" or label == "bedrooms" or "chambres à coucher" in label:
-        data["bedrooms"] = _parse_int(value)
-    elif "chambres/pièces" in label or label == "pièces" or label == "rooms":
-        data["rooms"] = _parse_int(value)
-    
+    LabelRule(_store("bedrooms", _parse_int),           exact=("chambres", "bedrooms"), any=("chambres à coucher",)),
+    LabelRule(_store("rooms", _parse_int),              exact=("pièces", "rooms"), any=("chambres/pièces",)),
     # Bathrooms
-    elif "bains/douches" in label or "salles de bain" in label or "bathrooms" in label:
-        count = _parse_int(value)
-        if count:
-            # immotop combines them - split equally or put all in showers
-            data["shower_rooms"] = count
-    elif "douche" in label and "salle" in label:
-        data["shower_rooms"] = _parse_int(value)
-    elif "salle de bain" in label:
-        data["bathrooms"] = _parse_int(value)
-    elif "wc" in label or "toilette" in label:
-        data["separate_toilets"] = _parse_int(value)
-    
+    LabelRule(_baths_showers,                           any=("bains/douches", "salles de bain", "bathrooms")),
+    LabelRule(_store("shower_rooms", _parse_int),       all=("douche", "salle")),
+    LabelRule(_store("bathrooms", _parse_int),          any=("salle de bain",)),
+    LabelRule(_store("separate_toilets", _parse_int),   any=("wc", "toilette")),
     # Outdoor
-    elif "terrasse" in label:
-        if re.search(r"\d", value):
-            data["terrace_m2"] = _parse_float(value)
-        else:
-            data["balcony"] = _parse_bool(value)  # Generic
-    elif "balcon" in label:
-        if re.search(r"\d", value):
-            data["balcony_m2"] = _parse_float(value)
-        else:
-            data["balcony"] = _parse_bool(value)
-    elif "jardin" in label or "garden" in label:
-        data["garden"] = _parse_bool(value)
-    
+    LabelRule(_terrace,                                 any=("terrasse",)),
+    LabelRule(_balcony,                                 any=("balcon",)),
+    LabelRule(_store("garden", _parse_bool),            any=("jardin", "garden")),
     # Facilities
-    elif "ascenseur" in label or "elevator" in label or "lift" in label:
-        data["elevator"] = _parse_bool(value)
-    elif "cave" in label or "basement" in label or "cellar" in label:
-        data["basement"] = _parse_bool(value)
-    elif "parking" in label or "garage" in label or "box" in label or "stationnement" in label:
-        data["parking_spaces"] = _parse_int(value)
-    elif "buanderie" in label or "laundry" in label:
-        data["laundry_room"] = _parse_bool(value)
-    
+    LabelRule(_store("elevator", _parse_bool),          any=("ascenseur", "elevator", "lift")),
+    LabelRule(_store("basement", _parse_bool),          any=("cave", "basement", "cellar")),
+    LabelRule(_store("parking_spaces", _parse_int),     any=("parking", "garage", "box", "stationnement")),
+    LabelRule(_store("laundry_room", _parse_bool),      any=("buanderie", "laundry")),
     # Kitchen
-    elif "cuisine" in label:
-        if "équipée" in value.lower() or "equipped" in value.lower():
-            data["fitted_kitchen"] = 1
-        elif "ouverte" in value.lower() or "open" in value.lower():
-            data["open_kitchen"] = 1
-    
+    LabelRule(_kitchen,                                 any=("cuisine",)),
     # Other
-    elif "meublé" in label or "furnished" in label:
-        data["furnished"] = _parse_bool(value)
-    elif "année" in label or "construction" in label or "built" in label:
-        data["year_of_construction"] = _parse_int(value)
-    elif "disponibilité" in label or "availability" in label or "libre" in label:
-        data["availability"] = value
+    LabelRule(_store("furnished", _parse_bool),         any=("meublé", "furnished")),
+    LabelRule(_store("year_of_construction", _parse_int), any=("année", "construction", "built")),
+    LabelRule(_store("availability", str),              any=("disponibilité", "availability", "libre")),
+])
+
+
+def _map_characteristic(label: str, value: str, data: Dict, transaction_type: str) -> None:
+    """Map an immotop label-value pair to our DB fields (first matching rule wins)."""
+    handler = _CHAR_RULES.lookup(label.lower().strip())
+    if handler is not None:
+        handler(value.strip(), data, transaction_type)
+
 
+HTTP_POOL_SIZE = 10   # keep-alive connections per host
+_http_lock     = threading.Lock()
+_http_session_shared: Optional[requests.Session] = None
+
+def _http_session() -> requests.Session:
+    """One pooled keep-alive Session shared by every title check of the process."""
+    global _http_session_shared
+    if _http_session_shared is None:
+        with _http_lock:
+            if _http_session_shared is None:
+                sess = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=1,
+                )
+                sess.mount("https://", adapter)
+                sess.mount("http://", adapter)
+                sess.headers.update({"User-Agent": USER_AGENT})
+                _http_session_shared = sess
+    return _http_session_shared
+
+
+def _title_changes_http(url: str, existing: Dict) -> Dict[str, Tuple[Any, Any]]:
+    """{"title": (old, new)} when the detail page's <h1> differs from the stored title."""
+    try:
+        resp = rate_limiter().request(_http_session().get, url, timeout=10)
+        h1 = _XP_H1(PageTree(resp.text).root)
+        current_title = _clean(text(h1[0])) if h1 else ""
+    except Exception:
+        return {}
+    old_title = existing.get("title", "")
+    return {"title": (old_title, current_title)} if current_title and current_title != old_title else {}
 
 # ─────────────────────────────────────────────────────────────
 # Main run function
@@ -664,9 +874,15 @@ def _map_characteristic(label: str, value: str, data: Dict, transaction_type: st
 def run(
     index_configs:       List[Dict],
     max_pages_per_index: int   = 2,
-    save_images:         bool  = False,  # TODO: implement
+    save_images:         bool  = False,
     delay_seconds:       float = 0,
     headless:            bool  = True,
+    concurrency:         int   = 1,
+    lightweight:         bool  = False,  # eager loads, no images/fonts/trackers in Chrome
+    queue_path:          Path  = QUEUE_PATH,  # detail-page jobs survive an interrupted run
+    backfill_jobs:       int   = BACKFILL_PER_RUN,  # backfill.py jobs taken after the live ones
+    pool:                Optional[DriverPool] = None,  # caller's long-lived sessions (kept open)
+    leases:              Optional[Leases] = None,  # work shared with other nodes (leases.py)
 ) -> Dict[str, int]:
     if not SELENIUM_OK:
         log.error("Selenium not installed.")
@@ -675,8 +891,37 @@ def run(
     # Ensure DB exists (create schema if needed)
     db_init()
 
-    driver = _make_driver(headless=headless)
-    counters = {"inserted": 0, "updated": 0, "skipped": 0, "stopped_early": 0}
+    own_pool = pool is None
+    if own_pool:
+        pool = DriverPool(lambda: _make_driver(headless=headless, lightweight=lightweight),
+                          size=concurrency)
+    started = pool.snapshot()
+    counters = {"inserted": 0, "updated": 0, "skipped": 0, "stopped_early": 0, "failed": 0, "backfill_jobs": 0,
+                "partitions": 0, "duplicate_refs": 0,
+                "title_fetches": 0, "phone_reveals": 0, "phone_reveal_ms": 0, "phone_reveal_max_ms": 0}
+    _CHAR_RULES.reset_stats()  # per-run label hit rates
+    _WAITS.reset_stats()
+
+    # Refs already in the DB, loaded once; membership checks stay in memory
+    refs = KnownRefs.load("immotop", db_count_known, db_get_known, db_iter_refs, fetch=db_get)
+    log.info(f"Known immotop listings: {len(refs)}")
+    queue = JobQueue(queue_path)
+    written: List[str] = []   # job URLs whose listing sits in the writer's buffer
+
+    shard = Shard(leases, queue) if leases else None
+
+    def _write(items: List[Tuple[Dict, bool]]) -> Dict[str, int]:
+        if shard:                     # drop listings another node has taken over meanwhile
+            items = shard.still_held(items, written)
+        counts = db_upsert_many(items)
+        if shard:
+            shard.finish(written)
+        queue.complete(written)
+        written.clear()
+        return counts
+
+    backfill_left = backfill_jobs
+    writer = BatchWriter(_write)
 
     try:
         for cfg in index_configs:
@@ -686,52 +931,85 @@ def run(
             log.info(f"INDEX  {idx_url}  [{t_type}]")
             log.info("="*60)
 
-            ref_pairs = get_index_refs(driver, idx_url, max_pages=max_pages_per_index)
+            # Every sub-index (the index itself when it isn't partitioned)
+            # walks to its own watermark; the pool reads them side by side
+            subs = shard.indexes(expand(cfg)) if shard else expand(cfg)
+            found = discover(pool, subs, get_index_refs, refs, "immotop",
+                             _title_changes_http, max_pages=max_pages_per_index)
+            jobs, duplicates = merge(found)
+            counters["partitions"]     += len(found)
+            counters["stopped_early"]  += sum(p.stopped for p in found)
+            counters["title_fetches"]  += sum(p.title_fetches for p in found)
+            counters["duplicate_refs"] += duplicates
+            queue.enqueue(jobs)
 
-            for i, (ref, lurl) in enumerate(ref_pairs, 1):
-                existing = db_get(ref)
+            def _scrape(job: Job) -> Tuple[Optional[Dict], str]:
+                try:
+                    d = pool.call(scrape_detail, job.url, t_type, save_images=save_images)
+                except Exception as e:
+                    return None, f"{type(e).__name__}: {e}"
+                time.sleep(delay_seconds)
+                return d, "" if d else "no data parsed"
 
-                if existing is None:
-                    log.info(f"[{i}] NEW  {ref}  {lurl}")
-                    d = scrape_detail(driver, lurl, t_type, save_images=save_images)
-                    if d:
-                        db_upsert(d, is_update=False)
-                        counters["inserted"] += 1
-                    time.sleep(delay_seconds)
-                else:
-                    # Check title change via lightweight fetch
-                    try:
-                        resp = requests.get(
-                            lurl, headers={"User-Agent": USER_AGENT}, timeout=10
-                        )
-                        soup_light = BeautifulSoup(resp.text, "lxml")
-                        h1 = soup_light.find("h1")
-                        current_title = _clean(h1.get_text()) if h1 else ""
-                    except Exception:
-                        current_title = existing.get("title", "")
-
-                    old_title = existing.get("title", "")
-
-                    if current_title and current_title != old_title:
-                        log.info(f"[{i}] UPDATED  {ref}")
-                        d = scrape_detail(driver, lurl, t_type, save_images=save_images)
-                        if d:
-                            db_upsert(d, is_update=True)
-                            counters["updated"] += 1
-                        time.sleep(delay_seconds)
-                    else:
-                        log.info(f"[{i}] STOP — hit known listing {ref}")
-                        counters["stopped_early"] += 1
+            # Lease in chunks: this index's jobs plus whatever an interrupted
+            # run left behind (failed pages come back after their backoff),
+            # then at most `backfill_jobs` of the backfill crawler's jobs
+            chunk = max(4 * pool.size, 20)   # a caller's pool sets the parallelism, not `concurrency`
+            for min_priority in (PRIORITY_LIVE, PRIORITY_BACKFILL):
+                while True:
+                    limit = chunk if min_priority == PRIORITY_LIVE else min(chunk, backfill_left)
+                    leased = queue.lease("immotop", t_type, limit=limit, min_priority=min_priority) if limit > 0 else []
+                    if not leased:
                         break
+                    if min_priority == PRIORITY_BACKFILL:
+                        backfill_left -= len(leased)
+                        counters["backfill_jobs"] += len(leased)
+                    if shard:                 # only the jobs no other node is on
+                        leased = shard.claim(leased)
+                    writer.tick()
+                    for job, (d, error) in zip(leased, pool.imap(_scrape, leased)):
+                        if not d:
+                            counters["failed"] += 1
+                            log.warning(f"  {job.url}: {error} — job {queue.fail(job.url, error)}")
+                            writer.tick()     # no add() to check the buffer's age
+                            continue
+                        written.append(job.url)
+                        writer.add(d, is_update=job.is_update)
+                        refs.add(d["listing_ref"], d)
+                        if "_phone_reveal_ms" in d:
+                            counters["phone_reveals"] += 1
+                            counters["phone_reveal_ms"] += d["_phone_reveal_ms"]
+                            counters["phone_reveal_max_ms"] = max(counters["phone_reveal_max_ms"],
+                                                                  d["_phone_reveal_ms"])
 
     finally:
-        driver.quit()
+        writer.close()
+        if own_pool:
+            pool.close()
+
+    for outcome, n in writer.totals.items():
+        counters[outcome] = counters.get(outcome, 0) + n
+    counters["driver_launches"]  = pool.launched - started["launched"]
+    counters["driver_startup_s"] = round(pool.launch_seconds - started["launch_seconds"], 1)
 
     log.info(
         f"\nRun complete.\n"
         f"  inserted: {counters['inserted']}\n"
         f"  updated:  {counters['updated']}\n"
-        f"  stopped early: {counters['stopped_early']}"
+        f"  DB writes: {writer.flushes} batches, {counters.get('unchanged', 0)} already stored\n"
+        f"  stopped early: {counters['stopped_early']} of {counters['partitions']} (sub-)indexes, "
+        f"{counters['duplicate_refs']} refs found in two partitions\n"
+        f"  failed pages: {counters['failed']}  backfill jobs: {counters['backfill_jobs']}  queue: {queue.counts('immotop')}\n"
+        f"  title-only fetches: {counters['title_fetches']}\n"
+        f"  phone reveals: {counters['phone_reveals']}, "
+        f"avg {counters['phone_reveal_ms'] // max(counters['phone_reveals'], 1)} ms, "
+        f"max {counters['phone_reveal_max_ms']} ms\n"
+        f"  images: {image_store(IMAGES_ROOT, USER_AGENT).report() if save_images else 'not saved'}\n"
+        f"  drivers: {pool.report(started)}\n"
+        f"  sharding: {shard.report() if shard else 'single node'}\n"
+        f"  request rates by host:\n{rate_limiter().report()}\n"
+        f"  characteristic labels: {_CHAR_RULES.report()}\n"
+        f"  wait vs work by call site:\n{_WAITS.report()}"
     )
     return counters
 
@@ -749,7 +1027,7 @@ if __name__ == "__main__":
     run(
         index_configs        = INDEX_URLS,
         max_pages_per_index  = 2,
-        save_images          = False,  # TODO
+        save_images          = False,
         delay_seconds        = 0,
         headless             = True,
     )
\ No newline at end of file
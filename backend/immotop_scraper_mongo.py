@@ -20,7 +20,12 @@ from immotop_scraper import *
 import mongo_db
 db_init = mongo_db.db_init
 db_get = mongo_db.db_get
+db_get_known = mongo_db.db_get_known
+db_count_known = mongo_db.db_count_known
+db_iter_refs = mongo_db.db_iter_refs
+db_first_seen = mongo_db.db_first_seen
 db_upsert = mongo_db.db_upsert
+db_upsert_many = mongo_db.db_upsert_many
 db_stats = mongo_db.db_stats
 
 # The rest of immotop_scraper.py works unchanged!
@@ -0,0 +1,165 @@
+"""
+Index cards
+===========
+What an index page already tells us about each listing, so known refs can be
+checked for changes without fetching their detail page.
+
+  • cards_from_page() walks every listing link of a parsed index page and
+    reads the card around it: the largest ancestor whose listing links all
+    point to the same ref (cards often link the photo and the title
+    separately). From that card it takes the title, first price, surface and
+    thumbnail.
+  • card_changes() diffs a card against the stored row in memory: prices
+    and surfaces numerically, titles leniently (case / spacing /
+    punctuation, and one may contain the other — cards often shorten the
+    detail page's <h1>). It returns None when the card carried nothing
+    comparable; the caller then falls back to fetching the title.
+
+Usage:
+    cards = cards_from_page(page.root, re.compile(r"/id-(\\d+)\\.html"), BASE_URL)
+    changes = card_changes(card, db_get(card.ref), "buy")
+"""
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from page_tree import xpath, text
+
+_XP_LINKS     = xpath("//a[@href]")
+_XP_SUB_HREFS = xpath(".//a/@href")
+_XP_HEADINGS  = xpath(".//h1 | .//h2 | .//h3 | .//h4 | .//*[contains(@class, 'title')]")
+_XP_IMG       = xpath(".//img")
+
+_AMOUNT     = r"(\d{1,3}(?:[\s.']\d{3})+|\d+)"      # 895 000 / 895.000 / 895'000 / 895000
+_PRICE_RE   = re.compile(_AMOUNT + r"(?:,\d{1,2})?\s*€|€\s*" + _AMOUNT)
+_SURFACE_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*m(?:²|2)\b", re.I)
+_WORDS_RE   = re.compile(r"\w+")
+
+MAX_CARD_DEPTH = 8   # ancestors climbed from a link looking for its card
+
+
+class IndexCard(NamedTuple):
+    ref:        str
+    url:        str
+    title:      str = ""
+    price:      Optional[float] = None
+    surface_m2: Optional[float] = None
+    thumbnail:  Optional[str] = None
+
+
+def _number(raw: str) -> Optional[float]:
+    digits = re.sub(r"\D", "", raw or "")
+    return float(digits) if digits else None
+
+
+def card_price(card_text: str) -> Optional[float]:
+    m = _PRICE_RE.search(card_text)
+    return _number(m.group(1) or m.group(2)) if m else None
+
+
+def card_surface(card_text: str) -> Optional[float]:
+    m = _SURFACE_RE.search(card_text)
+    return float(m.group(1).replace(",", ".")) if m else None
+
+
+def _card_root(link: Any, ref: str, ref_re: Pattern) -> Any:
+    """Largest ancestor of `link` whose listing links all point to `ref`."""
+    card = link
+    node = link.getparent()
+    for _ in range(MAX_CARD_DEPTH):
+        if node is None or node.tag in ("body", "html"):
+            break
+        refs = {m.group(1) for m in map(ref_re.search, _XP_SUB_HREFS(node)) if m}
+        if refs - {ref}:
+            break
+        card = node
+        node = node.getparent()
+    return card
+
+
+def _card_title(card: Any, link: Any) -> str:
+    for h in _XP_HEADINGS(card):
+        t = " ".join(text(h).split())
+        if 3 <= len(t) <= 200:
+            return t
+    for attr in ("title", "aria-label"):
+        if link.get(attr):
+            return " ".join(link.get(attr).split())
+    t = " ".join(text(link).split())
+    return t if len(t) <= 200 else ""
+
+
+def _card_thumbnail(card: Any) -> Optional[str]:
+    for img in _XP_IMG(card):
+        for attr in ("src", "data-src", "data-lazy-src", "srcset"):
+            val = (img.get(attr) or "").strip()
+            if val and not val.startswith("data:"):
+                return val.split(",")[0].split()[0]
+    return None
+
+
+def cards_from_page(root: Any, ref_re: Pattern, base_url: str) -> List[IndexCard]:
+    """One IndexCard per listing ref on the page, in document order."""
+    cards: List[IndexCard] = []
+    seen = set()
+    for link in _XP_LINKS(root):
+        href = link.get("href")
+        m = ref_re.search(href)
+        if not m or m.group(1) in seen:
+            continue
+        ref = m.group(1)
+        seen.add(ref)
+        card = _card_root(link, ref, ref_re)
+        card_text = " ".join(text(card, " ").split())
+        cards.append(IndexCard(
+            ref        = ref,
+            url        = href if href.startswith("http") else base_url + href,
+            title      = _card_title(card, link),
+            price      = card_price(card_text),
+            surface_m2 = card_surface(card_text),
+            thumbnail  = _card_thumbnail(card),
+        ))
+    return cards
+
+
+def _words(s: str) -> str:
+    return " ".join(_WORDS_RE.findall((s or "").casefold()))
+
+
+def titles_match(card_title: str, stored_title: str) -> Optional[bool]:
+    """
+    True when the card's title is the start of the stored one (cards cut long
+    titles off); None when either has no words to compare.
+    """
+    card, stored = _words(card_title), _words(stored_title)
+    if not card or not stored:
+        return None
+    return stored.startswith(card)
+
+
+def card_changes(card: IndexCard, row: Dict, transaction_type: str
+                 ) -> Optional[Dict[str, Tuple[Any, Any]]]:
+    """
+    {field: (stored, card)} for every card field that differs from the stored
+    row; {} when the listing looks unchanged; None when the card had no
+    field to compare (no title, price or surface on it).
+    """
+    price_field = "sale_price" if transaction_type == "buy" else "rent_price"
+    compared = 0
+    changes: Dict[str, Tuple[Any, Any]] = {}
+
+    if card.price is not None and row.get(price_field) is not None:
+        compared += 1
+        if round(card.price) != round(float(row[price_field])):
+            changes[price_field] = (row[price_field], card.price)
+    if card.surface_m2 is not None and row.get("surface_m2") is not None:
+        compared += 1
+        if abs(card.surface_m2 - float(row["surface_m2"])) > 0.5:
+            changes["surface_m2"] = (row["surface_m2"], card.surface_m2)
+    same_title = titles_match(card.title or "", row.get("title") or "")
+    if same_title is not None:
+        compared += 1
+        if not same_title:
+            changes["title"] = (row["title"], card.title)
+
+    return changes if compared else None
@@ -0,0 +1,198 @@
+"""
+Job queue
+=========
+Durable queue of detail pages to scrape, so a run that dies between index
+discovery and the detail scrape loses nothing: the next run resumes the
+unfinished jobs before (and alongside) what it discovers itself.
+
+  • One SQLite table (scrape_jobs, in QUEUE_PATH) keyed by listing URL:
+    state pending → leased → done | failed, attempts, leased_until,
+    not_before (retry backoff) and the last error.
+  • lease() hands out up to `limit` pending jobs — plus leased ones whose
+    lease ran out (their worker died) — in discovery order, atomically, so
+    several processes can share the queue.
+  • complete() marks jobs done once their listing is written; fail() puts a
+    job back with exponential backoff, or marks it failed after
+    MAX_ATTEMPTS; defer() puts it back without an attempt (another node
+    holds its lease, see leases.py).
+  • Re-enqueuing a done/failed URL (the listing changed again) makes it
+    pending with a fresh attempt count; an unfinished one only upgrades
+    is_update / priority.
+  • priority: live runs enqueue at PRIORITY_LIVE and lease only those; the
+    backfill crawler (backfill.py) enqueues at PRIORITY_BACKFILL, leased
+    after the live jobs with a per-run budget.
+
+Usage:
+    queue = JobQueue(QUEUE_PATH)
+    queue.enqueue([Job(url, ref, "athome", "buy", False)])
+    for job in queue.lease("athome", "buy", limit=10):
+        ...
+        queue.complete([job.url])     # or queue.fail(job.url, "timeout")
+"""
+
+import time
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import sqlite_db
+
+QUEUE_PATH    = Path(__file__).resolve().parent / "scrape_jobs.db"   # same file whatever the CWD
+LEASE_SECONDS = 600      # a leased job is handed out again after this long
+MAX_ATTEMPTS  = 4
+BACKOFF_BASE  = 60       # seconds before retry n: BACKOFF_BASE * 2**(n-1)
+BACKOFF_MAX   = 3600
+
+PRIORITY_LIVE     = 10   # new / changed refs found by the incremental runs
+PRIORITY_BACKFILL = 0    # refs found by the deep backfill walk
+BACKFILL_PER_RUN  = 20   # backfill jobs a run takes after its live ones
+
+_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS scrape_jobs (
+  id               INTEGER PRIMARY KEY AUTOINCREMENT,
+  url              TEXT NOT NULL UNIQUE,
+  listing_ref      TEXT,
+  source           TEXT NOT NULL,
+  transaction_type TEXT NOT NULL,
+  is_update        INTEGER NOT NULL DEFAULT 0,
+  priority         INTEGER NOT NULL DEFAULT 10,
+  state            TEXT NOT NULL DEFAULT 'pending',
+  attempts         INTEGER NOT NULL DEFAULT 0,
+  leased_until     REAL,
+  not_before       REAL NOT NULL DEFAULT 0,
+  last_error       TEXT,
+  enqueued_at      TEXT NOT NULL,
+  updated_at       TEXT NOT NULL
+);
+"""
+_INDEX_SQL = ("CREATE INDEX IF NOT EXISTS idx_scrape_jobs_ready "
+              "ON scrape_jobs(source, transaction_type, state, priority, id)")
+
+_FINISHED = "scrape_jobs.state IN ('done', 'failed')"
+
+
+class Job(NamedTuple):
+    url:              str
+    listing_ref:      Optional[str]
+    source:           str
+    transaction_type: str
+    is_update:        bool = False
+    attempts:         int = 0
+    priority:         int = PRIORITY_LIVE
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobQueue:
+    """Crash-safe detail-page queue in a SQLite file (one WAL connection per thread)."""
+
+    def __init__(self, path: Path = QUEUE_PATH, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS, clock=time.time):
+        self.path          = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts  = max_attempts
+        self.clock         = clock
+        with self._conn() as conn:
+            conn.executescript(_CREATE_SQL)
+            cols = {r["name"] for r in conn.execute("PRAGMA table_info(scrape_jobs)")}
+            if "priority" not in cols:     # queue files created before priorities
+                conn.execute(f"ALTER TABLE scrape_jobs ADD COLUMN priority INTEGER NOT NULL "
+                             f"DEFAULT {PRIORITY_LIVE}")
+                conn.execute("DROP INDEX IF EXISTS idx_scrape_jobs_ready")
+            conn.execute(_INDEX_SQL)
+
+    def _conn(self):
+        return sqlite_db.connect(self.path)
+
+    def enqueue(self, jobs: Iterable[Job]) -> int:
+        """Add jobs (idempotent per URL); returns how many rows were added or revived."""
+        now = _now_iso()
+        rows = [(j.url, j.listing_ref, j.source, j.transaction_type, int(j.is_update), j.priority,
+                 now, now) for j in jobs]
+        with self._conn() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO scrape_jobs (url, listing_ref, source, transaction_type, is_update,"
+                " priority, enqueued_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET"
+                " is_update  = MAX(scrape_jobs.is_update, excluded.is_update),"
+                " priority   = MAX(scrape_jobs.priority, excluded.priority),"
+                " updated_at = excluded.updated_at,"
+                f" state      = CASE WHEN {_FINISHED} THEN 'pending' ELSE scrape_jobs.state END,"
+                f" attempts   = CASE WHEN {_FINISHED} THEN 0 ELSE scrape_jobs.attempts END,"
+                f" not_before = CASE WHEN {_FINISHED} THEN 0 ELSE scrape_jobs.not_before END"
+                f" WHERE {_FINISHED} OR excluded.is_update > scrape_jobs.is_update"
+                "   OR excluded.priority > scrape_jobs.priority",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def lease(self, source: str, transaction_type: str, limit: int = 10,
+              min_priority: int = PRIORITY_BACKFILL) -> List[Job]:
+        """
+        Up to `limit` ready jobs of at least `min_priority`, highest priority
+        then oldest first, leased for lease_seconds.
+        """
+        now = self.clock()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")     # no other process leases between SELECT and UPDATE
+            rows = conn.execute(
+                "UPDATE scrape_jobs SET state = 'leased', leased_until = ?, updated_at = ? "
+                "WHERE id IN (SELECT id FROM scrape_jobs"
+                "  WHERE source = ? AND transaction_type = ? AND priority >= ?"
+                "    AND ((state = 'pending' AND not_before <= ?) OR (state = 'leased' AND leased_until < ?))"
+                "  ORDER BY priority DESC, id LIMIT ?) "
+                "RETURNING id, url, listing_ref, source, transaction_type, is_update, attempts, priority",
+                (now + self.lease_seconds, _now_iso(), source, transaction_type, min_priority,
+                 now, now, limit),
+            ).fetchall()
+        return [Job(r["url"], r["listing_ref"], r["source"], r["transaction_type"],
+                    bool(r["is_update"]), r["attempts"], r["priority"])
+                for r in sorted(rows, key=lambda r: (-r["priority"], r["id"]))]
+
+    def complete(self, urls: Iterable[str]) -> None:
+        now = _now_iso()
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE scrape_jobs SET state = 'done', leased_until = NULL, last_error = NULL,"
+                " updated_at = ? WHERE url = ?",
+                [(now, url) for url in urls],
+            )
+
+    def fail(self, url: str, error: str = "") -> str:
+        """Count a failed attempt; returns the job's new state (pending | failed)."""
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT attempts FROM scrape_jobs WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return "missing"
+            attempts = row["attempts"] + 1
+            state = "failed" if attempts >= self.max_attempts else "pending"
+            delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+            conn.execute(
+                "UPDATE scrape_jobs SET state = ?, attempts = ?, not_before = ?, leased_until = NULL,"
+                " last_error = ?, updated_at = ? WHERE url = ?",
+                (state, attempts, self.clock() + delay, error[:500], _now_iso(), url),
+            )
+        return state
+
+    def defer(self, url: str, seconds: float) -> None:
+        """Put a leased job back without counting an attempt; ready again in `seconds` (leases.py)."""
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE scrape_jobs SET state = 'pending', leased_until = NULL, not_before = ?,"
+                " updated_at = ? WHERE url = ? AND state = 'leased'",
+                (self.clock() + seconds, _now_iso(), url),
+            )
+
+    def counts(self, source: Optional[str] = None) -> Dict[str, int]:
+        """Jobs per state (of one source, if given)."""
+        sql = "SELECT state, COUNT(*) FROM scrape_jobs"
+        args: tuple = ()
+        if source:
+            sql, args = sql + " WHERE source = ?", (source,)
+        with self._conn() as conn:
+            return {state: n for state, n in conn.execute(sql + " GROUP BY state", args)}
@@ -0,0 +1,130 @@
+"""
+Known refs
+==========
+The listings a source already has in the DB, loaded once per run so the
+index walk checks membership locally instead of one db_get per ref.
+
+  • db_get_known(source, FINGERPRINT_FIELDS) — one projection query per
+    source (SQLite SELECT / Mongo find with a projection) — returns
+    {listing_ref: {title, sale_price, rent_price, surface_m2}}, which is
+    everything the index-card diff needs (index_cards.card_changes).
+  • KnownRefs.get(ref) answers from memory; add() keeps the set current as
+    the run writes.
+  • Above BLOOM_ABOVE refs only a Bloom filter of the refs is kept: a miss
+    (a new listing, the common case) is still answered locally, a hit loads
+    that one row through `fetch` (db_get). False positives cost one lookup.
+  • KnownRefs.load() counts the refs first (db_count_known). Above the
+    threshold it streams them, ref only, from db_iter_refs into the filter,
+    so the fingerprint map is never built and peak memory is the filter.
+
+Usage:
+    known = KnownRefs.load("athome", db_count_known, db_get_known, db_iter_refs, fetch=db_get)
+    row   = known.get(ref)          # None → new listing
+    known.add(ref, data)            # after db_upsert
+"""
+
+import math
+import hashlib
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+# Stored fields the index-card diff compares (index_cards.card_changes)
+FINGERPRINT_FIELDS = ("title", "sale_price", "rent_price", "surface_m2")
+
+BLOOM_ABOVE      = 500_000   # refs; below this the fingerprints stay in a dict
+BLOOM_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (blake2b double hashing)."""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        capacity  = max(1, capacity)
+        self.m    = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k    = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.k):
+            yield (h1 + i * h2) % self.m
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class KnownRefs:
+    """Known listing refs of one source with their comparison fingerprints."""
+
+    def __init__(
+        self,
+        rows: Dict[str, Dict],
+        fetch: Optional[Callable[[str], Optional[Dict]]] = None,
+        bloom_above: int = BLOOM_ABOVE,
+    ):
+        self.fetch = fetch
+        self.bloom: Optional[BloomFilter] = None
+        self._rows: Dict[str, Dict] = {}
+        self._count = len(rows)
+        self.fetches = 0
+        if fetch is not None and len(rows) > bloom_above:
+            self._fill_bloom(rows, len(rows))
+        else:
+            self._rows = dict(rows)
+
+    @classmethod
+    def load(
+        cls,
+        source: str,
+        count: Callable[[str], int],
+        rows: Callable[[str, Iterable[str]], Dict[str, Dict]],
+        refs: Callable[[str], Iterable[str]],
+        fetch: Callable[[str], Optional[Dict]],
+        bloom_above: int = BLOOM_ABOVE,
+    ) -> "KnownRefs":
+        """
+        Known refs of `source` from the DB functions db_count_known, db_get_known
+        and db_iter_refs: the fingerprint map below `bloom_above` refs, else
+        only the refs, streamed into the Bloom filter.
+        """
+        n = count(source)
+        if n <= bloom_above:
+            return cls(rows(source, FINGERPRINT_FIELDS), fetch=fetch, bloom_above=bloom_above)
+        known = cls({}, fetch=fetch, bloom_above=bloom_above)
+        known._fill_bloom(refs(source), n)
+        return known
+
+    def _fill_bloom(self, refs: Iterable[str], n: int) -> None:
+        # Twice the current size leaves room for the listings added later
+        self.bloom = BloomFilter(2 * n)
+        self._count = 0
+        for ref in refs:
+            self.bloom.add(ref)
+            self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, ref: str) -> Optional[Dict]:
+        """Stored fingerprint of `ref`, or None for a listing not in the DB."""
+        row = self._rows.get(ref)
+        if row is not None or self.bloom is None or ref not in self.bloom:
+            return row
+        self.fetches += 1
+        return self.fetch(ref)
+
+    def add(self, ref: str, data: Dict) -> None:
+        """Record a listing the run just wrote."""
+        if self.bloom is not None:
+            if ref not in self.bloom:
+                self._count += 1
+            self.bloom.add(ref)
+            return
+        if ref not in self._rows:
+            self._count += 1
+        self._rows[ref] = {f: data.get(f) for f in FINGERPRINT_FIELDS}
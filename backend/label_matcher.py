@@ -0,0 +1,178 @@
+"""
+Multi-label matcher
+===================
+One regex built once at import that finds every known label in a text in a
+single scan, instead of one re.match / re.search per (field, label, element).
+
+How it works
+  • All labels go into one case-insensitive alternation wrapped in a
+    lookahead, longest label first:  (?=(wohnfläche|balcony|balcon|…))
+    finditer() then stops at every position where *some* label starts and
+    reports the longest one there.
+  • Any shorter label that also starts at that position must be a prefix of
+    the longest one, so each label carries its precomputed "prefix closure"
+    and overlapping hits ("Balcon" inside "Balcony") are not lost.
+
+LabelDispatch builds on it to replace an ordered if/elif chain of substring
+tests (label → handler) with a precompiled index; see its docstring.
+
+Usage:
+    m = LabelMatcher(["Balcony", "Balcon", "Rent"])
+    m.first_positions("Balcony 5 m²")   # {"Balcony": 0, "Balcon": 0}
+
+    dispatch = LabelDispatch([LabelRule(_set_rooms, exact=("rooms",)), ...])
+    handler  = dispatch.lookup("rooms")
+"""
+
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+
+class LabelMatcher:
+    """Finds the first occurrence of every label in a text with one regex scan."""
+
+    def __init__(self, labels: Iterable[str]):
+        # De-duplicate case-insensitively, keep the first spelling seen
+        by_key: Dict[str, str] = {}
+        for label in labels:
+            by_key.setdefault(label.lower(), label)
+        self.labels: List[str] = list(by_key.values())
+        self._by_key = by_key
+
+        ordered = sorted(self.labels, key=len, reverse=True)
+        alternation = "|".join(re.escape(label) for label in ordered)
+        self._pattern = re.compile(f"(?=({alternation}))", re.I) if ordered else None
+
+        # label → every label that is a prefix of it (itself included)
+        self._prefixes: Dict[str, List[str]] = {
+            long: [short for short in ordered
+                   if len(short) <= len(long) and long.lower().startswith(short.lower())]
+            for long in ordered
+        }
+
+    def _canonical(self, matched: str) -> str:
+        label = self._by_key.get(matched.lower())
+        if label is not None:
+            return label
+        # Case-insensitive regex match whose .lower() differs (rare Unicode folds)
+        for label in self.labels:
+            if re.fullmatch(re.escape(label), matched, re.I):
+                return label
+        return matched
+
+    def first_positions(self, text: str) -> Dict[str, int]:
+        """{label: start index of its first occurrence} for every label found in text."""
+        found: Dict[str, int] = {}
+        if self._pattern is None or not text:
+            return found
+        for m in self._pattern.finditer(text):
+            for label in self._prefixes.get(self._canonical(m.group(1)), ()):
+                if label not in found:
+                    found[label] = m.start()
+        return found
+
+
+# ─────────────────────────────────────────────────────────────
+# Ordered label → handler dispatch
+# ─────────────────────────────────────────────────────────────
+
+class LabelRule(NamedTuple):
+    """
+    One branch of an if/elif chain over a lower-cased label. The rule matches
+    when the label is one of `exact`, or — if it has `any` / `all` needles —
+    contains at least one `any` needle, every `all` needle and no `none` needle.
+    """
+    handler: Callable
+    any:     Tuple[str, ...] = ()
+    all:     Tuple[str, ...] = ()
+    none:    Tuple[str, ...] = ()
+    exact:   Tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return getattr(self.handler, "__name__", repr(self.handler))
+
+    def matches(self, label: str, present: Optional[Set[str]] = None) -> bool:
+        if label in self.exact:
+            return True
+        if not (self.any or self.all):
+            return False
+        has = (lambda n: n in present) if present is not None else (lambda n: n in label)
+        return ((not self.any or any(has(n) for n in self.any))
+                and all(has(n) for n in self.all)
+                and not any(has(n) for n in self.none))
+
+
+class LabelDispatch:
+    """
+    Precompiled, order-preserving replacement for an if/elif chain of
+    substring tests: lookup(label) returns the handler of the FIRST rule
+    that matches, exactly like the chain would.
+
+      • Exact fast path: a dict from label to handler, seeded with every
+        `exact` label and filled with each label resolved so far (bounded).
+      • Substring fallback: one LabelMatcher scan finds every needle in the
+        label; only rules owning one of those needles are checked, lowest
+        index first.
+      • hits / misses count dispatches per label for report(). They are
+        updated without a lock, so under heavy threading they are approximate.
+    """
+
+    MAX_CACHED = 4096  # free-text labels (e.g. "text before ':'") are unbounded
+
+    def __init__(self, rules: Iterable[LabelRule]):
+        self.rules: List[LabelRule] = list(rules)
+        needles = [n for r in self.rules for n in (*r.any, *r.all, *r.none)]
+        self._matcher = LabelMatcher(needles)
+        # needle → indexes of rules that can fire on it (any / all needles only)
+        self._by_needle: Dict[str, List[int]] = {}
+        for i, rule in enumerate(self.rules):
+            for n in dict.fromkeys((*rule.any, *rule.all)):
+                self._by_needle.setdefault(n, []).append(i)
+        self._cache: Dict[str, Optional[Callable]] = {}
+        for rule in self.rules:
+            for label in rule.exact:
+                self._cache.setdefault(label, self._handler(label))
+        self.hits:   Counter = Counter()
+        self.misses: Counter = Counter()
+
+    def _resolve(self, label: str) -> Optional[int]:
+        # re.I can fold a few exotic characters; keep plain `in` semantics
+        present = {n for n in self._matcher.first_positions(label) if n in label}
+        candidates = {i for n in present for i in self._by_needle.get(n, ())}
+        candidates.update(i for i, r in enumerate(self.rules) if label in r.exact)
+        for i in sorted(candidates):
+            if self.rules[i].matches(label, present):
+                return i
+        return None
+
+    def _handler(self, label: str) -> Optional[Callable]:
+        idx = self._resolve(label)
+        return None if idx is None else self.rules[idx].handler
+
+    def lookup(self, label: str) -> Optional[Callable]:
+        """Handler of the first rule matching `label` (already normalised), or None."""
+        try:
+            handler = self._cache[label]
+        except KeyError:
+            handler = self._handler(label)
+            if len(self._cache) < self.MAX_CACHED:
+                self._cache[label] = handler
+        if handler is None:
+            self.misses[label] += 1
+        else:
+            self.hits[label] += 1
+        return handler
+
+    def report(self, top: int = 8) -> str:
+        """One-line summary: hit rate plus the most frequent matched / unmatched labels."""
+        hit, miss = sum(self.hits.values()), sum(self.misses.values())
+        rate = hit / (hit + miss) * 100 if hit + miss else 0.0
+        return (f"{hit + miss} labels, {rate:.0f}% mapped; "
+                f"top: {dict(self.hits.most_common(top))}; "
+                f"unmapped: {dict(self.misses.most_common(top))}")
+
+    def reset_stats(self) -> None:
+        self.hits.clear()
+        self.misses.clear()
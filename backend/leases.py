@@ -0,0 +1,430 @@
+"""
+Work leases
+===========
+Lets several scraper nodes (small VMs, or processes on one machine) share
+the same indexes without fetching a detail page twice. Each node claims its
+work through time-limited leases kept in the shared DB.
+
+  • A node is registered with heartbeat() every HEARTBEAT_SECONDS
+    (start_heartbeat() runs it on a thread) and counts as live for
+    NODE_TIMEOUT after its last beat. Nodes are grouped per scraper, so
+    athome and immotop nodes split their own work. live_nodes() is re-read
+    at most once per heartbeat interval, so claims don't query it each time.
+  • claim(key, ttl) takes a lease if it is free, expired, already held by
+    this node, or held by a node that stopped beating (lease stealing). It
+    returns the lease's fence, a counter bumped on every change of owner,
+    or None.
+  • finish(key, fence) records the work as done, so other nodes skip that
+    key for DONE_SECONDS. It only works if this node still holds the lease
+    with that fence.
+  • Stores:
+      – MongoDB: scrape_leases / scrape_nodes collections. A claim is one
+        find_one_and_update(upsert=True); losing the race raises
+        DuplicateKeyError.
+      – SQLite (LEASES_PATH): the same rules in one INSERT … ON CONFLICT DO
+        UPDATE … WHERE … RETURNING. It's a stand-in for local runs and
+        tests, for processes sharing one file.
+  • Shard is what run() uses:
+      – indexes(): this node walks its fair share of the (sub-)indexes,
+        ceil(n / live nodes). It keeps the ones it already holds and
+        releases extras when nodes join, so each partition stays with one
+        node while that node lives.
+      – claim(): a detail job is fetched only under its lease. If another
+        node holds the lease, the job is deferred in the local queue. If
+        another node just finished it, the job is completed without a fetch
+        (one done_among() query per chunk for the jobs it didn't get).
+      – still_held(): before a batch is written, listings whose lease was
+        stolen (this node was slow, not dead) are dropped. The new owner
+        writes them instead. Fencing plus upserts keyed by listing_ref give
+        each change exactly one effective write.
+  • Leases use wall-clock time, so the nodes' clocks should be NTP-synced.
+
+Usage:
+    leases = SqliteLeases(LEASES_PATH, group="athome")    # or MongoLeases(group="athome")
+    leases.start_heartbeat()
+    run(index_configs=[...], leases=leases)
+"""
+
+import os
+import math
+import time
+import socket
+import logging
+import threading
+from pathlib import Path
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import sqlite_db
+from job_queue import Job, JobQueue
+
+log = logging.getLogger("leases")
+
+LEASES_PATH         = Path("scrape_leases.db")
+HEARTBEAT_SECONDS   = 15
+NODE_TIMEOUT        = 60       # seconds without a heartbeat → node is dead, its leases are free
+INDEX_LEASE_SECONDS = 3600     # a (sub-)index stays with its node between polls
+DETAIL_LEASE_SECONDS = 600     # one detail fetch + write
+DONE_SECONDS        = 300      # other nodes skip a finished detail job this long
+
+
+def default_node_id() -> str:
+    """host:pid — a restarted worker is a new node; its predecessor's leases free up after NODE_TIMEOUT."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def index_key(url: str) -> str:
+    return f"index:{url}"
+
+
+def detail_key(url: str) -> str:
+    return f"detail:{url}"
+
+
+class Leases:
+    """Lease rules shared by both stores; subclasses provide the storage."""
+
+    def __init__(self, group: str, node_id: Optional[str] = None,
+                 node_timeout: float = NODE_TIMEOUT, clock: Callable[[], float] = time.time):
+        self.group        = group
+        self.node_id      = node_id or default_node_id()
+        self.node_timeout = node_timeout
+        self.clock        = clock
+        self.live_ttl     = HEARTBEAT_SECONDS   # live_nodes() cache; nodes beat this often
+        self._live: Optional[List[str]] = None
+        self._live_at     = 0.0
+
+    # Storage ─────────────────────────────────────────────────
+
+    def heartbeat(self) -> None:
+        raise NotImplementedError
+
+    def _live_nodes(self) -> List[str]:
+        raise NotImplementedError
+
+    def claim(self, key: str, ttl: float) -> Optional[int]:
+        raise NotImplementedError
+
+    def done_among(self, keys: List[str]) -> Set[str]:
+        """The `keys` some node finished less than DONE_SECONDS ago."""
+        raise NotImplementedError
+
+    def held(self, fences: Dict[str, int]) -> List[str]:
+        """The keys of {key: fence} this node still holds under that fence."""
+        raise NotImplementedError
+
+    def finish(self, fences: Dict[str, int], hold: float = DONE_SECONDS) -> int:
+        """Mark held keys done and give up their leases; returns how many were still held."""
+        raise NotImplementedError
+
+    def release(self, keys: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def owned(self, prefix: str) -> List[str]:
+        """Unexpired keys starting with `prefix` this node holds."""
+        raise NotImplementedError
+
+    # Shared ──────────────────────────────────────────────────
+
+    def live_nodes(self) -> List[str]:
+        """Live nodes of the group, re-read at most once per `live_ttl` seconds."""
+        now = self.clock()
+        if self._live is None or now - self._live_at >= self.live_ttl:
+            self._live, self._live_at = self._live_nodes(), now
+        return self._live
+
+    def done(self, key: str) -> bool:
+        """Did some node finish `key` less than DONE_SECONDS ago?"""
+        return key in self.done_among([key])
+
+    def start_heartbeat(self, interval: float = HEARTBEAT_SECONDS) -> None:
+        self.live_ttl = interval
+        self.heartbeat()
+        def beat():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    log.warning(f"Lease heartbeat failed ({type(e).__name__}: {e})")
+        threading.Thread(target=beat, name=f"{self.group}-lease-heartbeat", daemon=True).start()
+
+    def share(self, keys: List[str], ttl: float = INDEX_LEASE_SECONDS) -> List[str]:
+        """
+        Claim this node's fair share of `keys`, ceil(len / live nodes), in
+        input order: keys it already holds first. Held keys beyond the share
+        are released for the other nodes.
+        """
+        quota = math.ceil(len(keys) / max(1, len(self.live_nodes())))
+        mine = set(self.owned("index:")) & set(keys)
+        kept = [k for k in keys if k in mine][:quota]
+        self.release(mine - set(kept))
+        claimed = [k for k in kept if self.claim(k, ttl) is not None]
+        for key in keys:
+            if len(claimed) >= quota:
+                break
+            if key not in mine and self.claim(key, ttl) is not None:
+                claimed.append(key)
+        return [k for k in keys if k in set(claimed)]
+
+
+# ─────────────────────────────────────────────────────────────
+# SQLite
+# ─────────────────────────────────────────────────────────────
+
+_CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS scrape_nodes (
+  node_id    TEXT PRIMARY KEY,
+  node_group TEXT NOT NULL,
+  last_beat  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scrape_leases (
+  key        TEXT PRIMARY KEY,
+  owner      TEXT,
+  expires    REAL NOT NULL DEFAULT 0,
+  fence      INTEGER NOT NULL DEFAULT 0,
+  done_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_scrape_leases_owner ON scrape_leases(owner, key);
+"""
+
+
+class SqliteLeases(Leases):
+    """Leases in a SQLite file shared by processes on one machine."""
+
+    def __init__(self, path: Path = LEASES_PATH, group: str = "default", **kwargs):
+        super().__init__(group, **kwargs)
+        self.path = Path(path)
+        with self._conn() as conn:
+            conn.executescript(_CREATE_SQL)
+        self.heartbeat()
+
+    def _conn(self):
+        return sqlite_db.connect(self.path)
+
+    def _key(self, key: str) -> str:
+        return f"{self.group}|{key}"
+
+    def heartbeat(self) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO scrape_nodes (node_id, node_group, last_beat) VALUES (?, ?, ?) "
+                "ON CONFLICT(node_id) DO UPDATE SET last_beat = excluded.last_beat",
+                (self.node_id, self.group, self.clock()),
+            )
+
+    def _live_nodes(self) -> List[str]:
+        with self._conn() as conn:
+            return [r[0] for r in conn.execute(
+                "SELECT node_id FROM scrape_nodes WHERE node_group = ? AND last_beat >= ?",
+                (self.group, self.clock() - self.node_timeout),
+            )]
+
+    def claim(self, key: str, ttl: float) -> Optional[int]:
+        now = self.clock()
+        with self._conn() as conn:
+            row = conn.execute(
+                "INSERT INTO scrape_leases (key, owner, expires, fence) VALUES (:key, :me, :expires, 1) "
+                "ON CONFLICT(key) DO UPDATE SET"
+                "  fence   = fence + (owner IS NOT :me),"
+                "  owner   = :me,"
+                "  expires = :expires "
+                "WHERE done_until <= :now AND (owner IS NULL OR owner = :me OR expires < :now"
+                "  OR owner NOT IN (SELECT node_id FROM scrape_nodes WHERE last_beat >= :alive)) "
+                "RETURNING fence",
+                {"key": self._key(key), "me": self.node_id, "expires": now + ttl, "now": now,
+                 "alive": now - self.node_timeout},
+            ).fetchone()
+        return row[0] if row else None
+
+    def done_among(self, keys: List[str]) -> Set[str]:
+        if not keys:
+            return set()
+        ids = {self._key(k): k for k in keys}
+        with self._conn() as conn:
+            return {ids[r[0]] for r in conn.execute(
+                f"SELECT key FROM scrape_leases WHERE key IN ({', '.join('?' * len(ids))}) AND done_until > ?",
+                (*ids, self.clock()),
+            )}
+
+    def held(self, fences: Dict[str, int]) -> List[str]:
+        with self._conn() as conn:
+            return [key for key, fence in fences.items() if conn.execute(
+                "SELECT 1 FROM scrape_leases WHERE key = ? AND owner = ? AND fence = ?",
+                (self._key(key), self.node_id, fence),
+            ).fetchone()]
+
+    def finish(self, fences: Dict[str, int], hold: float = DONE_SECONDS) -> int:
+        with self._conn() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE scrape_leases SET owner = NULL, expires = 0, done_until = ? "
+                "WHERE key = ? AND owner = ? AND fence = ?",
+                [(self.clock() + hold, self._key(key), self.node_id, fence) for key, fence in fences.items()],
+            )
+            return conn.total_changes - before
+
+    def release(self, keys: Iterable[str]) -> None:
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE scrape_leases SET owner = NULL, expires = 0 WHERE key = ? AND owner = ?",
+                [(self._key(key), self.node_id) for key in keys],
+            )
+
+    def owned(self, prefix: str) -> List[str]:
+        start = self._key(prefix)
+        with self._conn() as conn:
+            return [r[0][len(self.group) + 1:] for r in conn.execute(
+                "SELECT key FROM scrape_leases WHERE owner = ? AND key >= ? AND key < ? AND expires >= ?",
+                (self.node_id, start, start + "\uffff", self.clock()),
+            )]
+
+
+# ─────────────────────────────────────────────────────────────
+# MongoDB
+# ─────────────────────────────────────────────────────────────
+
+class MongoLeases(Leases):
+    """Leases in the listings database (mongo_db), shared by every node."""
+
+    def __init__(self, group: str = "default", database=None, **kwargs):
+        super().__init__(group, **kwargs)
+        if database is None:
+            import mongo_db
+            database = mongo_db.db_database()
+        from pymongo.errors import DuplicateKeyError
+        self._duplicate = DuplicateKeyError
+        self.leases = database["scrape_leases"]
+        self.nodes  = database["scrape_nodes"]
+        self.nodes.create_index([("group", 1), ("last_beat", 1)])
+        self.leases.create_index([("owner", 1), ("_id", 1)])
+        self.heartbeat()
+
+    def _key(self, key: str) -> str:
+        return f"{self.group}|{key}"
+
+    def heartbeat(self) -> None:
+        self.nodes.update_one({"_id": self.node_id},
+                              {"$set": {"group": self.group, "last_beat": self.clock()}}, upsert=True)
+
+    def _live_nodes(self) -> List[str]:
+        alive = self.clock() - self.node_timeout
+        return [d["_id"] for d in self.nodes.find({"group": self.group, "last_beat": {"$gte": alive}},
+                                                  {"_id": 1})]
+
+    def claim(self, key: str, ttl: float) -> Optional[int]:
+        now, me = self.clock(), self.node_id
+        try:
+            doc = self.leases.find_one_and_update(
+                {"_id": self._key(key),
+                 "done_until": {"$not": {"$gt": now}},
+                 "$or": [{"owner": None}, {"owner": me}, {"expires": {"$lt": now}},
+                         {"owner": {"$nin": self.live_nodes()}}]},
+                [{"$set": {
+                    "fence": {"$add": [{"$ifNull": ["$fence", 0]},
+                                       {"$cond": [{"$eq": ["$owner", me]}, 0, 1]}]},
+                    "owner": me,
+                    "expires": now + ttl,
+                }}],
+                upsert=True,
+                return_document=True,      # ReturnDocument.AFTER
+            )
+        except self._duplicate:
+            return None                    # the lease exists and isn't ours to take
+        return doc["fence"]
+
+    def done_among(self, keys: List[str]) -> Set[str]:
+        if not keys:
+            return set()
+        ids = {self._key(k): k for k in keys}
+        return {ids[d["_id"]] for d in self.leases.find(
+            {"_id": {"$in": list(ids)}, "done_until": {"$gt": self.clock()}}, {"_id": 1})}
+
+    def held(self, fences: Dict[str, int]) -> List[str]:
+        if not fences:
+            return []
+        ids = {self._key(k): k for k in fences}
+        docs = self.leases.find({"_id": {"$in": list(ids)}, "owner": self.node_id}, {"fence": 1})
+        return [ids[d["_id"]] for d in docs if d.get("fence") == fences[ids[d["_id"]]]]
+
+    def finish(self, fences: Dict[str, int], hold: float = DONE_SECONDS) -> int:
+        done_until = self.clock() + hold
+        return sum(self.leases.update_one(
+            {"_id": self._key(key), "owner": self.node_id, "fence": fence},
+            {"$set": {"owner": None, "expires": 0, "done_until": done_until}},
+        ).modified_count for key, fence in fences.items())
+
+    def release(self, keys: Iterable[str]) -> None:
+        ids = [self._key(k) for k in keys]
+        if ids:
+            self.leases.update_many({"_id": {"$in": ids}, "owner": self.node_id},
+                                    {"$set": {"owner": None, "expires": 0}})
+
+    def owned(self, prefix: str) -> List[str]:
+        start = self._key(prefix)
+        return [d["_id"][len(self.group) + 1:] for d in self.leases.find(
+            {"owner": self.node_id, "_id": {"$gte": start, "$lt": start + "\uffff"},
+             "expires": {"$gte": self.clock()}}, {"_id": 1})]
+
+
+# ─────────────────────────────────────────────────────────────
+# A run's share of the work
+# ─────────────────────────────────────────────────────────────
+
+class Shard:
+    """One run's side of the leases: which (sub-)indexes and detail jobs this node takes."""
+
+    def __init__(self, leases: Leases, queue: JobQueue,
+                 detail_ttl: float = DETAIL_LEASE_SECONDS, index_ttl: float = INDEX_LEASE_SECONDS):
+        self.leases     = leases
+        self.queue      = queue
+        self.detail_ttl = detail_ttl
+        self.index_ttl  = index_ttl
+        self.fences: Dict[str, int] = {}       # job URL → fence of its detail lease
+        self.counters: Counter = Counter()
+
+    def indexes(self, subs: List[Dict]) -> List[Dict]:
+        """The sub-index configs this node walks this run."""
+        mine = set(self.leases.share([index_key(s["url"]) for s in subs], self.index_ttl))
+        taken = [s for s in subs if index_key(s["url"]) in mine]
+        self.counters["indexes_elsewhere"] += len(subs) - len(taken)
+        return taken
+
+    def claim(self, jobs: List[Job]) -> List[Job]:
+        """The leased jobs this node fetches; the rest are deferred or already done elsewhere."""
+        mine, missed = [], []
+        for job in jobs:
+            fence = self.leases.claim(detail_key(job.url), self.detail_ttl)
+            if fence is not None:
+                self.fences[job.url] = fence
+                mine.append(job)
+            else:
+                missed.append(job)
+        done = self.leases.done_among([detail_key(j.url) for j in missed])
+        for job in missed:
+            if detail_key(job.url) in done:
+                self.queue.complete([job.url])
+                self.counters["jobs_done_elsewhere"] += 1
+            else:
+                self.queue.defer(job.url, self.detail_ttl)
+                self.counters["jobs_elsewhere"] += 1
+        return mine
+
+    def still_held(self, items: List[Tuple[Dict, bool]], urls: List[str]) -> List[Tuple[Dict, bool]]:
+        """The (listing, is_update) items (aligned with their job `urls`) whose lease this node still holds."""
+        held = {key[len("detail:"):] for key in self.leases.held(
+            {detail_key(u): self.fences[u] for u in urls if u in self.fences})}
+        kept = [item for item, url in zip(items, urls) if url in held or url not in self.fences]
+        self.counters["writes_dropped"] += len(items) - len(kept)
+        return kept
+
+    def finish(self, urls: List[str]) -> None:
+        fences = {u: self.fences.pop(u) for u in urls if u in self.fences}
+        self.leases.finish({detail_key(u): f for u, f in fences.items()})
+
+    def report(self) -> str:
+        return (f"node {self.leases.node_id} of {len(self.leases.live_nodes())} live, "
+                f"{self.counters['indexes_elsewhere']} indexes on other nodes, "
+                f"{self.counters['jobs_elsewhere']} jobs deferred, "
+                f"{self.counters['jobs_done_elsewhere']} done elsewhere, "
+                f"{self.counters['writes_dropped']} stale writes dropped")
@@ -0,0 +1,160 @@
+"""
+Listing changes
+===============
+Field-level change detection for listing updates: every listing stores a
+compact fingerprint, and the changes go to an append-only log instead of
+being inferred from the title alone.
+
+  • CHANGE_FIELDS are the fields a change is tracked for. fingerprint() is
+    a 16-hex-digit blake2b over their normalised values, stored in
+    listings.fingerprint. Normalising means numbers as floats, image lists
+    decoded and text with whitespace collapsed.
+  • On an update, changes() builds the listing's new state: fields the
+    scrape didn't carry keep their stored value. It compares the new
+    fingerprint with the stored one and only diffs field by field when
+    they differ. A row written before fingerprints existed is diffed once.
+  • Each changed field becomes one row of listing_changes: listing_ref,
+    field, old_value, new_value, changed_at. The table is append-only and
+    indexed by (listing_ref, changed_at) and by (field, changed_at). A
+    listing's history, or the price drops since T, is then an index range
+    scan with no JSON parsing. In SQLite the value columns have no type
+    affinity, so prices stay numeric. Image lists are logged as JSON text.
+  • A new listing gets a fingerprint but no log rows. title_history is
+    still kept for its existing readers.
+
+Usage:
+    fp, changed = changes(data, stored_row)     # stored_row: db_get(ref) or None
+    data["fingerprint"] = fp
+    sqlite_log(conn, log_rows(ref, changed, now))
+    sqlite_price_drops(conn, since="2026-03-01")
+"""
+
+import re
+import json
+import hashlib
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+CHANGE_FIELDS = ("title", "sale_price", "rent_price", "surface_m2", "description", "image_urls")
+PRICE_FIELDS  = ("sale_price", "rent_price")
+_NUMERIC = {"sale_price", "rent_price", "surface_m2"}
+
+Change = Tuple[str, Any, Any]   # (field, old, new) — values as logged
+
+
+class ChangeRow(NamedTuple):
+    listing_ref: str
+    field:       str
+    old_value:   Any
+    new_value:   Any
+    changed_at:  str
+
+
+def _norm(field: str, value: Any) -> Any:
+    """Comparable form of a stored or scraped value (what the fingerprint hashes)."""
+    if value is None:
+        return None
+    if field in _NUMERIC:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if field == "image_urls":
+        if isinstance(value, str):
+            try:
+                value = json.loads(value or "[]")
+            except ValueError:
+                return []
+        return [str(u) for u in value or []]
+    return re.sub(r"\s+", " ", str(value)).strip() or None
+
+
+def _logged(field: str, value: Any) -> Any:
+    value = _norm(field, value)
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value
+
+
+def fingerprint(state: Dict) -> str:
+    """Hash of CHANGE_FIELDS in `state` (missing fields count as empty)."""
+    norm = [_norm(f, state.get(f)) for f in CHANGE_FIELDS]
+    raw = json.dumps(norm, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def changes(data: Dict, stored: Optional[Dict]) -> Tuple[str, List[Change]]:
+    """
+    The fingerprint `data` gives the listing on top of `stored` (its row, or
+    None for a new listing) and the fields that changed.
+    """
+    stored = stored or {}
+    state = {f: data[f] if f in data else stored.get(f) for f in CHANGE_FIELDS}
+    fp = fingerprint(state)
+    if not stored or stored.get("fingerprint") == fp:
+        return fp, []
+    return fp, [(f, _logged(f, stored.get(f)), _logged(f, state[f])) for f in CHANGE_FIELDS
+                if _norm(f, stored.get(f)) != _norm(f, state[f])]
+
+
+def merged(data: Dict, stored: Optional[Dict], fp: str) -> Dict:
+    """The stored state after writing `data` (for several updates of one ref in a batch)."""
+    state = {f: data[f] if f in data else (stored or {}).get(f) for f in CHANGE_FIELDS}
+    state["fingerprint"] = fp
+    return state
+
+
+def log_rows(ref: str, changed: List[Change], now: str) -> List[ChangeRow]:
+    return [ChangeRow(ref, field, old, new, now) for field, old, new in changed]
+
+
+# ─────────────────────────────────────────────────────────────
+# SQLite
+# ─────────────────────────────────────────────────────────────
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS listing_changes (
+  id          INTEGER PRIMARY KEY AUTOINCREMENT,
+  listing_ref TEXT NOT NULL,
+  field       TEXT NOT NULL,
+  old_value,
+  new_value,
+  changed_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listing_changes_ref   ON listing_changes(listing_ref, changed_at);
+CREATE INDEX IF NOT EXISTS idx_listing_changes_field ON listing_changes(field, changed_at);
+"""
+
+
+def sqlite_init(conn, table: str = "listings") -> None:
+    """Create listing_changes; add the fingerprint column to a listings table created before it."""
+    conn.executescript(CREATE_SQL)
+    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    if "fingerprint" not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN fingerprint TEXT")
+
+
+def sqlite_log(conn, rows: List[ChangeRow]) -> None:
+    """Append change rows (inside the caller's transaction)."""
+    if rows:
+        conn.executemany(
+            "INSERT INTO listing_changes (listing_ref, field, old_value, new_value, changed_at) "
+            "VALUES (?, ?, ?, ?, ?)", rows,
+        )
+
+
+def sqlite_price_drops(conn, since: str, fields: Tuple[str, ...] = PRICE_FIELDS) -> List[Dict]:
+    """Price decreases logged at or after `since` (ISO), oldest first."""
+    rows = conn.execute(
+        f"SELECT listing_ref, field, old_value, new_value, changed_at FROM listing_changes "
+        f"WHERE field IN ({', '.join('?' * len(fields))}) AND changed_at >= ? "
+        f"AND new_value < old_value ORDER BY changed_at",
+        (*fields, since),
+    ).fetchall()
+    return [ChangeRow(*r)._asdict() for r in rows]
+
+
+def sqlite_history(conn, ref: str) -> List[Dict]:
+    """Every logged change of one listing, oldest first."""
+    rows = conn.execute(
+        "SELECT listing_ref, field, old_value, new_value, changed_at FROM listing_changes "
+        "WHERE listing_ref = ? ORDER BY changed_at, id", (ref,),
+    ).fetchall()
+    return [ChangeRow(*r)._asdict() for r in rows]
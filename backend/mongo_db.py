@@ -22,13 +22,19 @@ import json
 import logging
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Iterable, Iterator, Optional, List, Tuple
 
 _root = Path(__file__).resolve().parent.parent
 if str(_root) not in __import__("sys").path:
     __import__("sys").path.insert(0, str(_root))
 from lib.listings_schema import LISTING_SCHEMA_KEYS
 
+_backend = Path(__file__).resolve().parent
+if str(_backend) not in __import__("sys").path:
+    __import__("sys").path.append(str(_backend))
+import listing_changes
+from listing_changes import CHANGE_FIELDS, PRICE_FIELDS
+
 # Load backend/.env so MONGO_URI is set when running without exporting
 if not os.getenv("MONGO_URI"):
     _env_path = Path(__file__).resolve().parent / ".env"
@@ -40,8 +46,8 @@ if not os.getenv("MONGO_URI"):
             pass
 
 try:
-    from pymongo import MongoClient, ASCENDING
-    from pymongo.errors import DuplicateKeyError, PyMongoError
+    from pymongo import MongoClient, ASCENDING, UpdateOne
+    from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
     PYMONGO_OK = True
 except ImportError:
     PYMONGO_OK = False
@@ -58,6 +64,10 @@ log = logging.getLogger(__name__)
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("MONGO_DB_NAME", "coldbot")
 COLLECTION_NAME = "listings"
+CHANGES_COLLECTION = "listing_changes"  # append-only field changes (listing_changes.py)
+UPDATE_RETRIES = 3      # db_upsert re-reads when a concurrent write moved the fingerprint
+_DUPLICATE_KEY = 11000  # server error code of a unique index collision
+_STATS_INDEX = [("transaction_type", 1), ("phone_number", 1)]   # covers db_stats
 
 _client = None
 _db = None
@@ -91,6 +101,15 @@ def _get_collection():
         log.exception("MongoDB connection failure: %s", e)
         raise
 
+def _get_changes_collection():
+    _get_collection()
+    return _db[CHANGES_COLLECTION]
+
+def db_database():
+    """The listings database, for the other collections next to `listings` (e.g. leases.py)."""
+    _get_collection()
+    return _db
+
 def db_init() -> None:
     """
     Initialize database - create indexes.
@@ -103,7 +122,13 @@ def db_init() -> None:
     collection.create_index("source")
     collection.create_index("transaction_type")
     collection.create_index([("first_seen", ASCENDING)])
+    collection.create_index([("source", ASCENDING), ("transaction_type", ASCENDING), ("first_seen", ASCENDING)])
     collection.create_index([("last_updated", ASCENDING)])
+    collection.create_index(_STATS_INDEX)   # db_stats scans it instead of the documents
+
+    changes = _get_changes_collection()
+    changes.create_index([("listing_ref", ASCENDING), ("changed_at", ASCENDING)])
+    changes.create_index([("field", ASCENDING), ("changed_at", ASCENDING)])
     
     log.info("✓ MongoDB indexes created")
 
@@ -120,6 +145,30 @@ def db_get(ref: str) -> Optional[Dict]:
     doc.pop("_id", None)
     return {k: doc[k] for k in LISTING_SCHEMA_KEYS if k in doc}
 
+def _update_pipeline(fields: Dict, now: str) -> List[Dict]:
+    """
+    Pipeline update for a changed listing: stage 1 reads the stored title
+    and appends it to title_history when the new one differs (and keeps
+    first_seen, or sets it on upsert); stage 2 sets the scraped fields.
+    Values go through $literal so text starting with "$" stays text.
+    """
+    history = {"$cond": [{"$isArray": "$title_history"}, "$title_history", []]}
+    if "title" in fields:
+        history = {"$cond": [
+            {"$and": [
+                {"$gt": [{"$ifNull": ["$title", ""]}, ""]},
+                {"$ne": ["$title", {"$literal": fields["title"]}]},
+            ]},
+            {"$concatArrays": [history, [{"title": "$title", "changed_at": {"$literal": now}}]]},
+            history,
+        ]}
+    return [
+        {"$set": {"title_history": history,
+                  "first_seen": {"$ifNull": ["$first_seen", {"$literal": now}]}}},
+        {"$set": {**{k: {"$literal": v} for k, v in fields.items()},
+                  "last_updated": {"$literal": now}}},
+    ]
+
 def db_upsert(data: Dict, is_update: bool = False) -> str:
     """
     Insert or update a listing. Only schema-defined fields are stored.
@@ -140,45 +189,38 @@ def db_upsert(data: Dict, is_update: bool = False) -> str:
     now = datetime.now(timezone.utc).isoformat()
 
     if is_update:
-        # Update existing listing
-        existing = db_get(ref)
-        if not existing:
-            # Doesn't exist, insert instead
-            return db_upsert(data, is_update=False)
-        
-        data["last_updated"] = now
-        data.setdefault("first_seen", existing.get("first_seen", now))
-        
-        # Handle title history
-        old_title = existing.get("title", "")
-        new_title = data.get("title", "")
-        
-        if old_title and old_title != new_title:
-            # Title changed - append to history
-            history = existing.get("title_history", [])
-            if isinstance(history, str):
-                history = json.loads(history) if history else []
-            history.append({"title": old_title, "changed_at": now})
-            data["title_history"] = history
-        else:
-            data["title_history"] = existing.get("title_history", [])
-        
-        # Convert JSON strings to lists (MongoDB native)
+        # One server-side update: the old title is pushed to title_history
+        # inside the same write, so concurrent runners can't lose an entry.
+        # The tracked fields are read first and the new fingerprint goes into
+        # that same write, guarded by the fingerprint that was read: if
+        # another runner changed the listing in between, the upsert collides
+        # on the unique listing_ref and the change is read and diffed again.
+        data.pop("listing_ref")
+        data.pop("first_seen", None)
+        data.pop("title_history", None)
+        data.pop("fingerprint", None)
         _normalize_json_fields(data)
-        
-        # Update
-        collection.replace_one(
-            {"listing_ref": ref},
-            data,
-            upsert=True
-        )
-        return "updated"
+        for _ in range(UPDATE_RETRIES):
+            before = collection.find_one({"listing_ref": ref}, _TRACKED_PROJECTION)
+            fp, changed = listing_changes.changes(data, before)
+            try:
+                collection.update_one(
+                    {"listing_ref": ref, "fingerprint": (before or {}).get("fingerprint")},
+                    _update_pipeline({**data, "fingerprint": fp}, now), upsert=True,
+                )
+            except DuplicateKeyError:
+                continue
+            _log_changes(listing_changes.log_rows(ref, changed, now))
+            return "inserted" if before is None else "updated"
+        log.warning("%s: changed concurrently %d times, update skipped", ref, UPDATE_RETRIES)
+        return "skipped"
     
     else:
         # Insert new listing
         data["first_seen"] = now
         data["last_updated"] = now
         data["title_history"] = []
+        data["fingerprint"] = listing_changes.fingerprint(data)
         
         # Convert JSON strings to lists (MongoDB native)
         _normalize_json_fields(data)
@@ -190,6 +232,107 @@ def db_upsert(data: Dict, is_update: bool = False) -> str:
             # Already exists, skip
             return "skipped"
 
+def db_upsert_many(items: List[Tuple[Dict, bool]]) -> Dict[str, int]:
+    """
+    Write a batch of (listing, is_update) pairs in one unordered bulk_write
+    of UpdateOne(upsert=True); updates use the same pipeline as db_upsert.
+    The tracked fields of the updated refs are read in one find beforehand,
+    so each update carries its new fingerprint, guarded (as in db_upsert) by
+    the fingerprint that was read, and its field changes are appended to
+    listing_changes after the write. Listings another runner changed in
+    between collide on the unique listing_ref; they are read, diffed and
+    written again, up to UPDATE_RETRIES bulk writes in all.
+
+    Returns counters: inserted / updated / unchanged / skipped, where
+    unchanged is an insert for a ref that was already stored.
+    """
+    collection = _get_collection()
+    now = datetime.now(timezone.utc).isoformat()
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+
+    pending = []
+    for data, is_update in items:
+        ref = data.get("listing_ref")
+        if not ref:
+            counts["skipped"] += 1
+            continue
+        doc = {k: v for k, v in data.items() if k in LISTING_SCHEMA_KEYS and k != "listing_ref"}
+        doc.pop("first_seen", None)
+        if is_update:
+            doc.pop("title_history", None)
+            doc.pop("fingerprint", None)
+        _normalize_json_fields(doc)
+        pending.append((ref, doc, is_update))
+
+    for _ in range(UPDATE_RETRIES):
+        if not pending:
+            break
+        pending = _bulk_upsert(collection, pending, now, counts)
+    if pending:
+        log.warning("bulk_write: %d listings changed concurrently %d times, skipped",
+                    len(pending), UPDATE_RETRIES)
+        counts["skipped"] += len(pending)
+    return counts
+
+def _bulk_upsert(collection, pending: List[Tuple[str, Dict, bool]], now: str,
+                 counts: Dict[str, int]) -> List[Tuple[str, Dict, bool]]:
+    """One bulk_write of db_upsert_many; returns the writes that collided and need another try."""
+    update_refs = list({ref for ref, _, is_update in pending if is_update})
+    stored = {doc["listing_ref"]: doc for doc in collection.find(
+        {"listing_ref": {"$in": update_refs}}, {**_TRACKED_PROJECTION, "listing_ref": 1})} if update_refs else {}
+
+    ops, changed = [], []
+    for ref, doc, is_update in pending:
+        if is_update:
+            before = stored.get(ref)
+            fp, diff = listing_changes.changes(doc, before)
+            stored[ref] = listing_changes.merged(doc, before, fp)
+            changed.append(listing_changes.log_rows(ref, diff, now))
+            ops.append(UpdateOne({"listing_ref": ref, "fingerprint": (before or {}).get("fingerprint")},
+                                 _update_pipeline({**doc, "fingerprint": fp}, now), upsert=True))
+        else:
+            insert = dict(doc, first_seen=now, last_updated=now, title_history=[])
+            insert["fingerprint"] = listing_changes.fingerprint(insert)
+            changed.append([])
+            ops.append(UpdateOne({"listing_ref": ref}, {"$setOnInsert": insert}, upsert=True))
+
+    try:
+        upserted = set(collection.bulk_write(ops, ordered=False).upserted_ids)
+        errors = {}
+    except BulkWriteError as e:
+        # Unordered: the other operations still went through
+        upserted = {u["index"] for u in e.details.get("upserted", [])}
+        errors = {w["index"]: w for w in e.details.get("writeErrors", [])}
+        failed = [w for w in errors.values() if w.get("code") != _DUPLICATE_KEY]
+        if failed:
+            log.warning("bulk_write: %d of %d listings failed: %s",
+                        len(failed), len(ops), failed[0].get("errmsg"))
+
+    for i, (_, _, is_update) in enumerate(pending):
+        if i in errors:
+            counts["skipped"] += errors[i].get("code") != _DUPLICATE_KEY
+        elif i in upserted:
+            counts["inserted"] += 1
+        else:
+            counts["updated" if is_update else "unchanged"] += 1
+    _log_changes([row for i, rows in enumerate(changed) if i not in errors for row in rows])
+    return [pending[i] for i in sorted(errors) if errors[i].get("code") == _DUPLICATE_KEY]
+
+# Tracked fields as stored, for the fingerprint compare (listing_changes.py)
+_TRACKED_PROJECTION = {"_id": 0, "fingerprint": 1, **{f: 1 for f in CHANGE_FIELDS}}
+
+def _log_changes(rows: List["listing_changes.ChangeRow"]) -> None:
+    """Append change rows to listing_changes (never updated afterwards)."""
+    if rows:
+        _get_changes_collection().insert_many([row._asdict() for row in rows], ordered=False)
+
+def db_price_drops(since: str) -> List[Dict]:
+    """Sale / rent price decreases logged since `since` (ISO): a range scan of the (field, changed_at) index."""
+    query = {"field": {"$in": list(PRICE_FIELDS)}, "changed_at": {"$gte": since},
+             "$expr": {"$lt": ["$new_value", "$old_value"]}}
+    return [{k: doc.get(k) for k in listing_changes.ChangeRow._fields}
+            for doc in _get_changes_collection().find(query, {"_id": 0}).sort("changed_at", ASCENDING)]
+
 def _normalize_json_fields(data: Dict) -> None:
     """
     Convert JSON string fields to native Python lists/dicts for MongoDB.
@@ -209,22 +352,62 @@ def db_stats() -> Dict:
     """Get database statistics."""
     collection = _get_collection()
     
-    total = collection.count_documents({})
-    buy = collection.count_documents({"transaction_type": "buy"})
-    rent = collection.count_documents({"transaction_type": "rent"})
-    with_phone = collection.count_documents({"phone_number": {"$ne": None}})
+    # One aggregation, one pass: each counter is a conditional sum
+    def _count_if(cond):
+        return {"$sum": {"$cond": [cond, 1, 0]}}
+
+    # Only the indexed fields, hinted: a covered index scan, no document is fetched
+    rows = list(collection.aggregate([
+        {"$project": {"_id": 0, "transaction_type": 1, "phone_number": 1}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "buy": _count_if({"$eq": ["$transaction_type", "buy"]}),
+            "rent": _count_if({"$eq": ["$transaction_type", "rent"]}),
+            "with_phone": _count_if({"$ne": [{"$ifNull": ["$phone_number", None]}, None]}),
+        }},
+    ], hint=_STATS_INDEX))
+    counts = rows[0] if rows else {}
     
     return {
-        "total": total,
-        "buy": buy,
-        "rent": rent,
-        "with_phone": with_phone,
+        "total": counts.get("total", 0),
+        "buy": counts.get("buy", 0),
+        "rent": counts.get("rent", 0),
+        "with_phone": counts.get("with_phone", 0),
     }
 
-def db_get_all_refs() -> List[str]:
-    """Get all listing_refs in the database."""
+def db_get_all_refs(source: Optional[str] = None) -> List[str]:
+    """Get all listing_refs in the database (of one source, if given)."""
+    collection = _get_collection()
+    query = {"source": source} if source else {}
+    return [doc["listing_ref"] for doc in collection.find(query, {"_id": 0, "listing_ref": 1})]
+
+def db_get_known(source: str, fields: Iterable[str] = ()) -> Dict[str, Dict]:
+    """
+    {listing_ref: {field: value}} for every listing of `source` in one query,
+    projected to `fields` (the index-card fingerprint, see known_refs.py).
+    """
+    collection = _get_collection()
+    projection = {"_id": 0, "listing_ref": 1, **{f: 1 for f in fields}}
+    return {
+        doc.pop("listing_ref"): {f: doc.get(f) for f in fields}
+        for doc in collection.find({"source": source}, projection)
+    }
+
+def db_count_known(source: str) -> int:
+    """Number of listings of `source` (served by the source index)."""
+    return _get_collection().count_documents({"source": source})
+
+def db_iter_refs(source: str) -> Iterator[str]:
+    """listing_ref of every listing of `source`, streamed from the cursor in batches."""
+    for doc in _get_collection().find({"source": source}, {"_id": 0, "listing_ref": 1}, batch_size=10_000):
+        yield doc["listing_ref"]
+
+def db_first_seen(source: str, transaction_type: str, since: str) -> List[str]:
+    """first_seen of the `source` / `transaction_type` listings first seen at or after `since` (ISO)."""
     collection = _get_collection()
-    return [doc["listing_ref"] for doc in collection.find({}, {"listing_ref": 1})]
+    query = {"source": source, "transaction_type": transaction_type, "first_seen": {"$gte": since}}
+    return [doc["first_seen"] for doc in collection.find(query, {"_id": 0, "first_seen": 1})]
 
 def db_close() -> None:
     """Close MongoDB connection (optional, connections auto-close)."""
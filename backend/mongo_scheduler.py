@@ -35,7 +35,12 @@ import mongo_db
 class MongoDBAdapter:
     db_init = staticmethod(mongo_db.db_init)
     db_get = staticmethod(mongo_db.db_get)
+    db_get_known = staticmethod(mongo_db.db_get_known)
+    db_count_known = staticmethod(mongo_db.db_count_known)
+    db_iter_refs = staticmethod(mongo_db.db_iter_refs)
+    db_first_seen = staticmethod(mongo_db.db_first_seen)
     db_upsert = staticmethod(mongo_db.db_upsert)
+    db_upsert_many = staticmethod(mongo_db.db_upsert_many)
     db_stats = staticmethod(mongo_db.db_stats)
     db_connect = staticmethod(lambda: None)  # Not needed for MongoDB
     DB_PATH = Path("UNUSED_MONGODB")  # Dummy path
@@ -43,7 +48,12 @@ class MongoDBAdapter:
 # Inject this BEFORE the scrapers import
 sys.modules['__main__'].db_init = mongo_db.db_init
 sys.modules['__main__'].db_get = mongo_db.db_get
+sys.modules['__main__'].db_get_known = mongo_db.db_get_known
+sys.modules['__main__'].db_count_known = mongo_db.db_count_known
+sys.modules['__main__'].db_iter_refs = mongo_db.db_iter_refs
+sys.modules['__main__'].db_first_seen = mongo_db.db_first_seen
 sys.modules['__main__'].db_upsert = mongo_db.db_upsert
+sys.modules['__main__'].db_upsert_many = mongo_db.db_upsert_many
 sys.modules['__main__'].db_stats = mongo_db.db_stats
 
 # ─────────────────────────────────────────────────────────────
@@ -56,12 +66,22 @@ import immotop_scraper
 # Replace their db functions with MongoDB versions
 athome_scraper.db_init = mongo_db.db_init
 athome_scraper.db_get = mongo_db.db_get
+athome_scraper.db_get_known = mongo_db.db_get_known
+athome_scraper.db_count_known = mongo_db.db_count_known
+athome_scraper.db_iter_refs = mongo_db.db_iter_refs
+athome_scraper.db_first_seen = mongo_db.db_first_seen
 athome_scraper.db_upsert = mongo_db.db_upsert
+athome_scraper.db_upsert_many = mongo_db.db_upsert_many
 athome_scraper.db_stats = mongo_db.db_stats
 
 immotop_scraper.db_init = mongo_db.db_init
 immotop_scraper.db_get = mongo_db.db_get
+immotop_scraper.db_get_known = mongo_db.db_get_known
+immotop_scraper.db_count_known = mongo_db.db_count_known
+immotop_scraper.db_iter_refs = mongo_db.db_iter_refs
+immotop_scraper.db_first_seen = mongo_db.db_first_seen
 immotop_scraper.db_upsert = mongo_db.db_upsert
+immotop_scraper.db_upsert_many = mongo_db.db_upsert_many
 immotop_scraper.db_stats = mongo_db.db_stats
 
 # ─────────────────────────────────────────────────────────────
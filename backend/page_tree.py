@@ -0,0 +1,159 @@
+"""
+Page trees
+==========
+One lxml tree per page state, shared by every extractor of a detail page.
+
+  • PageTree(html) parses once with lxml.html, keeps the <script> blobs
+    (JSON-LD, app state) aside and drops <script>/<style> from the tree, so
+    no extractor has to strip them again.
+  • text() mirrors BeautifulSoup's get_text() (same separator / strip
+    semantics) so the existing heuristics read the same strings.
+  • xpath() compiles an expression once, with EXSLT regular expressions
+    available as re:test(...). Scrapers keep their selectors as module-level
+    compiled XPath objects.
+  • DomTracker(driver).tree() hands out the tree of the browser's current
+    DOM and only re-serialises page_source when a MutationObserver counter
+    says the DOM actually changed (e.g. after a click revealed the phone).
+
+Usage:
+    page = PageTree(driver.page_source)
+    h1   = _XP_H1(page.root)
+    title = text(h1[0]) if h1 else ""
+"""
+
+import logging
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+import lxml.html
+from lxml import etree
+
+log = logging.getLogger("page_tree")
+
+_NS = {"re": "http://exslt.org/regular-expressions"}
+
+
+def xpath(expr: str, smart_strings: bool = False) -> etree.XPath:
+    """
+    Compile an XPath expression once (EXSLT regex functions under `re:`).
+    With smart_strings, text() results keep a link to their element
+    (see text_parent()).
+    """
+    return etree.XPath(expr, namespaces=_NS, smart_strings=smart_strings)
+
+
+class Script(NamedTuple):
+    type: str   # lower-cased type attribute ("" when absent)
+    id:   str
+    text: str
+
+
+_XP_NOISE = xpath("//script | //style")
+
+
+def _parse(html: str) -> "lxml.html.HtmlElement":
+    if not html or not html.strip():
+        return lxml.html.document_fromstring("<html><body></body></html>")
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str with an <?xml encoding=…?> declaration — hand lxml the bytes
+        parser = lxml.html.HTMLParser(encoding="utf-8")
+        return lxml.html.document_fromstring(html.encode("utf-8"), parser=parser)
+
+
+class PageTree:
+    """A parsed page: `root` (lxml <html> element) plus its captured scripts."""
+
+    def __init__(self, html: str):
+        self.root = _parse(html)
+        self.scripts: List[Script] = []
+        for el in _XP_NOISE(self.root):
+            if el.tag == "script":
+                self.scripts.append(Script(
+                    (el.get("type") or "").lower(), el.get("id") or "", el.text or "",
+                ))
+            el.drop_tree()  # keeps the tail text in place
+
+    def text(self, sep: str = "", strip: bool = False) -> str:
+        """Whole-page text, like soup.get_text(sep, strip)."""
+        return text(self.root, sep, strip)
+
+
+def text(el: Any, sep: str = "", strip: bool = False) -> str:
+    """BeautifulSoup-compatible get_text() for an lxml element (comments skipped)."""
+    parts = el.itertext()
+    if strip:
+        parts = (p.strip() for p in parts)
+        return sep.join(p for p in parts if p)
+    return sep.join(parts)
+
+
+def text_parent(s: Any) -> Optional[Any]:
+    """Element that contains a text() result (its parent, not the tail owner)."""
+    owner = s.getparent()
+    if owner is not None and s.is_tail:
+        return owner.getparent()
+    return owner
+
+
+def next_element_sibling(el: Any, tag: Optional[str] = None) -> Optional[Any]:
+    """Next sibling element (optionally of a given tag), skipping comments."""
+    for sib in el.itersiblings():
+        if isinstance(sib.tag, str) and (tag is None or sib.tag == tag):
+            return sib
+    return None
+
+
+def element_children(el: Any) -> List[Any]:
+    """Child elements only (no comments / processing instructions)."""
+    return [c for c in el if isinstance(c.tag, str)]
+
+
+# ─────────────────────────────────────────────────────────────
+# Browser pages: re-parse only when the DOM changed
+# ─────────────────────────────────────────────────────────────
+
+# Installs one MutationObserver per document and returns [document id, mutations].
+# A navigation replaces `window`, so the id changes with every new document.
+_DOM_VERSION_JS = """
+if (!window.__domVersion) {
+  var v = window.__domVersion = {id: Math.random().toString(36).slice(2), n: 0};
+  new MutationObserver(function (records) { v.n += records.length; })
+    .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+}
+return [window.__domVersion.id, window.__domVersion.n];
+"""
+
+
+def dom_version(driver: Any) -> Optional[Tuple]:
+    """(document id, mutation count) of the browser's current DOM; None if unavailable."""
+    try:
+        version = driver.execute_script(_DOM_VERSION_JS)
+    except Exception as e:
+        log.debug(f"DOM version probe failed: {e}")
+        return None
+    return tuple(version) if isinstance(version, (list, tuple)) and version else None
+
+
+class DomTracker:
+    """
+    Parsed view of a WebDriver's current page. tree() returns the cached
+    PageTree while the DOM is unchanged and re-parses page_source otherwise.
+    """
+
+    def __init__(self, driver: Any):
+        self.driver = driver
+        self._tree: Optional[PageTree] = None
+        self._version: Optional[Tuple] = None
+        self.parses = 0
+
+    def tree(self) -> PageTree:
+        version = dom_version(self.driver)
+        if self._tree is not None and version is not None and version == self._version:
+            return self._tree
+        # Version is read before page_source: mutations during serialisation
+        # only cause one extra re-parse on the next call.
+        self._tree = PageTree(self.driver.page_source)
+        self._version = version
+        self.parses += 1
+        return self._tree
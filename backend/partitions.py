@@ -0,0 +1,135 @@
+"""
+Index partitions
+================
+Discovery of one index split into disjoint sub-indexes (commune, property
+type, price band …) read in parallel, so a busy day's new listings are
+spread over several short walks instead of one long page-by-page one.
+
+  • An index config may carry "partitions": either a list of query-param
+    dicts (one per sub-index, e.g. price bands) or {param: [values]} whose
+    product gives the sub-indexes. expand() turns the config into one
+    config per sub-index, its params added to the index URL; a config
+    without partitions is kept as is.
+  • discover() reads every sub-index on the driver pool at once. Each one
+    is sorted newest-first on its own, so each stops at its own watermark:
+    its first known listing whose card is unchanged.
+  • merge() joins the sub-indexes' jobs in config order and drops refs
+    already queued by an earlier one (a listing whose price moved between
+    two price bands, or listed under two communes).
+
+Usage:
+    cfg   = {"url": "https://www.athome.lu/vente?sort=date_desc", "type": "buy",
+             "partitions": {"propertyType": ["apartment", "house", "land"]}}
+    found = discover(pool, expand(cfg), get_index_refs, refs, "athome", _title_changes_http)
+    jobs, duplicates = merge(found)
+"""
+
+import logging
+from itertools import product
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from index_cards import IndexCard, card_changes
+from known_refs import KnownRefs
+from job_queue import Job
+
+log = logging.getLogger("partitions")
+
+
+class Partition(NamedTuple):
+    cfg:           Dict         # the sub-index config (url, type, partition params)
+    cards:         int          # cards read before the watermark
+    jobs:          List[Job]    # new / changed refs, newest first
+    stopped:       bool         # reached a known, unchanged listing
+    title_fetches: int          # cards that needed the detail page's title
+
+
+def with_params(url: str, params: Dict[str, Any]) -> str:
+    """`url` with `params` set in its query string (existing values replaced)."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in params]
+    query += [(k, str(v)) for k, v in params.items()]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def expand(cfg: Dict) -> List[Dict]:
+    """One config per sub-index of `cfg` (just [cfg] when it isn't partitioned)."""
+    spec = cfg.get("partitions")
+    if not spec:
+        return [cfg]
+    if isinstance(spec, dict):
+        names = list(spec)
+        spec  = [dict(zip(names, values)) for values in product(*(spec[n] for n in names))]
+    base = {k: v for k, v in cfg.items() if k != "partitions"}
+    return [{**base, "url": with_params(cfg["url"], params), "partition": params} for params in spec]
+
+
+def scan(
+    cards: List[IndexCard],
+    refs: KnownRefs,
+    source: str,
+    transaction_type: str,
+    title_changes: Callable[[str, Dict], Optional[Dict]],
+) -> Tuple[List[Job], bool, int]:
+    """
+    Jobs for the cards before the watermark (the first known listing whose
+    card, or title, is unchanged). Returns (jobs, stopped, title_fetches).
+    """
+    jobs: List[Job] = []
+    fetches = 0
+    for i, card in enumerate(cards, 1):
+        existing = refs.get(card.ref)
+        if existing is None:
+            log.info(f"[{i}] NEW  {card.ref}  {card.url}")
+            jobs.append(Job(card.url, card.ref, source, transaction_type, is_update=False))
+            continue
+        # No request at all; only a card with nothing comparable on it falls
+        # back to fetching the detail page's title
+        changes = card_changes(card, existing, transaction_type)
+        if changes is None:
+            fetches += 1
+            changes = title_changes(card.url, existing)
+        if not changes:
+            log.info(f"[{i}] STOP — hit known listing {card.ref} (unchanged)")
+            return jobs, True, fetches
+        log.info(f"[{i}] UPDATED  {card.ref}" + "".join(
+            f"\n      {field}: {old} → {new}" for field, (old, new) in changes.items()
+        ))
+        jobs.append(Job(card.url, card.ref, source, transaction_type, is_update=True))
+    return jobs, False, fetches
+
+
+def discover(
+    pool: Any,
+    partitions: List[Dict],
+    get_index_refs: Callable[..., List[IndexCard]],
+    refs: KnownRefs,
+    source: str,
+    title_changes: Callable[[str, Dict], Optional[Dict]],
+    max_pages: int = 2,
+) -> List[Partition]:
+    """Read every sub-index up to its own watermark, up to pool.size of them at once."""
+    def _one(cfg: Dict) -> Partition:
+        cards = pool.call(get_index_refs, cfg["url"], max_pages=max_pages)
+        jobs, stopped, fetches = scan(cards, refs, source, cfg.get("type", "buy"), title_changes)
+        log.info(f"  partition {cfg.get('partition') or cfg['url']}: {len(jobs)} jobs"
+                 f"{' (stopped at watermark)' if stopped else ''}")
+        return Partition(cfg, len(cards), jobs, stopped, fetches)
+
+    return list(pool.imap(_one, partitions))
+
+
+def merge(found: List[Partition]) -> Tuple[List[Job], int]:
+    """Jobs of all sub-indexes, each ref once (is_update if any sub-index saw a change)."""
+    jobs: Dict[str, Job] = {}
+    duplicates = 0
+    for part in found:
+        for job in part.jobs:
+            key = job.listing_ref or job.url
+            if key in jobs:
+                duplicates += 1
+                if job.is_update and not jobs[key].is_update:
+                    jobs[key] = jobs[key]._replace(is_update=True)
+                continue
+            jobs[key] = job
+    return list(jobs.values()), duplicates
@@ -0,0 +1,219 @@
+"""
+Phone reveal
+============
+One click on a "show phone number" button, then an event-driven wait for the
+number instead of click-sleep-poll loops.
+
+  • Chrome sessions record network events in the performance log
+    (enable_network_log on the options). ChromeDriver buffers them until
+    read, so the scrapers drain the log after every page load
+    (discard_network_log) and a session that never reveals a phone doesn't
+    pile them up. Right before the click the log is drained again; after
+    it, every poll reads the new events and fetches the body of each XHR /
+    fetch response through CDP Network.getResponseBody. The number usually
+    arrives there before the page renders it.
+  • The same poll also checks for an injected <a href="tel:…">.
+  • WebDriverWait drives the poll at 50 ms with a hard timeout.
+
+reveal_phone() returns PhoneReveal(phone, via, ms) with via one of
+"network", "tel_link" or "none"; callers add their own last-resort fallback
+and aggregate `ms` into the run counters.
+
+Usage:
+    enable_network_log(opts)                      # in _make_driver
+    res = reveal_phone(driver, button, extract=_extract_phone)
+    if res.phone: ...
+"""
+
+import json
+import re
+import time
+import logging
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Set, Tuple
+
+try:
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import (
+        TimeoutException, ElementClickInterceptedException,
+    )
+except ImportError:  # selenium missing → scrapers refuse to run anyway
+    pass
+
+log = logging.getLogger("phone_reveal")
+
+REVEAL_TIMEOUT = 4.0   # seconds after the click before giving up
+POLL_INTERVAL  = 0.05
+
+_PHONE_KEY      = re.compile(r"phone|t[eé]l[eé]phone|^tel$|mobile|gsm", re.I)
+_PHONE_URL_HINT = re.compile(r"phone|telephone|t%C3%A9l%C3%A9phone|contact|reveal|coordonn", re.I)
+_TEL_HREF       = re.compile(r"""href=["']tel:([^"']+)""", re.I)
+
+
+class PhoneReveal(NamedTuple):
+    phone: Optional[str]
+    via:   str     # "network" | "tel_link" | "none" (callers may add their own)
+    ms:    int     # click → number (or timeout), milliseconds
+
+
+def enable_network_log(opts: Any) -> Any:
+    """Record CDP Network events in the session's performance log."""
+    opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    opts.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    return opts
+
+
+def discard_network_log(driver: Any) -> None:
+    """Drop buffered performance-log entries (ChromeDriver keeps them until read)."""
+    try:
+        driver.get_log("performance")
+    except Exception:
+        pass
+
+
+def tel_digits(raw: str) -> Optional[str]:
+    """Digits of a tel: href, without the +352 country code; None if too short."""
+    digits = re.sub(r"\D", "", raw or "")
+    if digits.startswith("352") and len(digits) > 9:
+        digits = digits[3:]
+    return digits if len(digits) >= 6 else None
+
+
+def tel_link_phone(driver: Any, tel_to_phone: Callable[[str], Optional[str]] = tel_digits) -> Optional[str]:
+    """Number of the first usable <a href="tel:…"> on the current page."""
+    for lnk in driver.find_elements(By.CSS_SELECTOR, "a[href^='tel:']"):
+        phone = tel_to_phone((lnk.get_attribute("href") or "").replace("tel:", "").strip())
+        if phone:
+            return phone
+    return None
+
+
+def _scalars(obj: Any, depth: int = 0) -> Iterator[Tuple[str, Any]]:
+    """(key, value) for every scalar inside a decoded JSON payload."""
+    if depth > 6:
+        return
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if isinstance(v, (dict, list)):
+                yield from _scalars(v, depth + 1)
+            else:
+                yield str(k), v
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _scalars(v, depth + 1)
+
+
+def phone_from_payload(body: str, url: str, extract: Callable[[str], Optional[str]],
+                       tel_to_phone: Callable[[str], Optional[str]] = tel_digits) -> Optional[str]:
+    """
+    Phone number carried by a reveal response: a phone-ish key in JSON, a
+    tel: link in an HTML fragment, or (for phone/contact endpoints) any
+    number in the text.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    if isinstance(payload, (dict, list)):
+        for key, value in _scalars(payload):
+            if _PHONE_KEY.search(key) and isinstance(value, (str, int)) and not isinstance(value, bool):
+                phone = extract(str(value))
+                if phone:
+                    return phone
+        return None
+    m = _TEL_HREF.search(body or "")
+    if m:
+        return tel_to_phone(m.group(1))
+    if _PHONE_URL_HINT.search(url or ""):
+        return extract(body or "")
+    return None
+
+
+class _PhoneWatch:
+    """WebDriverWait condition: new network responses first, then tel: links."""
+
+    def __init__(self, extract: Callable, tel_to_phone: Callable):
+        self.extract      = extract
+        self.tel_to_phone = tel_to_phone
+        self.pending: Dict[str, str] = {}   # requestId → url (XHR / fetch responses)
+        self.done: Set[str] = set()
+        self.via = "none"
+
+    def _network(self, driver: Any) -> Optional[str]:
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            return None
+        finished = []
+        for entry in entries:
+            try:
+                msg = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            method, params = msg.get("method"), msg.get("params") or {}
+            if method == "Network.responseReceived" and params.get("type") in ("XHR", "Fetch"):
+                self.pending[params.get("requestId")] = (params.get("response") or {}).get("url", "")
+            elif method == "Network.loadingFinished":
+                finished.append(params.get("requestId"))
+        for request_id in finished:
+            if request_id not in self.pending or request_id in self.done:
+                continue
+            self.done.add(request_id)
+            try:
+                body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            except Exception as e:
+                log.debug(f"getResponseBody failed for {self.pending[request_id]}: {e}")
+                continue
+            phone = phone_from_payload(body.get("body") or "", self.pending[request_id],
+                                       self.extract, self.tel_to_phone)
+            if phone:
+                return phone
+        return None
+
+    def __call__(self, driver: Any) -> Any:
+        phone = self._network(driver)
+        if phone:
+            self.via = "network"
+            return phone
+        phone = tel_link_phone(driver, self.tel_to_phone)
+        if phone:
+            self.via = "tel_link"
+            return phone
+        return False
+
+
+def click(driver: Any, el: Any) -> None:
+    """Scroll an element into view and click it (JS click if something overlays it)."""
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", el)
+    try:
+        el.click()
+    except ElementClickInterceptedException:
+        driver.execute_script("arguments[0].click();", el)
+
+
+def reveal_phone(
+    driver: Any,
+    button: Any,
+    extract: Callable[[str], Optional[str]],
+    tel_to_phone: Callable[[str], Optional[str]] = tel_digits,
+    timeout: float = REVEAL_TIMEOUT,
+) -> PhoneReveal:
+    """Click `button` once and wait (event-driven, hard timeout) for the number."""
+    watch = _PhoneWatch(extract, tel_to_phone)
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})  # getResponseBody needs the domain on
+    except Exception:
+        pass
+    discard_network_log(driver)  # only responses caused by the click count
+
+    t0 = time.perf_counter()
+    phone: Optional[str] = None
+    try:
+        click(driver, button)
+        phone = WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(watch)
+    except TimeoutException:
+        pass
+    except Exception as e:
+        log.debug(f"  Phone reveal failed: {type(e).__name__}: {e}")
+    ms = int((time.perf_counter() - t0) * 1000)
+    return PhoneReveal(phone or None, watch.via if phone else "none", ms)
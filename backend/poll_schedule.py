@@ -0,0 +1,161 @@
+"""
+Poll schedule
+=============
+Per-index poll times driven by how fast new listings arrive, instead of one
+fixed interval day and night.
+
+  • arrival_rate() estimates λ, new listings per minute, of one index from
+    its listings' first_seen: the rate over the last RECENT_MINUTES, and the
+    rate in the same time-of-day window on each of the past HISTORY_DAYS
+    (which sees the morning rush coming before the recent window does). The
+    larger of the two wins.
+  • A listing waits for the next poll (uniform over the interval) plus that
+    poll's run time, so polling every (TARGET_P95_LAG − run time) / 0.95
+    keeps the p95 lag under target.
+  • While λ is so low that a poll at that interval expects fewer than
+    MIN_EXPECTED new listings (nights), the interval stretches to
+    MIN_EXPECTED / λ: an empty poll still costs a Chrome launch. The lag
+    target is a busy-hours target.
+  • Intervals stay within [MIN_INTERVAL, MAX_INTERVAL] minutes and get ±JITTER
+    so the indexes (and the two sites) don't poll in lockstep.
+
+Usage:
+    schedule = PollSchedule([cfg["url"] for cfg in configs])
+    time.sleep(schedule.wait())
+    for key in schedule.due():
+        ...                                                  # poll the index
+        rate = arrival_rate(db_first_seen(source, t_type, history_start()))
+        schedule.polled(key, rate, run_seconds)
+"""
+
+import time
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+TARGET_P95_LAG = 10.0   # minutes from first appearance on the index to the DB
+MIN_INTERVAL   = 2.0    # minutes
+MAX_INTERVAL   = 60.0
+MIN_EXPECTED   = 0.5    # new listings a poll should expect before it's worth a launch
+RECENT_MINUTES = 60
+HISTORY_DAYS   = 7
+JITTER         = 0.1    # ± share of the interval
+
+
+def _parse(ts: str) -> Optional[datetime]:
+    try:
+        t = datetime.fromisoformat(ts)
+    except (TypeError, ValueError):
+        return None
+    return t if t.tzinfo else t.replace(tzinfo=timezone.utc)
+
+
+def history_start(now: Optional[datetime] = None, recent_minutes: int = RECENT_MINUTES,
+                  history_days: int = HISTORY_DAYS) -> str:
+    """Oldest first_seen arrival_rate() looks at (ISO, for the DB query)."""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=history_days, minutes=recent_minutes)).isoformat()
+
+
+def arrival_rate(
+    first_seen: Iterable[str],
+    now: Optional[datetime] = None,
+    recent_minutes: int = RECENT_MINUTES,
+    history_days: int = HISTORY_DAYS,
+) -> float:
+    """New listings per minute: the recent rate or this time of day's usual rate, whichever is higher."""
+    now    = now or datetime.now(timezone.utc)
+    window = timedelta(minutes=recent_minutes)
+    day    = timedelta(days=1)
+    recent = seasonal = 0
+    for ts in first_seen:
+        t = _parse(ts)
+        if t is None:
+            continue
+        age = now - t
+        if timedelta(0) <= age <= window:
+            recent += 1
+        # A window of the same width centred on this time of day, d days ago
+        days = round(age / day)
+        if 1 <= days <= history_days and abs(age - days * day) <= window / 2:
+            seasonal += 1
+    return max(recent / recent_minutes, seasonal / (history_days * recent_minutes))
+
+
+def poll_interval(
+    rate: float,
+    run_seconds: float = 0.0,
+    target_lag: float = TARGET_P95_LAG,
+    min_interval: float = MIN_INTERVAL,
+    max_interval: float = MAX_INTERVAL,
+    min_expected: float = MIN_EXPECTED,
+) -> float:
+    """Minutes until the next poll of an index with `rate` new listings per minute."""
+    interval = (target_lag - run_seconds / 60) / 0.95
+    if rate * interval < min_expected:
+        interval = min_expected / rate if rate > 0 else max_interval
+    return min(max(interval, min_interval), max_interval)
+
+
+class PollSchedule:
+    """Next poll time, rate and interval of each index (keyed by index URL)."""
+
+    def __init__(
+        self,
+        keys: Iterable[Hashable],
+        target_lag: float = TARGET_P95_LAG,
+        min_interval: float = MIN_INTERVAL,
+        max_interval: float = MAX_INTERVAL,
+        jitter: float = JITTER,
+        clock: Callable[[], float] = time.time,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.target_lag   = target_lag
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter       = jitter
+        self.clock        = clock
+        self.rng          = rng
+        self._lock        = threading.Lock()
+        now = clock()
+        self.next_due:  Dict[Hashable, float] = {k: now for k in keys}   # first poll right away
+        self.rates:     Dict[Hashable, float] = {}
+        self.intervals: Dict[Hashable, float] = {}
+
+    def due(self, slack: float = 30.0) -> List[Hashable]:
+        """Indexes due now, or within `slack` seconds (they share the run's Chrome launch)."""
+        now = self.clock()
+        with self._lock:
+            return [k for k, t in self.next_due.items() if t <= now + slack]
+
+    def wait(self) -> float:
+        """Seconds until the next index is due."""
+        with self._lock:
+            return max(0.0, min(self.next_due.values(), default=self.clock() + 60) - self.clock())
+
+    def polled(self, key: Hashable, rate: float, run_seconds: float = 0.0) -> float:
+        """Record a poll of `key`; returns the interval (minutes) until its next one."""
+        interval = poll_interval(rate, run_seconds, self.target_lag, self.min_interval, self.max_interval)
+        spread   = 1 + self.jitter * (2 * self.rng() - 1)
+        with self._lock:
+            self.rates[key]     = rate
+            self.intervals[key] = interval
+            self.next_due[key]  = self.clock() + interval * 60 * spread
+        return interval
+
+    def retry(self, key: Hashable) -> float:
+        """After a failed poll: try again on the busy-hours interval, whatever the rate."""
+        interval = poll_interval(float("inf"), 0.0, self.target_lag, self.min_interval, self.max_interval)
+        with self._lock:
+            self.next_due[key] = self.clock() + interval * 60
+        return interval
+
+    def report(self, indent: str = "    ") -> str:
+        now = self.clock()
+        with self._lock:
+            return "\n".join(
+                f"{indent}{key}: {self.rates.get(key, 0) * 60:.1f} new/h, every "
+                f"{self.intervals.get(key, 0):.1f} min, next in {max(0, due - now) / 60:.1f} min"
+                for key, due in sorted(self.next_due.items(), key=lambda kv: kv[1])
+            )
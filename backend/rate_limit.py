@@ -0,0 +1,220 @@
+"""
+Rate limit
+==========
+One per-host request governor for every fetch path of the process: Chrome
+page loads, the pooled HTTP detail/title fetches and the image downloader,
+across the athome and immotop scheduler threads.
+
+  • Each host has a token bucket (requests per second, with a small burst)
+    and a cap on requests in flight.
+  • The rate adapts (AIMD): every success adds INCREASE req/s up to
+    max_rate; a 429 / 403 / 503 or a timeout halves it (down to min_rate)
+    and pauses the host — for Retry-After when the server sends one.
+  • report() shows each host's current rate, in-flight cap, requests,
+    throttles, timeouts and seconds spent waiting for a token.
+
+Usage:
+    limiter = rate_limiter()
+    resp = limiter.request(session.get, url, timeout=10)    # HTTP: feedback from the status
+    with limiter.slot(url):                                  # Chrome: no status to read
+        driver.get(url)
+    log.info(limiter.report())
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+_TIMEOUTS: tuple = (TimeoutError,)
+try:
+    import requests
+    _TIMEOUTS += (requests.Timeout,)
+except ImportError:
+    pass
+try:
+    from selenium.common.exceptions import TimeoutException
+    _TIMEOUTS += (TimeoutException,)
+except ImportError:
+    pass
+
+THROTTLE_STATUSES = {429, 403, 503}
+INCREASE          = 0.05   # req/s added per successful request
+DECREASE          = 0.5    # rate multiplier on a throttle / timeout
+MAX_PAUSE         = 300.0  # seconds; caps Retry-After
+
+
+class HostLimits(NamedTuple):
+    rate:        float = 2.0    # starting requests per second
+    max_rate:    float = 8.0
+    min_rate:    float = 0.1
+    burst:       float = 4.0    # tokens the bucket holds
+    concurrency: int   = 4      # requests in flight
+
+
+# Image CDNs take more than the listing sites
+DEFAULT_LIMITS = HostLimits()
+HOST_LIMITS: Dict[str, HostLimits] = {
+    "i1.static.athome.eu": HostLimits(rate=8.0, max_rate=20.0, burst=16.0, concurrency=8),
+    "pic.immotop.lu":      HostLimits(rate=8.0, max_rate=20.0, burst=16.0, concurrency=8),
+}
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Host:
+    """Bucket, in-flight cap and counters of one host (guarded by the limiter's lock)."""
+
+    def __init__(self, limits: HostLimits, now: float):
+        self.limits       = limits
+        self.rate         = limits.rate
+        self.tokens       = limits.burst
+        self.updated      = now
+        self.paused_until = 0.0
+        self.slots        = threading.BoundedSemaphore(limits.concurrency)
+        self.requests     = 0
+        self.throttled    = 0
+        self.timeouts     = 0
+        self.waited       = 0.0
+
+    def refill(self, now: float) -> None:
+        self.tokens  = min(self.limits.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class RateLimiter:
+    """Per-host adaptive token buckets shared by every scraper thread."""
+
+    def __init__(self, limits: Optional[Dict[str, HostLimits]] = None,
+                 default: HostLimits = DEFAULT_LIMITS,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.limits  = dict(HOST_LIMITS if limits is None else limits)
+        self.default = default
+        self.clock   = clock
+        self.sleep   = sleep
+        self._lock   = threading.Lock()
+        self._hosts: Dict[str, _Host] = {}
+
+    def _state(self, host: str) -> _Host:
+        # caller holds self._lock
+        if host not in self._hosts:
+            self._hosts[host] = _Host(self.limits.get(host, self.default), self.clock())
+        return self._hosts[host]
+
+    def acquire(self, url: str) -> float:
+        """Block until `url`'s host has a token; returns the seconds waited."""
+        host, waited = _host(url), 0.0
+        while True:
+            with self._lock:
+                st  = self._state(host)
+                now = self.clock()
+                st.refill(now)
+                delay = st.paused_until - now
+                if delay <= 0:
+                    if st.tokens >= 1 - 1e-9:       # float slack from refill()
+                        st.tokens    = max(0.0, st.tokens - 1)
+                        st.requests += 1
+                        st.waited   += waited
+                        return waited
+                    delay = (1 - st.tokens) / st.rate
+            self.sleep(delay)
+            waited += delay
+
+    @contextmanager
+    def slot(self, url: str):
+        """Hold one of the host's in-flight slots and a token while the block runs."""
+        with self._lock:
+            slots = self._state(_host(url)).slots
+        with slots:
+            self.acquire(url)
+            try:
+                yield
+            except _TIMEOUTS as e:
+                self.feedback(url, error=e)
+                raise
+            else:
+                self.feedback(url)
+
+    def feedback(self, url: str, status: Optional[int] = None, error: Optional[BaseException] = None,
+                 retry_after: Optional[float] = None) -> None:
+        """Adapt the host's rate to one response (status) or failure (error)."""
+        timed_out = error is not None and isinstance(error, _TIMEOUTS)
+        with self._lock:
+            st  = self._state(_host(url))
+            lim = st.limits
+            if status in THROTTLE_STATUSES or timed_out:
+                st.rate   = max(lim.min_rate, st.rate * DECREASE)
+                st.tokens = 0.0
+                pause = retry_after if retry_after is not None else 1 / st.rate
+                st.paused_until = max(st.paused_until, self.clock() + min(pause, MAX_PAUSE))
+                if timed_out:
+                    st.timeouts += 1
+                else:
+                    st.throttled += 1
+            elif error is None and (status is None or status < 400):
+                st.rate = min(lim.max_rate, st.rate + INCREASE)
+
+    def request(self, fetch: Callable[..., Any], url: str, **kwargs) -> Any:
+        """fetch(url, **kwargs) (e.g. session.get) under the limiter, fed back from the response."""
+        with self._lock:
+            slots = self._state(_host(url)).slots
+        with slots:
+            self.acquire(url)
+            try:
+                resp = fetch(url, **kwargs)
+            except Exception as e:
+                self.feedback(url, error=e)
+                raise
+            headers = getattr(resp, "headers", None) or {}
+            self.feedback(url, status=getattr(resp, "status_code", None),
+                          retry_after=retry_after_seconds(headers.get("Retry-After")))
+            return resp
+
+    def rate(self, url: str) -> float:
+        with self._lock:
+            return self._state(_host(url)).rate
+
+    def report(self, indent: str = "    ") -> str:
+        """Current rate and counters per host."""
+        with self._lock:
+            hosts = sorted(self._hosts.items())
+            if not hosts:
+                return f"{indent}no requests"
+            lines = [f"{'host':<24} {'req/s':>6} {'slots':>5} {'requests':>8} {'throttled':>9} "
+                     f"{'timeouts':>8} {'waited s':>8}"]
+            for host, st in hosts:
+                lines.append(f"{host:<24} {st.rate:>6.2f} {st.limits.concurrency:>5} {st.requests:>8} "
+                             f"{st.throttled:>9} {st.timeouts:>8} {st.waited:>8.1f}")
+        return "\n".join(indent + line for line in lines)
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def rate_limiter() -> RateLimiter:
+    """The process-wide limiter every scraper and the image store share."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: athome _parse_characteristics (single-pass label matcher on
+the page's lxml tree) versus the previous per-(field, label, element) regex
+loop on a BeautifulSoup, kept below as legacy_parse_characteristics.
+Parsing is excluded from the timings.
+
+Checks that both return identical dicts on every page of the corpus
+(tests/fixtures/athome_detail*.html plus synthetic layouts), then times them.
+
+  cd backend && python scripts/bench_characteristics.py [--rounds 200]
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from bs4 import BeautifulSoup, Tag
+
+import athome_scraper as athome
+from page_tree import PageTree
+
+FIXTURES = backend.parent / "tests" / "fixtures"
+
+
+def legacy_parse_characteristics(soup: BeautifulSoup) -> Dict:
+    """Pre-matcher implementation, verbatim apart from the module prefixes."""
+    for tag in soup.find_all(["script", "style"]):
+        tag.decompose()
+
+    result: Dict = {}
+
+    char_section_start = soup.find(
+        lambda t: t.name in ("h2","h3","h4") and
+                  re.search(r"caract[eé]ristiques|characteristics|eigenschaften",
+                             t.get_text(), re.I)
+    )
+    char_section_end = None
+    if char_section_start:
+        for sib in char_section_start.find_next_siblings():
+            if sib.name in ("h2","h3") and sib != char_section_start:
+                char_section_end = sib
+                break
+
+    def _section_elements():
+        if not char_section_start:
+            yield from soup.find_all(True)
+            return
+        in_section = False
+        for el in soup.find_all(True):
+            if el == char_section_start:
+                in_section = True
+                continue
+            if char_section_end and el == char_section_end:
+                in_section = False
+            if in_section:
+                yield el
+
+    seen_ids: set = set()
+    elements: List[Tuple[Tag, str]] = []
+    for el in _section_elements():
+        eid = id(el)
+        if eid in seen_ids:
+            continue
+        seen_ids.add(eid)
+        direct_tags = [c for c in el.children if hasattr(c, 'name') and c.name]
+        if len(direct_tags) > 4:
+            continue
+        txt = athome._clean(el.get_text(" "))
+        if not txt or len(txt) < 2 or len(txt) > 300:
+            continue
+        elements.append((el, txt))
+
+    def _extract_value(el_text: str, label: str) -> str:
+        pat = re.compile(re.escape(label) + r"\s*:?\s*", re.I)
+        m   = pat.search(el_text)
+        if m:
+            return el_text[m.end():].strip()
+        return ""
+
+    for field, labels, vtype in athome.CHAR_MAP:
+        if field in result:
+            continue
+        for label in labels:
+            for el, txt in elements:
+                if re.match(re.escape(label) + r"\s*:?\s*", txt, re.I):
+                    raw = _extract_value(txt, label)
+                    if not raw:
+                        nxt = el.find_next_sibling()
+                        if nxt:
+                            raw = athome._clean(nxt.get_text(" "))
+                    if raw:
+                        break
+            else:
+                raw = ""
+                for el, txt in elements:
+                    if re.search(re.escape(label), txt, re.I):
+                        raw = _extract_value(txt, label)
+                        if not raw:
+                            nxt = el.find_next_sibling()
+                            if nxt:
+                                raw = athome._clean(nxt.get_text(" "))
+                        if raw:
+                            break
+
+            if not raw:
+                continue
+            if len(raw) > 200 or "window." in raw or "{" in raw:
+                continue
+
+            if   vtype == "price":      result[field] = athome._parse_price(raw)
+            elif vtype == "int":        result[field] = athome._parse_int(raw)
+            elif vtype == "float":      result[field] = athome._parse_float(raw)
+            elif vtype == "float_area": result[field] = athome._parse_float(raw)
+            elif vtype == "bool":       result[field] = athome._parse_bool(raw)
+            elif vtype == "energy":     result[field] = athome._parse_energy(raw)
+            else:                       result[field] = raw
+            break
+
+    return result
+
+
+# ─────────────────────────────────────────────────────────────
+# Corpus
+# ─────────────────────────────────────────────────────────────
+
+def _page(body: str) -> str:
+    return f"<html><body><main>{body}</main></body></html>"
+
+
+def corpus() -> List[Tuple[str, str]]:
+    """(name, html) pages covering the layouts the matcher has to agree on."""
+    pages = [(p.name, p.read_text(encoding="utf-8")) for p in sorted(FIXTURES.glob("athome_detail*.html"))]
+
+    # English labels, colon separators, mixed case
+    pages.append(("en_colons", _page(
+        "<h2>Characteristics</h2>"
+        "<div>Rent: 1 850 €</div><div>MONTHLY CHARGES : 200 €</div>"
+        "<div>Deposit:3 700 €</div><div>Livable surface: 64 m²</div>"
+        "<div>number of bedrooms 2</div><div>Balcony: 6 m²</div>"
+        "<div>Energy class: B</div><div>Pets allowed: No</div><h2>Map</h2>")))
+
+    # Label and value in sibling elements; loose matches inside longer text
+    pages.append(("de_siblings", _page(
+        "<h3>Eigenschaften</h3>"
+        "<dl><dt>Kaufpreis</dt><dd>745 000 €</dd><dt>Wohnfläche</dt><dd>98,5 m²</dd>"
+        "<dt>Schlafzimmer</dt><dd>3</dd><dt>Balkon</dt><dd>Ja</dd></dl>"
+        "<p>Mit Keller: ja</p><p>Aktuelle Miete 1 200 €</p>"
+        "<p>Energieklasse C</p><p>Wärmedämmklasse: D</p><h3>Kontakt</h3>")))
+
+    # No characteristics heading → whole-page fallback, JS-looking values
+    pages.append(("no_heading", _page(
+        "<div>Prix de vente 499 000 €</div><div>Surface habitable 70 m²</div>"
+        "<div>Loyer {\"a\": 1}</div><div>Miete 950 €</div>"
+        "<div>Ascenseur</div><div>Oui</div><div>Garden window.x</div>"
+        "<div>Jardin Non</div><div>Cave oui</div>")))
+
+    # A long page: real block plus a few hundred unrelated elements
+    filler = "".join(f"<p>Paragraph {i} about the neighbourhood, schools and transport.</p>"
+                     for i in range(300))
+    pages.append(("large_page", pages[0][1].replace("<footer>", f"<div>{filler}</div><footer>")))
+    return pages
+
+
+def _soup(html: str) -> BeautifulSoup:
+    return BeautifulSoup(html, "lxml")
+
+
+def _time(fn, parse, html: str, rounds: int) -> float:
+    docs = [parse(html) for _ in range(rounds)]
+    t0 = time.perf_counter()
+    for doc in docs:
+        fn(doc)
+    return (time.perf_counter() - t0) / rounds * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--rounds", type=int, default=200)
+    args = ap.parse_args()
+
+    pages = corpus()
+    for name, html in pages:
+        old = legacy_parse_characteristics(BeautifulSoup(html, "lxml"))
+        new = athome._parse_characteristics(PageTree(html))
+        if old != new:
+            sys.exit(f"MISMATCH on {name}:\n  legacy={old}\n  new   ={new}")
+    print(f"Output identical on {len(pages)} pages\n")
+
+    print(f"{'page':<28} {'legacy ms':>10} {'matcher ms':>11} {'speedup':>8}")
+    for name, html in pages:
+        old_ms = _time(legacy_parse_characteristics, _soup, html, args.rounds)
+        new_ms = _time(athome._parse_characteristics, PageTree, html, args.rounds)
+        print(f"{name:<28} {old_ms:>10.3f} {new_ms:>11.3f} {old_ms / new_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
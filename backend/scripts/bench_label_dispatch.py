@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: immotop _map_characteristic (LabelDispatch) versus the
+previous lower()/if-elif chain, kept below as legacy_map_characteristic.
+
+The (label, value) rows are collected from saved immotop detail pages the same
+way _parse_body reads them (dt/dd pairs and "Label: value" blocks), plus a
+built-in list of labels seen on the site. Both versions must produce the same
+fields for every row and transaction type before anything is timed.
+
+  cd backend && python scripts/bench_label_dispatch.py [saved_pages_dir] [--rounds 200]
+  (default pages: tests/fixtures/immotop_detail*.html)
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+import immotop_scraper as immotop
+from page_tree import PageTree, text, next_element_sibling
+
+FIXTURES = backend.parent / "tests" / "fixtures"
+
+_parse_price, _parse_int   = immotop._parse_price, immotop._parse_int
+_parse_float, _parse_bool  = immotop._parse_float, immotop._parse_bool
+
+
+def legacy_map_characteristic(label: str, value: str, data: Dict, transaction_type: str) -> None:
+    """Pre-dispatch implementation, verbatim."""
+    label = label.lower().strip()
+    value = value.strip()
+
+    # Price
+    if "prix" in label and "m²" not in label:
+        if transaction_type == "buy":
+            data["sale_price"] = _parse_price(value)
+        else:
+            data["rent_price"] = _parse_price(value)
+    elif "charges" in label or "monthly" in label:
+        data["monthly_charges"] = _parse_price(value)
+    elif "caution" in label or "deposit" in label or "garantie" in label:
+        data["deposit"] = _parse_price(value)
+
+    # Dimensions
+    elif "superficie" in label or "surface habitable" in label or "surface" in label:
+        data["surface_m2"] = _parse_float(value)
+    elif "étage" in label or "floor" in label:
+        data["floor"] = _parse_int(value)
+
+    # Rooms
+    elif label == "chambres" or label == "bedrooms" or "chambres à coucher" in label:
+        data["bedrooms"] = _parse_int(value)
+    elif "chambres/pièces" in label or label == "pièces" or label == "rooms":
+        data["rooms"] = _parse_int(value)
+
+    # Bathrooms
+    elif "bains/douches" in label or "salles de bain" in label or "bathrooms" in label:
+        count = _parse_int(value)
+        if count:
+            data["shower_rooms"] = count
+    elif "douche" in label and "salle" in label:
+        data["shower_rooms"] = _parse_int(value)
+    elif "salle de bain" in label:
+        data["bathrooms"] = _parse_int(value)
+    elif "wc" in label or "toilette" in label:
+        data["separate_toilets"] = _parse_int(value)
+
+    # Outdoor
+    elif "terrasse" in label:
+        if re.search(r"\d", value):
+            data["terrace_m2"] = _parse_float(value)
+        else:
+            data["balcony"] = _parse_bool(value)
+    elif "balcon" in label:
+        if re.search(r"\d", value):
+            data["balcony_m2"] = _parse_float(value)
+        else:
+            data["balcony"] = _parse_bool(value)
+    elif "jardin" in label or "garden" in label:
+        data["garden"] = _parse_bool(value)
+
+    # Facilities
+    elif "ascenseur" in label or "elevator" in label or "lift" in label:
+        data["elevator"] = _parse_bool(value)
+    elif "cave" in label or "basement" in label or "cellar" in label:
+        data["basement"] = _parse_bool(value)
+    elif "parking" in label or "garage" in label or "box" in label or "stationnement" in label:
+        data["parking_spaces"] = _parse_int(value)
+    elif "buanderie" in label or "laundry" in label:
+        data["laundry_room"] = _parse_bool(value)
+
+    # Kitchen
+    elif "cuisine" in label:
+        if "équipée" in value.lower() or "equipped" in value.lower():
+            data["fitted_kitchen"] = 1
+        elif "ouverte" in value.lower() or "open" in value.lower():
+            data["open_kitchen"] = 1
+
+    # Other
+    elif "meublé" in label or "furnished" in label:
+        data["furnished"] = _parse_bool(value)
+    elif "année" in label or "construction" in label or "built" in label:
+        data["year_of_construction"] = _parse_int(value)
+    elif "disponibilité" in label or "availability" in label or "libre" in label:
+        data["availability"] = value
+
+
+# ─────────────────────────────────────────────────────────────
+# Corpus
+# ─────────────────────────────────────────────────────────────
+
+# Labels as immotop renders them (FR / EN), including ones no rule maps
+KNOWN_ROWS: List[Tuple[str, str]] = [
+    ("Prix", "895 000 €"), ("Prix/m²", "10 650 €/m²"), ("Charges", "250 €/mois"),
+    ("Monthly charges", "180 €"), ("Caution", "4 300 €"), ("Garantie locative", "3 mois"),
+    ("Superficie", "84 m²"), ("Surface habitable", "120 m²"), ("Surface terrain", "4,5 ares"),
+    ("Étage", "3e étage"), ("Floor", "Ground floor"), ("Chambres", "2"), ("Bedrooms", "3"),
+    ("Chambres à coucher", "4"), ("Chambres/pièces", "5"), ("Pièces", "4"), ("Rooms", "6"),
+    ("Salles de bains/douches", "2"), ("Salle de douche", "1"), ("Salle de bain", "1"),
+    ("Salles de bain", "0"), ("WC séparés", "1"), ("Toilettes", "2"), ("Terrasse", "12 m²"),
+    ("Terrasse", "Oui"), ("Balcon", "6 m²"), ("Balcon", "Non"), ("Jardin", "Oui"),
+    ("Ascenseur", "Oui"), ("Lift", "No"), ("Cave", "Oui"), ("Cellar", "Yes"),
+    ("Parking", "2"), ("Garage", "1 box"), ("Places de stationnement", "1"),
+    ("Buanderie", "Oui"), ("Cuisine", "Équipée"), ("Cuisine", "Ouverte"), ("Cuisine", "Séparée"),
+    ("Meublé", "Non"), ("Furnished", "Yes"), ("Année de construction", "2008"),
+    ("Built in", "1975"), ("Disponibilité", "Immédiate"), ("Libre de suite", "Oui"),
+    ("Chauffage", "Gaz"), ("Type de bien", "Appartement"), ("Référence", "1234567"),
+    ("Efficacité énergétique", "B"), ("Orientation", "Sud-ouest"),
+]
+
+
+def rows_from_page(html: str) -> List[Tuple[str, str]]:
+    """(label, value) rows the way immotop _parse_body feeds _map_characteristic."""
+    page = PageTree(html)
+    rows: List[Tuple[str, str]] = []
+    for dt in immotop._XP_DT(page.root):
+        dd = next_element_sibling(dt, "dd")
+        if dd is not None:
+            rows.append((immotop._clean(text(dt)).lower(), immotop._clean(text(dd))))
+    for elem in immotop._XP_KV_BLOCKS(page.root):
+        el_text = immotop._clean(text(elem))
+        if ":" in el_text and len(el_text) <= 150:
+            label, value = el_text.split(":", 1)
+            rows.append((label.lower().strip(), value.strip()))
+    return rows
+
+
+def corpus(pages_dir: Path = None) -> List[Tuple[str, str]]:
+    paths = sorted(pages_dir.glob("*.htm*")) if pages_dir else sorted(FIXTURES.glob("immotop_detail*.html"))
+    rows = list(KNOWN_ROWS)
+    for path in paths:
+        rows.extend(rows_from_page(path.read_text(encoding="utf-8", errors="replace")))
+    return rows
+
+
+def _apply(fn, rows, transaction_type: str) -> List[Dict]:
+    out = []
+    for label, value in rows:
+        data: Dict = {}
+        fn(label, value, data, transaction_type)
+        out.append(data)
+    return out
+
+
+def _time(fn, rows, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        data: Dict = {}
+        for label, value in rows:
+            fn(label, value, data, "buy")
+    return (time.perf_counter() - t0) / (rounds * len(rows)) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("pages_dir", nargs="?", type=Path, help="directory of saved immotop detail pages")
+    ap.add_argument("--rounds", type=int, default=200)
+    args = ap.parse_args()
+
+    rows = corpus(args.pages_dir)
+    for t in ("buy", "rent"):
+        old = _apply(legacy_map_characteristic, rows, t)
+        new = _apply(immotop._map_characteristic, rows, t)
+        for (label, value), a, b in zip(rows, old, new):
+            if a != b:
+                sys.exit(f"MISMATCH on {label!r}={value!r} [{t}]: legacy={a} dispatch={b}")
+    print(f"Output identical on {len(rows)} rows ({len(set(r[0] for r in rows))} distinct labels)\n")
+
+    immotop._CHAR_RULES.reset_stats()
+    old_us = _time(legacy_map_characteristic, rows, args.rounds)
+    new_us = _time(immotop._map_characteristic, rows, args.rounds)
+    print(f"legacy if/elif : {old_us:6.2f} µs / row")
+    print(f"LabelDispatch  : {new_us:6.2f} µs / row   ({old_us / new_us:.1f}x)")
+    print(f"\n{immotop._CHAR_RULES.report()}")
+
+
+if __name__ == "__main__":
+    main()
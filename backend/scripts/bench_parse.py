@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Per-listing parse cost: BeautifulSoup(html, "lxml") — what the detail
+scrapers used to build (up to three times per page) — versus one PageTree,
+and the full athome _parse_detail on that tree.
+
+Reports CPU ms and peak Python heap (tracemalloc) per page for every
+tests/fixtures/*_detail*.html, or for the saved pages given on the command line.
+
+  cd backend && python scripts/bench_parse.py [--rounds 100] [page.html ...]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from bs4 import BeautifulSoup
+
+import athome_scraper as athome
+from page_tree import PageTree
+
+FIXTURES = backend.parent / "tests" / "fixtures"
+URL = "https://www.athome.lu/vente/appartement/x/id-1.html"
+
+
+def _cpu_ms(fn, rounds: int) -> float:
+    t0 = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - t0) / rounds * 1000
+
+
+def _peak_kib(fn) -> float:
+    tracemalloc.start()
+    keep = fn()  # noqa: F841 — measured while the result is alive
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--rounds", type=int, default=100)
+    ap.add_argument("pages", nargs="*", type=Path)
+    args = ap.parse_args()
+
+    pages = args.pages or sorted(FIXTURES.glob("*_detail*.html"))
+    print(f"{'page':<30} {'soup ms':>8} {'tree ms':>8} {'parse_detail ms':>16} {'soup KiB':>9} {'tree KiB':>9}")
+    for path in pages:
+        html = path.read_text(encoding="utf-8", errors="replace")
+        soup_ms = _cpu_ms(lambda: BeautifulSoup(html, "lxml"), args.rounds)
+        tree_ms = _cpu_ms(lambda: PageTree(html), args.rounds)
+        full_ms = _cpu_ms(lambda: athome._parse_detail(PageTree(html), URL, "buy"), args.rounds)
+        soup_kib = _peak_kib(lambda: BeautifulSoup(html, "lxml"))
+        tree_kib = _peak_kib(lambda: PageTree(html))
+        print(f"{path.name:<30} {soup_ms:>8.2f} {tree_ms:>8.2f} {full_ms:>16.2f} {soup_kib:>9.0f} {tree_kib:>9.0f}")
+    print("\n(tree KiB counts Python-side allocations only; libxml2 nodes live in C memory)")
+
+
+if __name__ == "__main__":
+    main()
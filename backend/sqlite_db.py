@@ -0,0 +1,91 @@
+"""
+SQLite connections
+==================
+One long-lived connection per thread and database file for listings.db,
+shared by athome_scraper and immotop_scraper (their db_connect() returns it).
+
+  • WAL journal: readers never block the writer and the writer doesn't block
+    readers, so both scrapers (and the parallel scheduler's threads) can use
+    the same file. busy_timeout makes a second writer wait its turn instead
+    of failing with "database is locked".
+  • synchronous=NORMAL (safe with WAL; no fsync per commit), a 32 MB page
+    cache and a 256 MB memory map.
+  • The INSERT / UPDATE statements are generated once from LISTING_FIELDS,
+    so the connection's statement cache keeps them prepared across calls.
+  • `with db_connect() as conn:` still commits / rolls back per block; the
+    connection stays open. A connection someone closed is reopened on the
+    next call; a thread's connections are released when the thread ends
+    (the pool's detail workers live for one imap() batch).
+
+Usage:
+    conn = connect(DB_PATH)
+    conn.execute(insert_sql(), listing_params(data))
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+
+_root = Path(__file__).resolve().parent.parent
+if str(_root) not in __import__("sys").path:
+    __import__("sys").path.insert(0, str(_root))
+from lib.listings_schema import LISTING_FIELDS
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 10000",       # ms a writer waits for the lock
+    "PRAGMA cache_size = -32000",        # KiB
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+STATEMENT_CACHE = 256   # prepared statements kept per connection
+
+_local = threading.local()
+
+
+def _open(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10, cached_statements=STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """This thread's connection to `path`, opened (and tuned) on first use."""
+    conns: Dict[str, sqlite3.Connection] = _local.__dict__.setdefault("conns", {})
+    key = str(Path(path).resolve())
+    conn = conns.get(key)
+    if conn is not None:
+        try:
+            conn.total_changes          # raises once the connection was closed
+            return conn
+        except sqlite3.ProgrammingError:
+            pass
+    conn = conns[key] = _open(Path(path))
+    return conn
+
+
+# ─────────────────────────────────────────────────────────────
+# Statements
+# ─────────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=None)
+def insert_sql(table: str = "listings", fields: Tuple[str, ...] = tuple(LISTING_FIELDS)) -> str:
+    """INSERT OR IGNORE of every column with named parameters (missing keys bind NULL)."""
+    return (f"INSERT OR IGNORE INTO {table} ({', '.join(fields)}) "
+            f"VALUES ({', '.join(':' + f for f in fields)})")
+
+
+@lru_cache(maxsize=1024)
+def update_sql(cols: Tuple[str, ...], table: str = "listings") -> str:
+    """UPDATE of `cols` by listing_ref; one string per column set, reused by every call."""
+    return (f"UPDATE {table} SET {', '.join(f'{c} = :{c}' for c in cols)} "
+            f"WHERE listing_ref = :listing_ref")
+
+
+def listing_params(data: Dict, fields: Iterable[str] = LISTING_FIELDS) -> Dict:
+    return {f: data.get(f) for f in fields}
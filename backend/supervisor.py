@@ -0,0 +1,296 @@
+"""
+Scraper supervisor
+==================
+Runs each site's scraper in its own worker process, so a hung ChromeDriver
+or a parsing CPU spike on one site can't stall the other (as two threads
+they shared one interpreter and its GIL).
+
+  • A worker runs target(link, *args) in a fresh ("spawn") process — no
+    Chrome threads or DB connections inherited from the parent — and
+    configures its own DB backend (db_backend.py) and Chrome sessions.
+  • `link` (WorkerLink) is the worker's end of its own pipe, created with
+    the process: a background thread sends a heartbeat every
+    HEARTBEAT_SECONDS, and the worker reports each run's start, its counters
+    and its status. A worker killed in the middle of a message only breaks
+    its own pipe, which goes with it.
+  • poll() drains the pipes, then restarts a worker that
+      – exited,
+      – sent nothing for HEARTBEAT_TIMEOUT (the interpreter is wedged), or
+      – has been in one run for RUN_TIMEOUT (stuck in a browser call; the
+        heartbeat thread keeps beating through that).
+    The worker is killed together with the chromedriver / Chrome processes
+    below it: every heartbeat carries the worker's process tree, so a worker
+    that crashed (and left its Chrome to init) doesn't orphan them.
+  • The n-th restart in a row waits RESTART_BACKOFF * 2**(n-1) seconds (at
+    most RESTART_BACKOFF_MAX); a finished run resets n.
+  • Every message carries its sender's pid, so nothing a killed worker sent
+    counts for its successor.
+
+Usage:
+    sup = Supervisor([WorkerSpec("athome", worker_main, ("athome_scraper", configs))])
+    sup.start()
+    try:
+        while True:
+            sup.poll(timeout=1)
+    finally:
+        sup.stop()
+"""
+
+import os
+import sys
+import time
+import pickle
+import signal
+import logging
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from pathlib import Path
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+_backend = Path(__file__).resolve().parent
+if str(_backend) not in sys.path:
+    sys.path.append(str(_backend))
+from chrome_profile import process_tree
+
+log = logging.getLogger("supervisor")
+
+HEARTBEAT_SECONDS   = 10
+HEARTBEAT_TIMEOUT   = 90      # seconds without any message → restart
+RUN_TIMEOUT         = 1800    # seconds in one run → restart
+RESTART_BACKOFF     = 5
+RESTART_BACKOFF_MAX = 300
+KILL_GRACE          = 5       # seconds between SIGTERM and SIGKILL
+
+# Run counters summed over a worker's lifetime (across restarts)
+TOTAL_COUNTERS = ("inserted", "updated", "failed", "driver_launches")
+
+
+class WorkerSpec(NamedTuple):
+    name:   str
+    target: Callable          # module-level function: target(link, *args)
+    args:   tuple = ()
+
+
+# ─────────────────────────────────────────────────────────────
+# Worker side
+# ─────────────────────────────────────────────────────────────
+
+class WorkerLink:
+    """A worker's channel to the supervisor: heartbeats, run reports, status."""
+
+    def __init__(self, name: str, conn: Any, interval: float = HEARTBEAT_SECONDS):
+        self.name     = name
+        self.conn     = conn              # write end of this worker's pipe
+        self.interval = interval
+        self._lock    = threading.Lock()  # the heartbeat thread sends too
+
+    def send(self, kind: str, payload: Any = None) -> None:
+        with self._lock:
+            self.conn.send((self.name, os.getpid(), kind, payload))
+
+    def start_heartbeat(self) -> None:
+        def beat():
+            while True:
+                self.send("beat", process_tree(os.getpid()))
+                time.sleep(self.interval)
+        threading.Thread(target=beat, name=f"{self.name}-heartbeat", daemon=True).start()
+
+    def run_started(self) -> None:
+        self.send("run_start")
+
+    def run_finished(self, counters: Dict[str, Any], seconds: float) -> None:
+        self.send("run_done", {"counters": dict(counters), "seconds": seconds})
+
+    def run_failed(self, error: str) -> None:
+        self.send("run_failed", error)
+
+    def status(self, **fields) -> None:
+        """Free-form state for the supervisor's report (e.g. the poll schedule)."""
+        self.send("status", fields)
+
+
+def _worker_entry(name: str, target: Callable, conn: Any, args: tuple, interval: float) -> None:
+    link = WorkerLink(name, conn, interval)
+    link.start_heartbeat()
+    target(link, *args)
+
+
+# ─────────────────────────────────────────────────────────────
+# Supervisor side
+# ─────────────────────────────────────────────────────────────
+
+class WorkerState:
+    """What the supervisor knows about one worker (survives its restarts)."""
+
+    def __init__(self, spec: WorkerSpec):
+        self.spec        = spec
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.conn: Any   = None        # read end of the worker's pipe
+        self.tree: List[int] = []      # the worker's process tree at its last heartbeat
+        self.last_beat   = 0.0
+        self.run_started: Optional[float] = None
+        self.not_before  = 0.0         # earliest (re)start
+        self.failures    = 0           # restarts since the last finished run
+        self.restarts    = 0
+        self.runs        = 0
+        self.run_errors  = 0
+        self.last_run: Optional[datetime] = None
+        self.last_counters: Dict[str, Any] = {}
+        self.last_error  = ""
+        self.totals: Counter = Counter()
+        self.status: Dict[str, Any] = {}
+
+    @property
+    def running(self) -> bool:
+        return self.run_started is not None
+
+
+class Supervisor:
+    """Starts, watches and restarts one worker process per WorkerSpec."""
+
+    def __init__(
+        self,
+        specs: List[WorkerSpec],
+        heartbeat_seconds: float = HEARTBEAT_SECONDS,
+        heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+        run_timeout: float = RUN_TIMEOUT,
+        restart_backoff: float = RESTART_BACKOFF,
+        context: Any = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ctx = context or multiprocessing.get_context("spawn")
+        self.heartbeat_seconds = heartbeat_seconds
+        self.heartbeat_timeout = heartbeat_timeout
+        self.run_timeout       = run_timeout
+        self.restart_backoff   = restart_backoff
+        self.clock   = clock
+        self.workers: Dict[str, WorkerState] = {spec.name: WorkerState(spec) for spec in specs}
+
+    # ── Lifecycle ────────────────────────────────────────────
+
+    def start(self) -> None:
+        for w in self.workers.values():
+            self._spawn(w)
+
+    def _spawn(self, w: WorkerState) -> None:
+        spec = w.spec
+        w.conn, child_conn = self.ctx.Pipe(duplex=False)
+        w.process = self.ctx.Process(
+            target=_worker_entry,
+            args=(spec.name, spec.target, child_conn, spec.args, self.heartbeat_seconds),
+            name=f"{spec.name}-worker",
+            daemon=True,
+        )
+        w.process.start()
+        child_conn.close()                # the worker holds the only write end: EOF once it's gone
+        w.tree = [w.process.pid]
+        w.last_beat   = self.clock()      # grace period until its first heartbeat
+        w.run_started = None
+        log.info(f"{spec.name}: worker started (pid {w.process.pid})")
+
+    def _kill(self, w: WorkerState) -> None:
+        """Stop the worker and every process it started (chromedriver, Chrome)."""
+        proc = w.process
+        if proc is None:
+            return
+        tree = set(w.tree[1:])
+        if proc.is_alive():
+            tree.update(process_tree(proc.pid)[1:])
+        proc.terminate()
+        proc.join(KILL_GRACE)
+        if proc.is_alive():
+            proc.kill()
+            proc.join(KILL_GRACE)
+        for pid in tree:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        if w.conn is not None:
+            w.conn.close()
+        w.process, w.conn, w.tree = None, None, []
+
+    def _restart(self, w: WorkerState, reason: str) -> None:
+        self._kill(w)
+        w.failures += 1
+        w.restarts += 1
+        w.run_started = None
+        w.last_error  = reason
+        delay = min(self.restart_backoff * 2 ** (w.failures - 1), RESTART_BACKOFF_MAX)
+        w.not_before = self.clock() + delay
+        log.warning(f"{w.spec.name}: {reason} — restarting in {delay:.0f}s (restart #{w.restarts})")
+
+    def stop(self) -> None:
+        for w in self.workers.values():
+            self._kill(w)
+
+    # ── Watching ─────────────────────────────────────────────
+
+    def poll(self, timeout: float = 1.0) -> None:
+        """Handle the workers' messages (waiting up to `timeout` for the first), then check on them."""
+        conns = {w.conn: w for w in self.workers.values() if w.conn is not None}
+        if conns:
+            for conn in wait(list(conns), timeout):
+                self._drain(conns[conn])
+        else:
+            time.sleep(timeout)
+        self.check()
+
+    def _drain(self, w: WorkerState) -> None:
+        """Handle everything waiting on one worker's pipe; a broken pipe is left to check()."""
+        try:
+            while w.conn.poll():
+                self._handle(*w.conn.recv())
+        except (EOFError, OSError, pickle.UnpicklingError):
+            w.conn.close()
+            w.conn = None
+
+    def _handle(self, name: str, pid: int, kind: str, payload: Any) -> None:
+        w = self.workers.get(name)
+        if w is None or w.process is None or w.process.pid != pid:
+            return                              # a worker that was already replaced
+        w.last_beat = self.clock()
+        if kind == "beat":
+            w.tree = payload
+        elif kind == "run_start":
+            w.run_started = w.last_beat
+        elif kind == "run_done":
+            w.run_started = None
+            w.runs += 1
+            w.failures = 0
+            w.last_run = datetime.now()
+            w.last_counters = payload["counters"]
+            for key in TOTAL_COUNTERS:
+                w.totals[key] += payload["counters"].get(key, 0)
+        elif kind == "run_failed":
+            w.run_started = None
+            w.run_errors += 1
+            w.last_error = payload
+        elif kind == "status":
+            w.status.update(payload)
+
+    def check(self) -> None:
+        """Restart workers that died or hang; start those whose backoff is over."""
+        now = self.clock()
+        for w in self.workers.values():
+            if w.process is None:
+                if now >= w.not_before:
+                    self._spawn(w)
+                continue
+            if not w.process.is_alive():
+                self._restart(w, f"worker exited with code {w.process.exitcode}")
+            elif now - w.last_beat > self.heartbeat_timeout:
+                self._restart(w, f"no heartbeat for {now - w.last_beat:.0f}s")
+            elif w.running and now - w.run_started > self.run_timeout:
+                self._restart(w, f"run hung for {now - w.run_started:.0f}s")
+
+    def report(self, name: str) -> str:
+        """One worker's state for the status log."""
+        w = self.workers[name]
+        state = ("restarting" if w.process is None else "running" if w.running else "waiting")
+        line = (f"{state}, {w.runs} runs, {w.run_errors} failed, {w.restarts} restarts, "
+                f"pid {w.process.pid if w.process else '-'}")
+        return line + (f", last error: {w.last_error}" if w.last_error else "")
@@ -0,0 +1,149 @@
+"""
+Waits
+=====
+Condition-based waits for the Selenium scrapers, plus a per-call-site account
+of where a run's wall-clock time goes.
+
+  • WaitStats.until() wraps WebDriverWait with a tight poll (50 ms) and
+    returns None on timeout instead of raising, so call sites read like the
+    old try/sleep blocks without the fixed sleeps.
+  • WaitStats.work() times the active part of a call site (navigation,
+    clicks, parsing, downloads) under the same name. Waits (and nested
+    work) recorded inside it on the same thread are subtracted, so every
+    second lands in exactly one column.
+  • report() prints calls, seconds waiting, seconds working and timeouts per
+    site. Times are summed over worker threads, so with concurrency > 1 the
+    total can exceed the run's wall-clock.
+
+Conditions that Selenium's expected_conditions lack:
+  • dom_changed(before)     — the MutationObserver counter moved (page_tree)
+  • count_settled(locator)  — lazy-loaded lists stopped growing
+  • document_complete       — readyState == "complete"
+
+Usage:
+    _WAITS = WaitStats()
+    with _WAITS.work("detail.load"):
+        driver.get(url)
+    h1 = _WAITS.until(driver, "detail.h1", EC.presence_of_element_located((By.TAG_NAME, "h1")), 5)
+    log.info(_WAITS.report())
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+except ImportError:  # selenium missing → scrapers refuse to run anyway
+    pass
+
+from page_tree import dom_version
+
+POLL = 0.05
+
+
+class WaitStats:
+    """Thread-safe wait / work seconds per named call site."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sites: Dict[str, List[float]] = {}   # site → [calls, wait s, work s, timeouts]
+        self._open = threading.local()             # .frames: seconds recorded inside each open work()
+
+    def record(self, site: str, wait: float = 0.0, work: float = 0.0, timed_out: bool = False) -> None:
+        frames = getattr(self._open, "frames", None)
+        if frames:
+            frames[-1] += wait + work
+        with self._lock:
+            row = self._sites.setdefault(site, [0, 0.0, 0.0, 0])
+            row[0] += 1
+            row[1] += wait
+            row[2] += work
+            row[3] += timed_out
+
+    def until(
+        self,
+        driver: Any,
+        site: str,
+        condition: Callable[[Any], Any],
+        timeout: float,
+        poll: float = POLL,
+    ) -> Any:
+        """First truthy condition(driver) within `timeout` seconds, else None."""
+        t0 = time.perf_counter()
+        try:
+            result = WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+        except TimeoutException:
+            result = None
+        self.record(site, wait=time.perf_counter() - t0, timed_out=result is None)
+        return result
+
+    @contextmanager
+    def work(self, site: str):
+        frames = getattr(self._open, "frames", None)
+        if frames is None:
+            frames = self._open.frames = []
+        frames.append(0.0)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            inner = frames.pop()
+            self.record(site, work=max(time.perf_counter() - t0 - inner, 0.0))
+
+    def sites(self) -> Dict[str, Tuple[int, float, float, int]]:
+        with self._lock:
+            return {site: (int(c), w, k, int(t)) for site, (c, w, k, t) in self._sites.items()}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._sites.clear()
+
+    def report(self, indent: str = "    ") -> str:
+        """Table of calls / wait / work / timeouts per site, slowest first."""
+        sites = self.sites()
+        if not sites:
+            return f"{indent}no waits recorded"
+        lines = [f"{'site':<16} {'calls':>6} {'wait s':>8} {'work s':>8} {'timeouts':>8}"]
+        for site, (calls, wait, work, timeouts) in sorted(
+                sites.items(), key=lambda kv: kv[1][1] + kv[1][2], reverse=True):
+            lines.append(f"{site:<16} {calls:>6} {wait:>8.2f} {work:>8.2f} {timeouts:>8}")
+        total_wait = sum(v[1] for v in sites.values())
+        total_work = sum(v[2] for v in sites.values())
+        share = total_wait / (total_wait + total_work) * 100 if total_wait + total_work else 0.0
+        lines.append(f"{'total':<16} {'':>6} {total_wait:>8.2f} {total_work:>8.2f}   ({share:.0f}% waiting)")
+        return "\n".join(indent + line for line in lines)
+
+
+# ─────────────────────────────────────────────────────────────
+# Conditions
+# ─────────────────────────────────────────────────────────────
+
+def dom_changed(before: Optional[Tuple]) -> Callable[[Any], bool]:
+    """True once the DOM version differs from `before` (taken with dom_version())."""
+    def _changed(driver: Any) -> bool:
+        return dom_version(driver) != before
+    return _changed
+
+
+class count_settled:
+    """
+    Number of elements matching `locator` once it is non-zero and unchanged
+    between two consecutive polls (lazy-loaded cards stopped arriving).
+    """
+
+    def __init__(self, locator: Tuple[str, str]):
+        self.locator = locator
+        self.last = -1
+
+    def __call__(self, driver: Any) -> Any:
+        n = len(driver.find_elements(*self.locator))
+        settled = n > 0 and n == self.last
+        self.last = n
+        return n if settled else False
+
+
+def document_complete(driver: Any) -> bool:
+    return driver.execute_script("return document.readyState") == "complete"
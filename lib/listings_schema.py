@@ -60,6 +60,7 @@ LISTING_FIELDS = [
     "agent_name",
     "agency_logo_url",
     "images_dir",
+    "fingerprint",
 ]
 
 # SQLite type per field (schema-compliant; no agency_ref, gas_heating, etc.)
@@ -112,6 +113,7 @@ LISTING_SQLITE_TYPES = {
     "agent_name": "TEXT",
     "agency_logo_url": "TEXT",
     "images_dir": "TEXT",
+    "fingerprint": "TEXT",
 }
 
 
@@ -0,0 +1,1232 @@
+#!/usr/bin/env python3
+"""
+Backend scraper plumbing: driver pool, parsing helpers, DB write paths.
+Run from project root: python -m pytest tests/test_backend_scrapers.py -v
+Everything here runs offline (no Chrome, no network, no MongoDB).
+"""
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("selenium")
+from selenium.common.exceptions import WebDriverException  # noqa: E402
+
+
+class FakeDriver:
+    """Stands in for webdriver.Chrome: only what DriverPool touches."""
+
+    def __init__(self):
+        self.alive = True
+        self.quit_called = False
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise WebDriverException("session deleted")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_driver_pool_reuses_and_bounds_drivers():
+    from backend.driver_pool import DriverPool
+    made = []
+    pool = DriverPool(lambda: made.append(FakeDriver()) or made[-1], size=2)
+    seen = set()
+    lock = threading.Lock()
+
+    def job(drv, n):
+        with lock:
+            seen.add(id(drv))
+        return n * 2
+
+    assert list(pool.map(job, range(10))) == [n * 2 for n in range(10)]
+    assert len(made) <= 2
+    assert len(seen) == len(made)
+    pool.close()
+    assert all(d.quit_called for d in made)
+
+
+def test_driver_pool_replaces_crashed_driver_and_retries():
+    from backend.driver_pool import DriverPool
+    made = []
+    pool = DriverPool(lambda: made.append(FakeDriver()) or made[-1], size=1)
+    calls = []
+
+    def job(drv, n):
+        calls.append(drv)
+        if len(calls) == 1:
+            drv.alive = False  # Chrome died mid-page
+            raise WebDriverException("chrome not reachable")
+        return n
+
+    assert pool.call(job, 7) == 7
+    assert len(made) == 2 and pool.replaced == 1
+    assert made[0].quit_called
+    pool.close()
+
+
+def test_driver_pool_does_not_retry_page_errors():
+    from backend.driver_pool import DriverPool
+    pool = DriverPool(FakeDriver, size=1)
+
+    def job(drv):
+        raise WebDriverException("element not interactable")
+
+    with pytest.raises(WebDriverException):
+        pool.call(job)
+    assert pool.launched == 1 and pool.replaced == 0
+    pool.close()
+
+
+def test_driver_pool_recycles_long_lived_sessions(tmp_path):
+    from backend.driver_pool import DriverPool
+    made, rss = [], {}
+
+    def factory(profile):
+        drv = FakeDriver()
+        drv.profile = profile
+        made.append(drv)
+        return drv
+
+    profiles = [tmp_path / "slot0", tmp_path / "slot1"]
+    pool = DriverPool(factory, size=2, max_uses=3, max_rss_mb=500, profiles=profiles,
+                      rss=lambda drv: rss.get(id(drv), 100))
+    for _ in range(3):
+        pool.call(lambda drv: None)
+    assert len(made) == 1 and pool.recycled == 1 and made[0].quit_called
+    before = pool.snapshot()
+    pool.call(lambda drv: None)
+    assert made[1].profile == made[0].profile                 # the freed profile dir is reused
+    assert pool.report(before).startswith("1 launched in ")
+
+    pool.max_uses = 0
+    rss[id(made[1])] = 2000                                  # checked every RSS_CHECK_EVERY uses
+    for _ in range(8):
+        pool.call(lambda drv: None)
+    assert pool.recycled == 1
+    pool.call(lambda drv: None)
+    assert pool.recycled == 2 and made[1].quit_called
+    pool.close()
+    assert pool.launched == 2 and pool.snapshot()["launch_seconds"] >= 0
+
+
+# ─────────────────────────────────────────────────────────────
+# athome detail parsing
+# ─────────────────────────────────────────────────────────────
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+ATHOME_URL = "https://www.athome.lu/vente/appartement/schuttrange/id-8983182.html"
+
+
+def _athome():
+    pytest.importorskip("bs4")
+    import backend.athome_scraper as athome
+    return athome
+
+
+def _athome_fixture_page():
+    from backend.page_tree import PageTree
+    return PageTree((FIXTURES / "athome_detail.html").read_text(encoding="utf-8"))
+
+
+def test_athome_parse_detail_static_html():
+    athome = _athome()
+    data = athome._parse_detail(_athome_fixture_page(), ATHOME_URL, "buy")
+    assert data["listing_ref"] == "8983182"
+    assert data["title"] == "Appartement 3 chambres à Schuttrange"
+    assert data["location"] == "Schuttrange"
+    assert data["sale_price"] == 1308251.98
+    assert data["surface_m2"] == 111.24
+    assert data["bedrooms"] == 3
+    assert data["energy_class"] == "A+"
+    assert data["agency_name"] == "Immo Lux SARL"
+    assert data["phone_number"] == "621123456" and data["phone_source"] == "description"
+    assert "inline noise" not in data["description"]
+    assert athome._detail_is_valid(data)
+
+
+class RecordingPool:
+    """DriverPool stand-in: records which browser step was requested."""
+
+    def __init__(self, result=None):
+        self.calls = []
+        self.result = result
+
+    def call(self, fn, *args, **kwargs):
+        self.calls.append(fn.__name__)
+        return self.result
+
+
+def test_athome_fast_path_uses_chrome_only_for_missing_phone(monkeypatch):
+    athome = _athome()
+    parsed = athome._parse_detail(_athome_fixture_page(), ATHOME_URL, "buy")
+
+    # Phone already in the description → no browser at all
+    monkeypatch.setattr(athome, "fetch_detail_http", lambda url, t: dict(parsed))
+    pool = RecordingPool()
+    data = athome.scrape_detail_fast(pool, ATHOME_URL, "buy", save_images=False)
+    assert pool.calls == [] and data["_fetched_via"] == "http"
+
+    # No phone in the static HTML → Chrome only for the reveal button
+    no_phone = dict(parsed, phone_number=None, phone_source=None)
+    monkeypatch.setattr(athome, "fetch_detail_http", lambda url, t: dict(no_phone))
+    from backend.phone_reveal import PhoneReveal
+    pool = RecordingPool(result=PhoneReveal("691000111", "network", 180))
+    data = athome.scrape_detail_fast(pool, ATHOME_URL, "buy", save_images=False)
+    assert pool.calls == ["_reveal_phone"]
+    assert data["phone_number"] == "691000111" and data["phone_source"] == "button"
+    assert data["_phone_reveal_ms"] == 180
+
+    # Static HTML failed validation → full Selenium scrape
+    monkeypatch.setattr(athome, "fetch_detail_http", lambda url, t: None)
+    pool = RecordingPool(result={"listing_ref": "8983182"})
+    athome.scrape_detail_fast(pool, ATHOME_URL, "buy", save_images=False)
+    assert pool.calls == ["scrape_detail"]
+
+
+def test_athome_app_state_preferred_over_dom():
+    athome = _athome()
+    from backend.page_tree import PageTree
+    html = (FIXTURES / "athome_detail_app_state.html").read_text(encoding="utf-8")
+    url = "https://www.athome.lu/location/appartement/luxembourg-gare/id-8991001.html"
+    data = athome._parse_detail(PageTree(html), url, "rent")
+    src = data["_field_sources"]
+    assert data["rent_price"] == 2150.0 and src["rent_price"] == "app_state"
+    assert data["monthly_charges"] == 250.0
+    assert data["surface_m2"] == 78.5 and data["bedrooms"] == 2
+    assert data["furnished"] == 0 and data["elevator"] == 1 and data["balcony"] == 1
+    assert data["energy_class"] == "C"
+    assert data["description"].startswith("Bel appartement rénové proche de la gare. Libre")
+    assert data["location"] == "Luxembourg-Gare"
+    assert data["agency_name"] == "Gare Immo"
+    assert data["phone_number"] == "26123456" and data["phone_source"] == "page_data"
+    assert len(athome.json.loads(data["image_urls"])) == 2
+    assert "dom" not in src.values()
+
+
+def test_athome_json_ld_and_dom_fallback_sources():
+    athome = _athome()
+    data = athome._parse_detail(_athome_fixture_page(), ATHOME_URL, "buy")
+    src = data["_field_sources"]
+    assert src["agency_name"] == "json_ld"
+    assert src["sale_price"] == "dom" and src["title"] == "dom"
+
+
+def test_athome_json_ld_price_keeps_characteristics_scan():
+    athome = _athome()
+    from backend.page_tree import PageTree
+    html = (FIXTURES / "athome_detail.html").read_text(encoding="utf-8").replace(
+        "</head>",
+        '<script type="application/ld+json">{"@type": "Offer", "price": 1300000}</script></head>')
+    data = athome._parse_detail(PageTree(html), ATHOME_URL, "buy")
+    src = data["_field_sources"]
+    assert data["sale_price"] == 1300000.0 and src["sale_price"] == "json_ld"
+    assert data["energy_class"] == "A+" and data["elevator"] == 1
+    assert data["parking_spaces"] == 2 and data["surface_m2"] == 111.24
+    assert src["surface_m2"] == "dom"
+
+
+def test_label_matcher_reports_overlapping_labels():
+    from backend.label_matcher import LabelMatcher
+    m = LabelMatcher(["Balcony", "Balcon", "Rent", "balcon"])
+    assert m.labels == ["Balcony", "Balcon", "Rent"]
+    assert m.first_positions("BALCONY 5 m²") == {"Balcony": 0, "Balcon": 0}
+    assert m.first_positions("Current rent 900") == {"Rent": 3}
+    assert m.first_positions("Garden") == {}
+
+
+def test_athome_characteristics_match_legacy_loop_on_corpus():
+    _athome()
+    from bs4 import BeautifulSoup
+    from backend.scripts.bench_characteristics import corpus, legacy_parse_characteristics
+    import athome_scraper as athome
+    from page_tree import PageTree
+    for name, html in corpus():
+        expected = legacy_parse_characteristics(BeautifulSoup(html, "lxml"))
+        assert athome._parse_characteristics(PageTree(html)) == expected, name
+
+
+
+def test_label_dispatch_keeps_if_elif_order():
+    from backend.label_matcher import LabelDispatch, LabelRule
+
+    def price(): pass
+    def per_m2(): pass
+    def rooms(): pass
+    def showers(): pass
+
+    d = LabelDispatch([
+        LabelRule(price, any=("prix",), none=("m²",)),
+        LabelRule(per_m2, any=("m²",)),
+        LabelRule(rooms, exact=("pièces",), any=("chambres/pièces",)),
+        LabelRule(showers, all=("douche", "salle")),
+    ])
+    assert d.lookup("prix de vente") is price
+    assert d.lookup("prix/m²") is per_m2
+    assert d.lookup("pièces") is rooms and d.lookup("nombre de pièces") is None
+    assert d.lookup("salle de douche") is showers and d.lookup("douche") is None
+    assert d.hits["prix de vente"] == 1 and d.misses["douche"] == 1
+    assert "6 labels, 67% mapped" in d.report()
+
+
+def test_immotop_dispatch_matches_legacy_chain(monkeypatch):
+    _immotop(monkeypatch)
+    from backend.scripts.bench_label_dispatch import corpus, legacy_map_characteristic
+    import immotop_scraper as immotop
+    for label, value in corpus():
+        for t in ("buy", "rent"):
+            old, new = {}, {}
+            legacy_map_characteristic(label, value, old, t)
+            immotop._map_characteristic(label, value, new, t)
+            assert new == old, (label, value, t)
+
+# ─────────────────────────────────────────────────────────────
+# Page trees (parse once per page state)
+# ─────────────────────────────────────────────────────────────
+
+def test_page_tree_keeps_script_blobs_and_drops_them_from_text():
+    from backend.page_tree import PageTree
+    page = PageTree((FIXTURES / "athome_detail.html").read_text(encoding="utf-8"))
+    assert [s.type for s in page.scripts] == ["application/ld+json", "", ""]
+    assert "Immo Lux SARL" in page.scripts[0].text
+    assert "inline noise" not in page.text() and "color: red" not in page.text()
+    assert PageTree("").root.tag == "html"
+
+
+class BrowserPage:
+    """
+    WebDriver stand-in: a DOM version and page_source reads for DomTracker,
+    tel: links and a CDP performance log / response bodies for phone_reveal.
+    """
+
+    def __init__(self, html):
+        self.html = html
+        self.version = ["doc1", 0]
+        self.source_reads = 0
+        self.button = None
+        self.perf_log = []
+        self.bodies = {}
+
+    def respond(self, request_id, url, body, kind="XHR"):
+        """Queue the CDP events of one finished network response."""
+        for method, params in (
+            ("Network.responseReceived", {"requestId": request_id, "type": kind, "response": {"url": url}}),
+            ("Network.loadingFinished", {"requestId": request_id}),
+        ):
+            self.perf_log.append({"message": json.dumps({"message": {"method": method, "params": params}})})
+        self.bodies[request_id] = body
+
+    def get_log(self, kind):
+        entries, self.perf_log = self.perf_log, []
+        return entries
+
+    def execute_cdp_cmd(self, cmd, params):
+        if cmd == "Network.getResponseBody":
+            return {"body": self.bodies[params["requestId"]], "base64Encoded": False}
+        return {}
+
+    @property
+    def page_source(self):
+        self.source_reads += 1
+        return self.html
+
+    def execute_script(self, script, *args):
+        return list(self.version)
+
+    def get(self, url):
+        pass
+
+    def find_element(self, by, value):
+        from selenium.common.exceptions import NoSuchElementException
+        if value == "h1" and "<h1" in self.html:
+            return object()
+        if value == "h1" or self.button is None:
+            raise NoSuchElementException(value)
+        return self.button
+
+    def find_elements(self, by, value):
+        import lxml.html
+
+        class Link:
+            def __init__(self, el):
+                self.el = el
+
+            def get_attribute(self, name):
+                return self.el.get(name)
+
+        if value != "a[href^='tel:']":
+            return []
+        return [Link(a) for a in lxml.html.document_fromstring(self.html).xpath("//a[starts-with(@href, 'tel:')]")]
+
+
+def test_dom_tracker_reparses_only_after_mutation():
+    from backend.page_tree import DomTracker
+    drv = BrowserPage("<html><body><h1>A</h1></body></html>")
+    dom = DomTracker(drv)
+    first = dom.tree()
+    assert dom.tree() is first and drv.source_reads == 1
+    drv.html, drv.version = "<html><body><h1>B</h1></body></html>", ["doc1", 3]
+    assert dom.tree() is not first and dom.parses == 2
+
+
+def _immotop(monkeypatch):
+    pytest.importorskip("lxml")
+    import backend.immotop_scraper as immotop
+    monkeypatch.setattr(immotop, "_dismiss_cookies", lambda driver: None)
+    monkeypatch.setattr(immotop.time, "sleep", lambda s: None)
+    return immotop
+
+
+def test_immotop_detail_parsed_from_one_tree(monkeypatch):
+    immotop = _immotop(monkeypatch)
+    drv = BrowserPage((FIXTURES / "immotop_detail.html").read_text(encoding="utf-8"))
+    data = immotop.scrape_detail(drv, "https://www.immotop.lu/annonces/1234567/", "buy", save_images=False)
+    assert drv.source_reads == 1
+    assert data["listing_ref"] == "1234567"
+    assert data["title"] == "Appartement 2 chambres à vendre"
+    assert data["location"] == "Luxembourg-Belair, Rue de la Forêt"
+    assert data["sale_price"] == 895000.0 and data["surface_m2"] == 84.0
+    assert data["bedrooms"] == 2 and data["floor"] == 3 and data["elevator"] == 1
+    assert data["agency_name"] == "Belair Immo" and data["agent_name"] == "Julie Martin"
+    assert len(immotop.json.loads(data["image_urls"])) == 2
+
+
+def test_immotop_phone_click_reparses_changed_dom(monkeypatch):
+    immotop = _immotop(monkeypatch)
+    html = (FIXTURES / "immotop_detail.html").read_text(encoding="utf-8")
+    html = html.replace("référence: 1234567", "").replace("Pour visiter : 691 234 567", "")
+    drv = BrowserPage(html)
+
+    class Button:
+        def click(self):
+            drv.html = html.replace("</main>", '<a href="tel:+352 621 987 654">Appeler</a></main>')
+            drv.version = ["doc1", 1]
+
+    drv.button = Button()
+    data = immotop.scrape_detail(drv, "https://www.immotop.lu/annonces/1234567/", "rent", save_images=False)
+    assert data["phone_number"] == "621987654" and data["phone_source"] == "button"
+    assert data["_phone_reveal_via"] == "tel_link"
+    assert drv.source_reads == 2
+
+
+def test_immotop_phone_read_from_reveal_xhr(monkeypatch):
+    immotop = _immotop(monkeypatch)
+    html = (FIXTURES / "immotop_detail.html").read_text(encoding="utf-8")
+    html = html.replace("référence: 1234567", "").replace("Pour visiter : 691 234 567", "")
+    drv = BrowserPage(html)
+    drv.respond("1.1", "https://www.immotop.lu/tracking/pageview", '{"ok": true, "id": 123456789}')
+
+    class Button:
+        def click(self):
+            # Only the reveal response carries the number; the DOM never changes
+            drv.respond("1.7", "https://www.immotop.lu/api/analytics", '{"event": "click", "ts": 1712345678}')
+            drv.respond("1.8", "https://www.immotop.lu/api/listing/1234567/contact",
+                        '{"agent": {"name": "Julie Martin", "phoneNumber": "+352 621 555 444"}}', "Fetch")
+
+    drv.button = Button()
+    data = immotop.scrape_detail(drv, "https://www.immotop.lu/annonces/1234567/", "rent", save_images=False)
+    assert data["phone_number"] == "621555444" and data["phone_source"] == "button"
+    assert data["_phone_reveal_via"] == "network" and data["_phone_reveal_ms"] < 1000
+    assert drv.source_reads == 1
+
+
+def test_phone_from_payload_shapes():
+    from backend.phone_reveal import phone_from_payload, tel_digits
+    extract = _athome()._extract_phone
+    assert phone_from_payload('{"data": [{"tel": "26 12 34 56"}]}', "/x", extract) == "26123456"
+    assert phone_from_payload('<a href="tel:+35226123456">Call</a>', "/x", extract, tel_digits) == "26123456"
+    assert phone_from_payload("621 123 456", "/api/phone/42", extract) == "621123456"
+    # Numbers in unrelated responses are ignored
+    assert phone_from_payload('{"id": 621123456}', "/x", extract) is None
+    assert phone_from_payload("621 123 456", "/api/stats", extract) is None
+
+
+# ─────────────────────────────────────────────────────────────
+# Lightweight Chrome profile
+# ─────────────────────────────────────────────────────────────
+
+def test_lightweight_profile_options_and_blocklist():
+    from selenium.webdriver.chrome.options import Options
+    from backend.chrome_profile import apply_lightweight_options, block_requests, BLOCKED_URL_PATTERNS
+
+    opts = apply_lightweight_options(Options())
+    assert opts.page_load_strategy == "eager"
+    assert "--blink-settings=imagesEnabled=false" in opts.arguments
+    assert opts.experimental_options["prefs"]["profile.managed_default_content_settings.images"] == 2
+
+    class CdpDriver:
+        def __init__(self):
+            self.cmds = []
+
+        def execute_cdp_cmd(self, cmd, params):
+            self.cmds.append((cmd, params))
+
+    drv = CdpDriver()
+    assert block_requests(drv)
+    assert drv.cmds[0][0] == "Network.enable"
+    assert drv.cmds[1] == ("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    assert "*.woff2" in BLOCKED_URL_PATTERNS and "*googletagmanager.com*" in BLOCKED_URL_PATTERNS
+    assert not block_requests(FakeDriver())  # no CDP → loads everything, no crash
+
+
+# ─────────────────────────────────────────────────────────────
+# Condition-based waits
+# ─────────────────────────────────────────────────────────────
+
+def test_wait_stats_and_count_settled():
+    from backend.waits import WaitStats, count_settled
+
+    class Cards:
+        counts = iter([0, 4, 9, 9, 9])
+
+        def find_elements(self, by, value):
+            return [None] * next(self.counts)
+
+    stats = WaitStats()
+    assert stats.until(Cards(), "index.scroll", count_settled(("css", "a")), 2, poll=0.001) == 9
+    assert stats.until(Cards(), "index.links", lambda d: False, 0.01, poll=0.001) is None
+    with stats.work("index.parse"):
+        pass
+    sites = stats.sites()
+    assert sites["index.scroll"][0] == 1 and sites["index.scroll"][3] == 0
+    assert sites["index.links"][3] == 1 and sites["index.links"][1] >= 0.01
+    assert sites["index.parse"][2] >= 0 and "index.links" in stats.report()
+
+    stats.reset_stats()
+    with stats.work("detail.expand"):                   # a wait inside work counts as wait only
+        stats.until(Cards(), "detail.expand", lambda d: False, 0.05, poll=0.001)
+    (calls, wait, work, timeouts), = stats.sites().values()
+    assert calls == 2 and wait >= 0.05 and work < 0.01
+
+
+def test_immotop_detail_waits_are_accounted(monkeypatch):
+    immotop = _immotop(monkeypatch)
+    immotop._WAITS.reset_stats()
+    drv = BrowserPage((FIXTURES / "immotop_detail.html").read_text(encoding="utf-8"))
+    immotop.scrape_detail(drv, "https://www.immotop.lu/annonces/1234567/", "buy", save_images=False)
+    sites = immotop._WAITS.sites()
+    assert sites["detail.h1"][3] == 0          # h1 present → no timeout, no fixed sleep
+    assert sites["detail.load"][0] == 1 and sites["detail.parse"][0] == 2
+
+
+# ─────────────────────────────────────────────────────────────
+# Image store
+# ─────────────────────────────────────────────────────────────
+
+def test_image_store_dedups_by_url_and_content(tmp_path):
+    _athome()   # puts backend/ on sys.path for the store's sibling imports
+    from backend.image_store import ImageStore
+
+    class Response:
+        def __init__(self, content):
+            self.content = content
+            self.headers = {"content-type": "image/jpeg"}
+
+        def raise_for_status(self):
+            pass
+
+    photos = {
+        "https://cdn.athome.lu/a.jpg": b"living-room",
+        "https://cdn.athome.lu/b.jpg": b"kitchen",
+        "https://pic.immotop.lu/x.jpg": b"living-room",   # same photo cross-posted
+    }
+    requested = []
+
+    def get(url, timeout):
+        requested.append(url)
+        return Response(photos[url])
+
+    store = ImageStore(tmp_path, "test-agent", workers=2)
+    store._session.get = get
+    try:
+        folder = store.save_listing("111", ["https://cdn.athome.lu/a.jpg", "data:,x", "https://cdn.athome.lu/b.jpg"])
+        assert sorted(p.name for p in folder.iterdir()) == ["001.jpg", "003.jpg", "manifest.json"]
+        store.save_listing("222", ["https://pic.immotop.lu/x.jpg"])
+        assert len(list((tmp_path / "objects").rglob("*.jpg"))) == 2   # cross-post stored once
+        assert (tmp_path / "222" / "001.jpg").samefile(folder / "001.jpg")
+
+        # Re-scrape: nothing downloaded, a dropped photo's link is removed
+        store.save_listing("111", ["https://cdn.athome.lu/a.jpg"])
+        assert len(requested) == 3 and store.reused == 1 and store.duplicates == 1
+        assert sorted(p.name for p in folder.iterdir()) == ["001.jpg", "manifest.json"]
+        manifest = json.loads((folder / "manifest.json").read_text())
+        assert manifest[0]["url"] == "https://cdn.athome.lu/a.jpg" and manifest[0]["file"] == "001.jpg"
+    finally:
+        store.close()
+
+
+# ─────────────────────────────────────────────────────────────
+# Index cards
+# ─────────────────────────────────────────────────────────────
+
+class IndexPage:
+    """WebDriver stand-in for get_index_refs: every page shows the same cards."""
+
+    def __init__(self, html):
+        self.html = html
+        self.visited = []
+
+    def get(self, url):
+        self.visited.append(url)
+
+    @property
+    def page_source(self):
+        return self.html
+
+    def execute_script(self, script, *args):
+        return None
+
+    def find_element(self, by, value):
+        from selenium.common.exceptions import NoSuchElementException
+        if "/id-" not in self.html:
+            raise NoSuchElementException(value)
+        return object()
+
+    def find_elements(self, by, value):
+        return [None] * self.html.count("/id-")
+
+
+def test_athome_index_cards(monkeypatch):
+    athome = _athome()
+    monkeypatch.setattr(athome, "_dismiss_cookies", lambda driver: None)
+    monkeypatch.setattr(athome, "count_settled", lambda locator: (lambda driver: True))
+    drv = IndexPage((FIXTURES / "athome_index.html").read_text(encoding="utf-8"))
+    cards = athome.get_index_refs(drv, "https://www.athome.lu/vente?sort=date_desc", max_pages=3)
+    assert [c.ref for c in cards] == ["8983182", "8990001", "8990002"]
+    assert len(drv.visited) == 2 and drv.visited[1].endswith("&page=2")   # no new refs → stop
+
+    first = cards[0]
+    assert first.url == "https://www.athome.lu/vente/appartement/luxembourg-belair/id-8983182.html"
+    assert first.title == "Appartement à vendre à Luxembourg-Belair"
+    assert first.price == 895000.0 and first.surface_m2 == 84.0
+    assert first.thumbnail == "https://i1.static.athome.eu/images/8983182/thumb.jpg"
+    assert cards[1].title == "Maison à vendre à Strassen"
+    assert cards[1].price == 1250000.0 and cards[1].surface_m2 == 180.5
+    assert cards[2].price is None and cards[2].surface_m2 is None
+
+
+def test_card_changes_against_stored_row():
+    from backend.index_cards import IndexCard, card_changes
+    card = IndexCard("8983182", "u", "Appartement à vendre à Luxembourg-Belair", 895000.0, 84.0)
+    row = {"title": "Appartement à vendre à Luxembourg-Belair, Rue de la Forêt",
+           "sale_price": 895000.0, "surface_m2": 84.3}
+    assert card_changes(card, row, "buy") == {}                       # shortened title, same numbers
+    assert card_changes(card._replace(price=869000.0), row, "buy") == {"sale_price": (895000.0, 869000.0)}
+    assert set(card_changes(card._replace(title="Penthouse à Kirchberg"), row, "buy")) == {"title"}
+    assert card_changes(IndexCard("1", "u"), row, "buy") is None      # nothing to compare
+    assert card_changes(card._replace(title=""), {"sale_price": 895000.0}, "rent") is None
+    assert set(card_changes(card._replace(title="Appartement"), {"title": "Maison, Appartement"},
+                            "buy")) == {"title"}                      # a substring is not the start
+    longer = row["title"] + ", 3e étage"
+    assert card_changes(card._replace(title=longer), {"title": row["title"]}, "buy") == {
+        "title": (row["title"], longer)}                              # the stored title is the shorter one
+    assert card_changes(card._replace(title="…"), {"title": "Maison"}, "buy") is None   # no words to compare
+
+
+def test_known_refs_preloaded_once(tmp_path, monkeypatch):
+    athome = _athome()
+    from backend.known_refs import FINGERPRINT_FIELDS, KnownRefs
+    monkeypatch.setattr(athome, "DB_PATH", tmp_path / "listings.db")
+    athome.db_init()
+    athome.db_upsert({"listing_ref": "1", "source": "athome", "title": "Maison", "sale_price": 500000.0})
+    athome.db_upsert({"listing_ref": "2", "source": "immotop", "title": "Studio"})
+    rows = athome.db_get_known("athome", FINGERPRINT_FIELDS)
+    assert rows == {"1": {"title": "Maison", "sale_price": 500000.0, "rent_price": None, "surface_m2": None}}
+
+    fetched = []
+    known = KnownRefs(rows, fetch=lambda ref: fetched.append(ref) or {"title": "?"})
+    assert known.get("1")["sale_price"] == 500000.0 and known.get("3") is None
+    known.add("3", {"title": "Loft", "listing_url": "u"})
+    assert known.get("3") == {"title": "Loft", "sale_price": None, "rent_price": None, "surface_m2": None}
+    assert len(known) == 2 and fetched == []
+
+    # Above the threshold only a Bloom filter is kept; hits load the row
+    bloom = KnownRefs({str(i): {} for i in range(2000)}, fetch=lambda ref: fetched.append(ref) or {},
+                      bloom_above=1000)
+    assert bloom.bloom is not None and len(bloom) == 2000
+    assert all(bloom.get(str(i)) == {} for i in range(0, 2000, 7))     # no false negatives
+    misses = sum(bloom.get(f"x{i}") is None for i in range(1000))
+    assert misses >= 990 and bloom.fetches == len(fetched)
+    bloom.add("new", {})
+    assert bloom.get("new") == {} and len(bloom) == 2001
+
+    # Loaded from the DB: above the threshold the refs stream in, ref only
+    def no_map(source, fields):
+        raise AssertionError("the fingerprint map must not be built in Bloom mode")
+    athome.db_upsert({"listing_ref": "4", "source": "athome", "title": "Loft"})
+    assert athome.db_count_known("athome") == 2 and sorted(athome.db_iter_refs("athome")) == ["1", "4"]
+    known = KnownRefs.load("athome", athome.db_count_known, no_map, athome.db_iter_refs,
+                           fetch=athome.db_get, bloom_above=1)
+    assert known.bloom is not None and len(known) == 2
+    assert known.get("4")["title"] == "Loft" and known.get("nope") is None
+    known = KnownRefs.load("athome", athome.db_count_known, athome.db_get_known, athome.db_iter_refs,
+                           fetch=athome.db_get)
+    assert known.bloom is None and known.get("1")["sale_price"] == 500000.0
+
+
+def test_batch_writer_sqlite_upserts_match_db_upsert(tmp_path, monkeypatch):
+    athome = _athome()
+    from backend.batch_writer import BatchWriter
+    monkeypatch.setattr(athome, "DB_PATH", tmp_path / "listings.db")
+    athome.db_init()
+    athome.db_upsert({"listing_ref": "1", "source": "athome", "title": "Maison", "sale_price": 500000.0})
+    first_seen = athome.db_get("1")["first_seen"]
+
+    writer = BatchWriter(athome.db_upsert_many, max_size=3)
+    assert writer.add({"listing_ref": "1", "source": "athome", "title": "Maison rénovée",
+                       "sale_price": 480000.0}, is_update=True) == {}
+    assert writer.add({"listing_ref": "2", "source": "athome", "title": "Studio"}) == {}
+    assert writer.add({"listing_ref": "1", "title": "Ignored"}) == {"updated": 1, "inserted": 1, "unchanged": 1}
+    writer.add({"listing_ref": "3", "title": "Loft"}, is_update=True)     # update of an unknown ref inserts
+    writer.add({"title": "no ref"})
+    assert writer.close() == {"updated": 1, "inserted": 2, "unchanged": 1, "skipped": 1}
+    assert writer.flushes == 2
+
+    row = athome.db_get("1")
+    assert row["title"] == "Maison rénovée" and row["sale_price"] == 480000.0
+    assert row["first_seen"] == first_seen and row["last_updated"] > first_seen
+    assert [h["title"] for h in json.loads(row["title_history"])] == ["Maison"]
+    assert athome.db_get("2")["title_history"] == "[]" and athome.db_get("3")["title"] == "Loft"
+
+    aged = BatchWriter(athome.db_upsert_many, max_size=10, max_age=0.05)
+    aged.add({"listing_ref": "4", "title": "Duplex"})
+    assert aged.tick() == {} and len(aged) == 1                        # not due yet
+    time.sleep(0.06)
+    assert aged.tick() == {"inserted": 1} and len(aged) == 0           # due without another add()
+
+
+def test_mongo_update_writes_fingerprint_in_the_pipeline_write(monkeypatch):
+    import backend.mongo_db as mongo
+
+    calls, logged = [], []
+    stored = [{"fingerprint": "raced", "title": "Maison", "sale_price": 510000.0},
+              {"fingerprint": "old", "title": "Maison", "sale_price": 500000.0}]
+
+    class Collection:
+        def find_one(self, flt, projection=None):
+            return stored.pop()
+
+        def update_one(self, flt, update, upsert=False):
+            calls.append((flt, update, upsert))
+            if len(calls) == 1:                     # another runner moved the fingerprint
+                raise mongo.DuplicateKeyError("E11000 duplicate key")
+
+    class Changes:
+        def insert_many(self, docs, ordered=True):
+            logged.extend(docs)
+
+    monkeypatch.setattr(mongo, "_get_collection", lambda: Collection())
+    monkeypatch.setattr(mongo, "_get_changes_collection", lambda: Changes())
+    data = {"listing_ref": "1", "title": "$5 off: Maison", "sale_price": 480000.0,
+            "first_seen": "ignored", "agency_ref": "not in schema"}
+    assert mongo.db_upsert(data, is_update=True) == "updated"
+    assert [flt for flt, _, _ in calls] == [{"listing_ref": "1", "fingerprint": "old"},
+                                            {"listing_ref": "1", "fingerprint": "raced"}]
+    _, pipeline, upsert = calls[-1]
+    assert upsert is True
+    history, fields = pipeline[0]["$set"], pipeline[1]["$set"]
+    assert history["first_seen"]["$ifNull"][0] == "$first_seen"
+    pushed = history["title_history"]["$cond"][1]["$concatArrays"][1]
+    assert pushed[0]["title"] == "$title"                              # the stored title, read server-side
+    assert fields["title"] == {"$literal": "$5 off: Maison"}          # not a field path
+    assert set(fields) == {"title", "sale_price", "fingerprint", "last_updated"}
+    assert fields["fingerprint"]["$literal"] not in ("old", "raced")
+    assert {(d["field"], d["old_value"], d["new_value"]) for d in logged} == {   # logged once, vs the re-read
+        ("title", "Maison", "$5 off: Maison"), ("sale_price", 510000.0, 480000.0)}
+
+
+def test_mongo_upsert_many_guards_and_retries_collided_updates(monkeypatch):
+    import types
+    import backend.mongo_db as mongo
+
+    rows = {"1": {"listing_ref": "1", "fingerprint": "old", "title": "Maison", "sale_price": 500000.0}}
+    writes, logged = [], []
+
+    class Collection:
+        def find(self, flt, projection=None):
+            return [dict(rows[r]) for r in flt["listing_ref"]["$in"] if r in rows]
+
+        def bulk_write(self, ops, ordered=True):
+            writes.append([op._filter for op in ops])
+            if len(writes) == 1:                    # another runner moved listing 1's fingerprint
+                rows["1"].update(fingerprint="raced", sale_price=510000.0)
+                raise mongo.BulkWriteError({
+                    "writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"},
+                                    {"index": 2, "code": 121, "errmsg": "validation failed"}],
+                    "upserted": [{"index": 1, "_id": "x"}]})
+            return types.SimpleNamespace(upserted_ids={})
+
+    class Changes:
+        def insert_many(self, docs, ordered=True):
+            logged.extend(docs)
+
+    monkeypatch.setattr(mongo, "_get_collection", lambda: Collection())
+    monkeypatch.setattr(mongo, "_get_changes_collection", lambda: Changes())
+    counts = mongo.db_upsert_many([({"listing_ref": "1", "sale_price": 480000.0}, True),
+                                   ({"listing_ref": "2", "title": "Studio"}, False),
+                                   ({"listing_ref": "3", "title": "Loft"}, False)])
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 0, "skipped": 1}
+    assert writes == [[{"listing_ref": "1", "fingerprint": "old"}, {"listing_ref": "2"}, {"listing_ref": "3"}],
+                      [{"listing_ref": "1", "fingerprint": "raced"}]]     # only the collision is retried
+    assert [(d["field"], d["old_value"], d["new_value"]) for d in logged] == [
+        ("sale_price", 510000.0, 480000.0)]                                # diffed against the re-read
+
+
+def test_field_changes_logged_and_price_drops(tmp_path, monkeypatch):
+    athome = _athome()
+    import batch_writer
+    import listing_changes
+    monkeypatch.setattr(athome, "DB_PATH", tmp_path / "listings.db")
+    athome.db_init()
+    athome.db_upsert({"listing_ref": "1", "title": "Maison", "sale_price": 500000.0, "surface_m2": 120})
+    fp = athome.db_get("1")["fingerprint"]
+    athome.db_upsert({"listing_ref": "1", "title": "Maison", "sale_price": 500000}, is_update=True)
+    assert athome.db_get("1")["fingerprint"] == fp                      # same normalised state
+    athome.db_upsert({"listing_ref": "1", "title": "Maison", "sale_price": 480000.0}, is_update=True)
+    row = athome.db_get("1")
+    assert row["fingerprint"] != fp and json.loads(row["title_history"] or "[]") == []
+    drops = athome.db_price_drops("2000-01-01")
+    assert [(d["listing_ref"], d["field"], d["old_value"], d["new_value"]) for d in drops] == [
+        ("1", "sale_price", 500000.0, 480000.0)]
+
+    conn = athome.db_connect()
+    batch_writer.sqlite_upsert_many(conn, [
+        ({"listing_ref": "1", "sale_price": 470000.0}, True),
+        ({"listing_ref": "1", "sale_price": 490000.0}, True),          # same ref twice in one batch
+        ({"listing_ref": "2", "title": "Studio", "rent_price": 900.0}, False),
+    ], athome.ALL_FIELDS)
+    history = listing_changes.sqlite_history(conn, "1")
+    assert [(h["old_value"], h["new_value"]) for h in history] == [
+        (500000.0, 480000.0), (480000.0, 470000.0), (470000.0, 490000.0)]
+    assert listing_changes.sqlite_history(conn, "2") == []
+    assert athome.db_get("2")["fingerprint"] == listing_changes.fingerprint(athome.db_get("2"))
+    assert len(athome.db_price_drops("2000-01-01")) == 2
+
+
+def test_sqlite_connection_persists_per_thread_in_wal(tmp_path, monkeypatch):
+    athome = _athome()
+    monkeypatch.setattr(athome, "DB_PATH", tmp_path / "listings.db")
+    athome.db_init()
+    conn = athome.db_connect()
+    assert athome.db_connect() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1          # NORMAL
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(athome.db_connect()))
+    t.start(); t.join()
+    assert other[0] is not conn
+
+    conn.close()                                                          # callers may still close it
+    assert athome.db_upsert({"listing_ref": "1", "title": "Maison"}) == "inserted"
+    athome.db_upsert({"listing_ref": "1", "sale_price": 1.0}, is_update=True)
+    assert athome.db_get("1")["title"] == "Maison" and athome.db_get("1")["sale_price"] == 1.0
+
+
+def test_db_stats_single_pass(tmp_path, monkeypatch):
+    athome = _athome()
+    monkeypatch.setattr(athome, "DB_PATH", tmp_path / "listings.db")
+    athome.db_init()
+    assert athome.db_stats() == {"total": 0, "buy": 0, "rent": 0, "with_phone": 0, "title_changed": 0}
+    athome.db_upsert({"listing_ref": "1", "transaction_type": "buy", "title": "A", "phone_number": "621"})
+    athome.db_upsert({"listing_ref": "2", "transaction_type": "rent", "title": "B"})
+    athome.db_upsert({"listing_ref": "2", "transaction_type": "rent", "title": "B2"}, is_update=True)
+    assert athome.db_stats() == {"total": 2, "buy": 1, "rent": 1, "with_phone": 1, "title_changed": 1}
+    with athome.db_connect() as conn:
+        plan = [r[3] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*), COUNT(phone_number), SUM(transaction_type = 'buy'),"
+            " (SELECT COUNT(*) FROM listings WHERE title_history != '[]') FROM listings")]
+    assert [p for p in plan if p.startswith("SCAN")] == [
+        "SCAN listings USING COVERING INDEX idx_listings_stats",
+        "SCAN listings USING COVERING INDEX idx_listings_title_changed"]
+
+
+def test_job_queue_leases_retries_and_resumes(tmp_path):
+    _athome()
+    from backend.job_queue import Job, JobQueue
+    now = [1000.0]
+    queue = JobQueue(tmp_path / "jobs.db", lease_seconds=60, max_attempts=2, clock=lambda: now[0])
+    jobs = [Job(f"https://x/{i}", str(i), "athome", "buy") for i in range(3)]
+    assert queue.enqueue(jobs) == 3 and queue.enqueue(jobs) == 0       # idempotent per URL
+    queue.enqueue([Job("https://x/r", "r", "athome", "rent")])
+
+    first = queue.lease("athome", "buy", limit=2)
+    assert [j.listing_ref for j in first] == ["0", "1"]
+    assert [j.listing_ref for j in queue.lease("athome", "buy", limit=5)] == ["2"]
+    assert queue.lease("athome", "buy") == []                          # all leased
+
+    queue.complete(["https://x/0"])
+    assert queue.fail("https://x/1", "timeout") == "pending"           # back after its backoff
+    assert queue.lease("athome", "buy") == []
+    now[0] += 61                        # job 1's backoff is over, job 2's worker "died"
+    retry, expired = queue.lease("athome", "buy")
+    assert (retry.listing_ref, retry.attempts) == ("1", 1) and expired.listing_ref == "2"
+    assert queue.fail(retry.url, "timeout") == "failed"
+
+    # A finished job comes back when the listing is discovered again
+    assert queue.enqueue([Job("https://x/0", "0", "athome", "buy", is_update=True)]) == 1
+    (again,) = queue.lease("athome", "buy")
+    assert again.is_update and again.attempts == 0
+    assert queue.counts("athome") == {"pending": 1, "leased": 2, "failed": 1}
+
+
+def test_rate_limiter_paces_and_backs_off():
+    _athome()
+    from backend.rate_limit import HostLimits, RateLimiter, retry_after_seconds
+    import requests
+
+    now = [0.0]
+
+    def sleep(s):
+        now[0] += s
+
+    class Resp:
+        def __init__(self, status, retry_after=None):
+            self.status_code = status
+            self.headers = {"Retry-After": retry_after} if retry_after else {}
+
+    limiter = RateLimiter({}, HostLimits(rate=2.0, max_rate=3.0, min_rate=0.5, burst=1.0),
+                          clock=lambda: now[0], sleep=sleep)
+    url = "https://www.athome.lu/vente/id-1.html"
+    for _ in range(3):
+        limiter.request(lambda u: Resp(200), url)
+    assert now[0] == pytest.approx(1 / 2.05 + 1 / 2.1)                 # burst 1, then paced
+    assert limiter.rate(url) == pytest.approx(2.15)                      # +0.05 per success
+
+    limiter.request(lambda u: Resp(429, "7"), url)
+    assert limiter.rate(url) == pytest.approx(1.075)
+    t0 = now[0]
+    limiter.request(lambda u: Resp(200), url)
+    assert now[0] - t0 == pytest.approx(7)                               # Retry-After honoured
+
+    def timeout(u):
+        raise requests.Timeout("slow")
+    with pytest.raises(requests.Timeout):
+        limiter.request(timeout, url)
+    assert limiter.rate(url) == pytest.approx(0.5625)
+    assert limiter.rate("https://pic.immotop.lu/x.jpg") == 2.0           # hosts are independent
+    assert "www.athome.lu" in limiter.report() and retry_after_seconds("soon") is None
+
+
+def test_backfill_resumes_and_queues_below_live_jobs(tmp_path):
+    _athome()
+    from backend.backfill import BackfillCursors, backfill_cycle
+    from backend.index_cards import IndexCard
+    from backend.job_queue import Job, JobQueue, PRIORITY_BACKFILL, PRIORITY_LIVE
+    import types
+
+    index = "https://www.athome.lu/vente?sort=date_desc"
+    pages = {n: [IndexCard(f"r{n}{i}", f"https://www.athome.lu/vente/id-r{n}{i}.html")
+                 for i in range(2)] for n in (1, 2, 3)}
+    pages[4] = pages[3]                                   # site repeats its last page
+    seen = []
+
+    def get_index_page(driver, url, page=1, cookies=True):
+        seen.append(page)
+        return pages[page]
+
+    scraper = types.SimpleNamespace(
+        _source_of=lambda url: "athome",
+        index_page_url=lambda url, page: f"{url}&page={page}",
+        get_index_page=get_index_page,
+        db_get_known=lambda source, fields: {"r11": {"title": None}},
+        db_count_known=lambda source: 1,
+        db_iter_refs=lambda source: iter(["r11"]),
+        db_get=lambda ref: None,
+    )
+    pool = types.SimpleNamespace(call=lambda fn, *a, **k: fn(None, *a, **k))
+    queue, cursors = JobQueue(tmp_path / "q.db"), BackfillCursors(tmp_path / "q.db")
+    configs = [{"url": index, "type": "buy"}]
+
+    stats = backfill_cycle(scraper, pool, configs, queue, cursors, page_budget=2)
+    assert seen == [1, 2] and stats["enqueued"] == 3 and stats["unfinished"] == 1
+    stats = backfill_cycle(scraper, pool, configs, queue, cursors, page_budget=5)
+    assert seen == [1, 2, 3, 4] and stats["finished"] == 1            # resumed at page 3
+    assert backfill_cycle(scraper, pool, configs, queue, cursors) == {"unfinished": 0}
+    assert cursors.get(index, "athome", "buy").exhausted
+
+    queue.enqueue([Job("https://www.athome.lu/vente/id-live.html", "live", "athome", "buy")])
+    assert [j.listing_ref for j in queue.lease("athome", "buy", limit=10, min_priority=PRIORITY_LIVE)] == ["live"]
+    backfill = queue.lease("athome", "buy", limit=10, min_priority=PRIORITY_BACKFILL)
+    assert [j.listing_ref for j in backfill] == ["r10", "r20", "r21", "r30", "r31"]
+    assert {j.priority for j in backfill} == {PRIORITY_BACKFILL}
+
+
+def test_backfill_keeps_cursor_on_failed_load_and_rewalks(tmp_path):
+    _athome()
+    from backend.backfill import BackfillCursors, backfill_cycle
+    from backend.index_cards import IndexCard
+    from backend.job_queue import JobQueue
+    import types
+
+    index = "https://www.athome.lu/vente?sort=date_desc"
+    loads = {1: [["r1"]], 2: [None, ["r2"]], 3: [None, None, None]}   # page 2 times out once
+    seen = []
+
+    def get_index_page(driver, url, page=1, cookies=True):
+        seen.append(page)
+        refs = loads[page].pop(0) if len(loads[page]) > 1 else loads[page][0]
+        return None if refs is None else [IndexCard(r, f"https://www.athome.lu/vente/id-{r}.html") for r in refs]
+
+    scraper = types.SimpleNamespace(
+        _source_of=lambda url: "athome",
+        index_page_url=lambda url, page: f"{url}&page={page}",
+        get_index_page=get_index_page,
+        db_get_known=lambda source, fields: {},
+        db_count_known=lambda source: 0,
+        db_iter_refs=lambda source: iter([]),
+        db_get=lambda ref: None,
+    )
+    pool = types.SimpleNamespace(call=lambda fn, *a, **k: fn(None, *a, **k))
+    queue, cursors = JobQueue(tmp_path / "q.db"), BackfillCursors(tmp_path / "q.db")
+    configs = [{"url": index, "type": "buy"}]
+
+    stats = backfill_cycle(scraper, pool, configs, queue, cursors, page_budget=5)
+    assert seen == [1, 2] and stats["failed_pages"] == 1 and stats["unfinished"] == 1
+    assert cursors.get(index, "athome", "buy").next_page == 2            # not advanced, not exhausted
+    backfill_cycle(scraper, pool, configs, queue, cursors, page_budget=5)
+    assert seen == [1, 2, 2, 3]
+    backfill_cycle(scraper, pool, configs, queue, cursors, page_budget=5)
+    assert not cursors.get(index, "athome", "buy").exhausted             # two failures of page 3
+    stats = backfill_cycle(scraper, pool, configs, queue, cursors, page_budget=5)
+    assert stats["finished"] == 1 and cursors.get(index, "athome", "buy").exhausted
+
+    assert backfill_cycle(scraper, pool, configs, queue, cursors) == {"unfinished": 0}
+    stats = backfill_cycle(scraper, pool, configs, queue, cursors, page_budget=1, rewalk_days=0)
+    assert stats["rewalked"] == 1 and seen[-1] == 1                      # finished walk starts over
+    assert cursors.get(index, "athome", "buy").next_page == 2
+
+
+def test_backfill_run_selects_backend_before_init(tmp_path):
+    _athome()
+    from backend import backfill
+    import types
+
+    calls = []
+    scraper = types.SimpleNamespace(use_backend=lambda name: calls.append(("use_backend", name)),
+                                    db_init=lambda: calls.append(("db_init",)))
+    assert backfill.run(scraper, [], queue_path=tmp_path / "q.db", backend="mongo") == {"unfinished": 0}
+    assert calls == [("use_backend", "mongo"), ("db_init",)]
+
+
+def test_partitions_expand_discover_and_merge():
+    _athome()
+    from backend.index_cards import IndexCard
+    from backend.known_refs import KnownRefs
+    from backend.partitions import discover, expand, merge
+    import types
+
+    cfg = {"url": "https://www.athome.lu/vente?sort=date_desc", "type": "buy",
+           "partitions": {"propertyType": ["apartment", "house"], "commune": ["luxembourg"]}}
+    subs = expand(cfg)
+    assert [s["url"] for s in subs] == [
+        "https://www.athome.lu/vente?sort=date_desc&propertyType=apartment&commune=luxembourg",
+        "https://www.athome.lu/vente?sort=date_desc&propertyType=house&commune=luxembourg",
+    ]
+    assert expand({"url": "u", "type": "rent"}) == [{"url": "u", "type": "rent"}]
+
+    def card(ref, price):
+        return IndexCard(ref, f"https://www.athome.lu/vente/id-{ref}.html", price=price)
+
+    index = {subs[0]["url"]: [card("a1", 100), card("x", 300), card("a2", 200), card("a3", 50)],
+             subs[1]["url"]: [card("h1", 400), card("x", 300), card("h2", 500)]}
+    refs = KnownRefs({"a2": {"sale_price": 200}, "x": {"sale_price": 250}, "h2": {"sale_price": 1}})
+    pool = types.SimpleNamespace(call=lambda fn, *a, **k: fn(None, *a, **k),
+                                 imap=lambda fn, items: map(fn, items))
+
+    found = discover(pool, subs, lambda drv, url, max_pages: index[url], refs, "athome",
+                     lambda url, row: pytest.fail("every card has a price"))
+    assert [(len(p.jobs), p.stopped) for p in found] == [(2, True), (3, False)]   # own watermarks
+    jobs, duplicates = merge(found)
+    assert [(j.listing_ref, j.is_update) for j in jobs] == [("a1", False), ("x", True), ("h1", False),
+                                                              ("h2", True)]
+    assert duplicates == 1
+
+
+def test_poll_schedule_follows_arrival_rate():
+    _athome()
+    from datetime import datetime, timedelta, timezone
+    from backend.poll_schedule import PollSchedule, arrival_rate, poll_interval
+
+    now = datetime(2026, 3, 10, 9, 0, tzinfo=timezone.utc)
+    recent = [(now - timedelta(minutes=m)).isoformat() for m in range(0, 60, 2)]           # 30 in the last hour
+    usual  = [(now - timedelta(days=d, minutes=m)).isoformat() for d in (1, 2) for m in (-20, 0, 20)]
+    assert arrival_rate(recent, now) == pytest.approx(0.5)
+    assert arrival_rate(usual, now) == pytest.approx(6 / (7 * 60))                         # this time of day
+    assert arrival_rate(["garbage", (now - timedelta(hours=5)).isoformat()], now) == 0
+
+    assert poll_interval(0.5, run_seconds=57) == pytest.approx(9.05 / 0.95)  # (10 − 0.95) / 0.95: busy
+    assert poll_interval(0.01) == pytest.approx(50)                          # quiet: 0.5 expected per poll
+    assert poll_interval(0.0) == 60 and poll_interval(100, run_seconds=590) == 2   # bounds
+
+    clock = [1000.0]
+    schedule = PollSchedule(["buy", "rent"], jitter=0.1, clock=lambda: clock[0], rng=lambda: 1.0)
+    assert schedule.due() == ["buy", "rent"] and schedule.wait() == 0
+    schedule.polled("buy", 0.5)
+    schedule.polled("rent", 0.0)
+    assert schedule.due() == [] and schedule.wait() == pytest.approx(10 / 0.95 * 60 * 1.1)
+    clock[0] += 700
+    assert schedule.due() == ["buy"]
+    assert "rent: 0.0 new/h, every 60.0 min" in schedule.report()
+
+
+def test_use_backend_switches_db_functions(monkeypatch):
+    athome = _athome()
+    import backend.db_backend as db_backend
+    import types
+    fake = types.SimpleNamespace(**{name: (lambda *a, **k: "mongo") for name in db_backend.DB_FUNCTIONS})
+    monkeypatch.setitem(sys.modules, "mongo_db", fake)
+    sqlite_upsert = athome.db_upsert
+    athome.use_backend("mongo")
+    try:
+        assert athome.db_upsert({}) == "mongo" and athome.db_stats() == "mongo"
+    finally:
+        athome.use_backend("sqlite")
+    assert athome.db_upsert is sqlite_upsert
+    with pytest.raises(ValueError):
+        athome.use_backend("postgres")
+
+
+def _beating_worker(link, runs):
+    for n in range(runs):
+        link.run_started()
+        link.run_finished({"inserted": n + 1}, 0.01)
+    link.status(schedule="  buy: every 5.0 min")
+    link.run_started()
+    import time
+    time.sleep(60)                                  # hangs inside a run
+
+
+def _exiting_worker(link):
+    raise SystemExit(3)
+
+
+def test_supervisor_restarts_hung_and_dead_workers():
+    _athome()
+    import multiprocessing
+    import time
+    from backend.supervisor import Supervisor, WorkerSpec
+
+    sup = Supervisor([WorkerSpec("hung", _beating_worker, (2,)), WorkerSpec("dead", _exiting_worker)],
+                     heartbeat_seconds=0.05, heartbeat_timeout=5, run_timeout=0.5, restart_backoff=0,
+                     context=multiprocessing.get_context("fork"))
+    sup.start()
+    try:
+        first = sup.workers["hung"].process.pid
+        deadline = time.monotonic() + 10
+        while sup.workers["hung"].restarts == 0 and time.monotonic() < deadline:
+            sup.poll(timeout=0.1)
+        hung, dead = sup.workers["hung"], sup.workers["dead"]
+        assert hung.runs == 2 and hung.totals["inserted"] == 3
+        assert hung.status["schedule"] == "  buy: every 5.0 min"
+        assert hung.restarts == 1 and hung.last_error.startswith("run hung")
+        assert dead.restarts >= 1 and dead.last_error == "worker exited with code 3"
+        sup.poll(timeout=0.1)
+        assert hung.process is not None and hung.process.pid != first
+        sup._handle("hung", first, "run_start", None)   # the killed worker's leftovers
+        assert not hung.running
+        assert "restarts" in sup.report("hung")
+    finally:
+        sup.stop()
+    assert all(w.process is None for w in sup.workers.values())
+
+
+def _crashing_parent_worker(link):
+    import os
+    import subprocess
+    import time
+    child = subprocess.Popen(["sleep", "60"])     # stands in for chromedriver
+    link.status(child=child.pid)
+    time.sleep(0.5)                                 # a few heartbeats see it
+    os._exit(1)
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="process tree from /proc or psutil")
+def test_supervisor_kills_children_of_crashed_worker():
+    _athome()
+    import multiprocessing
+    import os
+    import time
+    from backend.supervisor import Supervisor, WorkerSpec
+
+    sup = Supervisor([WorkerSpec("crash", _crashing_parent_worker)], heartbeat_seconds=0.05,
+                     restart_backoff=60, context=multiprocessing.get_context("fork"))
+    sup.start()
+    try:
+        w = sup.workers["crash"]
+        deadline = time.monotonic() + 10
+        while w.restarts == 0 and time.monotonic() < deadline:
+            sup.poll(timeout=0.1)
+        assert w.last_error == "worker exited with code 1" and w.conn is None
+        child = w.status["child"]
+        for _ in range(50):                         # SIGTERMed (gone, or a zombie nobody reaps)
+            try:
+                with open(f"/proc/{child}/stat") as f:
+                    if f.read().rsplit(")", 1)[1].split()[0] == "Z":
+                        break
+            except FileNotFoundError:
+                break
+            time.sleep(0.1)
+        else:
+            pytest.fail("the crashed worker's child was left running")
+    finally:
+        sup.stop()
+
+
+def test_leases_shard_work_across_nodes(tmp_path):
+    _athome()
+    from backend.job_queue import Job, JobQueue
+    from backend.leases import Shard, SqliteLeases, detail_key
+
+    now = [1000.0]
+    a = SqliteLeases(tmp_path / "leases.db", group="athome", node_id="a", clock=lambda: now[0])
+    b = SqliteLeases(tmp_path / "leases.db", group="athome", node_id="b", clock=lambda: now[0])
+    SqliteLeases(tmp_path / "leases.db", group="immotop", node_id="c", clock=lambda: now[0])
+    keys = ["index:u0", "index:u1", "index:u2"]
+    assert a.share(keys) == ["index:u0", "index:u1"] and b.share(keys) == ["index:u2"]
+    assert a.share(keys) == ["index:u0", "index:u1"]                  # sticky while both live
+
+    assert a.claim("k", 60) == 1 and b.claim("k", 60) is None and a.claim("k", 60) == 1
+    now[0] += 61                                                       # a stops beating
+    b.heartbeat()
+    assert b.claim("k", 60) == 2 and a.held({"k": 1}) == []           # stolen, new fence
+    assert b.finish({"k": 2}) == 1 and a.claim("k", 60) is None and a.done("k")
+    assert b.share(keys) == keys                                       # the dead node's partitions too
+
+    queue = JobQueue(tmp_path / "jobs.db", clock=lambda: now[0])
+    queue.enqueue([Job(f"https://x/{i}", str(i), "athome", "buy") for i in range(3)])
+    a.heartbeat()
+    b.claim(detail_key("https://x/2"), 600)
+    shard = Shard(a, queue)
+    mine = shard.claim(queue.lease("athome", "buy"))
+    assert [j.url for j in mine] == ["https://x/0", "https://x/1"]
+    assert queue.counts() == {"leased": 2, "pending": 1}               # x/2 deferred, no attempt used
+
+    now[0] += 61                                                       # a stalls, b takes x/1 over
+    b.heartbeat()
+    assert b.claim(detail_key("https://x/1"), 600) == 2
+    items = [({"listing_ref": "0"}, False), ({"listing_ref": "1"}, False)]
+    assert shard.still_held(items, ["https://x/0", "https://x/1"]) == items[:1]
+    shard.finish(["https://x/0", "https://x/1"])
+    assert a.done(detail_key("https://x/0")) and not a.done(detail_key("https://x/1"))
+    assert a.done_among([detail_key("https://x/0"), detail_key("https://x/1")]) == {detail_key("https://x/0")}
+    assert "1 stale writes dropped" in shard.report()
+
+    reads = []
+    query, a._live = a._live_nodes, None
+    a._live_nodes = lambda: reads.append(now[0]) or query()
+    a.live_nodes(), a.live_nodes()
+    assert len(reads) == 1                                              # cached for one heartbeat
+    a.heartbeat()
+    assert a.live_nodes() == ["b"]                                      # a's own beat not seen yet
+    now[0] += a.live_ttl
+    assert sorted(a.live_nodes()) == ["a", "b"] and len(reads) == 2